@@ -0,0 +1,220 @@
+"""Local corpus of breached-password hashes, e.g. the Have I Been Pwned SHA-1 list.
+
+The corpus is a file of sorted, truncated SHA-1 digests that is memory-mapped and
+binary searched: hundreds of millions of entries cost page cache rather than
+Python heap, and a lookup touches a handful of pages. A fan-out table indexed by
+the first two digest bytes (as in git's pack indexes) narrows every search to
+one bucket first.
+
+File layout, little-endian: MAGIC, record size (uint32), record count (uint64),
+fan-out table (65536 x uint64, entry i = number of records whose first two
+bytes are <= i), then the records.
+
+    python -m app.breach build pwned-passwords-sha1-ordered-by-hash.txt [output] [--record-size 10]
+    python -m app.breach check SHA1HEX...
+"""
+import argparse
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from app import config
+
+MAGIC = b"BRCH0001"
+HEADER = struct.Struct("<8sIQ")
+FANOUT = struct.Struct("<65536Q")
+BUCKET = struct.Struct("<Q")
+# 80 bits: with a billion entries the chance of a false "breached" is about 1e-15
+DEFAULT_RECORD_SIZE = 10
+
+
+class BreachCorpusError(Exception):
+    pass
+
+
+class BreachCorpus:
+    """Read-only, memory-mapped view of a corpus file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise BreachCorpusError(f"{path} is empty")
+        self._records = HEADER.size + FANOUT.size
+        magic, self.record_size, self.count = (
+            HEADER.unpack_from(self._map, 0) if len(self._map) >= self._records else (None, 0, 0)
+        )
+        if magic != MAGIC or len(self._map) != self._records + self.count * self.record_size:
+            self.close()
+            raise BreachCorpusError(f"{path} is not a breach corpus; build one with python -m app.breach build")
+
+    def __len__(self):
+        return self.count
+
+    def _bucket_end(self, bucket):
+        return BUCKET.unpack_from(self._map, HEADER.size + bucket * BUCKET.size)[0]
+
+    def contains(self, digest):
+        """Whether a SHA-1 digest (raw bytes) is in the corpus"""
+        key = digest[:self.record_size]
+        bucket = int.from_bytes(key[:2], "big")
+        lo = self._bucket_end(bucket - 1) if bucket else 0
+        hi = self._bucket_end(bucket)
+        size, base, data = self.record_size, self._records, self._map
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = base + mid * size
+            probe = data[start:start + size]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains_password(self, password):
+        return self.contains(hashlib.sha1(password.encode()).digest())
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+_corpus = None
+
+
+def open_breach_corpus(path=None):
+    """Map the configured corpus, if there is one; called once at startup"""
+    global _corpus
+    path = path or config.BREACH_CORPUS_FILE
+    if _corpus is None and path and os.path.exists(path):
+        _corpus = BreachCorpus(path)
+    return _corpus
+
+
+def get_breach_corpus():
+    """The mapped corpus, or None when no corpus file is configured"""
+    return _corpus
+
+
+def close_breach_corpus():
+    global _corpus
+    if _corpus is not None:
+        _corpus.close()
+        _corpus = None
+
+
+def _digests(lines, record_size):
+    """Truncated digests of "SHA1HEX[:count]" lines, the HIBP download format"""
+    for number, line in enumerate(lines, 1):
+        text = line.split(":", 1)[0].strip()
+        if not text:
+            continue
+        try:
+            digest = bytes.fromhex(text)
+        except ValueError:
+            digest = b""
+        if len(digest) != 20:
+            raise BreachCorpusError(f"line {number}: expected a hex SHA-1, got {text[:50]!r}")
+        yield digest[:record_size]
+
+
+def _write_run(directory, records):
+    records.sort()
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as run:
+        run.write(b"".join(records))
+    return run.name
+
+
+def _read_run(path, record_size, block_records=65536):
+    with open(path, "rb") as run:
+        while True:
+            block = run.read(record_size * block_records)
+            if not block:
+                return
+            for start in range(0, len(block), record_size):
+                yield block[start:start + record_size]
+
+
+def build(source, output, record_size=DEFAULT_RECORD_SIZE, run_records=5_000_000):
+    """Write a corpus file from a text list of SHA-1 hashes; returns the number of distinct records.
+
+    Input does not have to be sorted: it is sorted in runs of `run_records` and
+    merged, so memory stays bounded whatever the list size.
+    """
+    if not 2 <= record_size <= 20:
+        raise BreachCorpusError("record size must be between 2 and 20 bytes")
+    directory = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        runs = []
+        records = []
+        with open(source, encoding="ascii", errors="replace") as lines:
+            for digest in _digests(lines, record_size):
+                records.append(digest)
+                if len(records) >= run_records:
+                    runs.append(_write_run(scratch, records))
+                    records = []
+        if records:
+            runs.append(_write_run(scratch, records))
+
+        partial = os.path.join(scratch, "corpus")
+        fanout = [0] * 65536
+        count = 0
+        with open(partial, "wb") as out:
+            out.write(b"\0" * (HEADER.size + FANOUT.size))
+            previous = None
+            for record in heapq.merge(*(_read_run(run, record_size) for run in runs)):
+                if record == previous:
+                    continue
+                out.write(record)
+                fanout[int.from_bytes(record[:2], "big")] += 1
+                previous = record
+                count += 1
+            for bucket in range(1, 65536):
+                fanout[bucket] += fanout[bucket - 1]
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, record_size, count))
+            out.write(FANOUT.pack(*fanout))
+        os.replace(partial, output)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the breached-password corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    make = sub.add_parser("build", help="build a corpus file from a list of SHA-1 hashes")
+    make.add_argument("source")
+    make.add_argument("output", nargs="?", default=config.BREACH_CORPUS_FILE)
+    make.add_argument("--record-size", type=int, default=DEFAULT_RECORD_SIZE, help="bytes kept per digest")
+    check = sub.add_parser("check", help="look SHA-1 hashes up in the corpus")
+    check.add_argument("hashes", nargs="+")
+    check.add_argument("--corpus", default=config.BREACH_CORPUS_FILE)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "build":
+            count = build(args.source, args.output, args.record_size)
+            print(f"Wrote {count} hashes to {args.output}")
+            return 0
+        corpus = BreachCorpus(args.corpus)
+    except (BreachCorpusError, OSError) as err:
+        print(err)
+        return 1
+    try:
+        for text in args.hashes:
+            print(f"{text}\t{'breached' if corpus.contains(bytes.fromhex(text)) else 'not found'}")
+    finally:
+        corpus.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
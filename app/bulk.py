@@ -0,0 +1,165 @@
+import heapq
+import json
+
+import aiomysql
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.crypto import column_aad, get_crypto_pool
+from app.keystore import user_data_keys
+from app.models.bulk import BulkImportResult, BulkRowError
+
+BULK_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class _InvalidLine:
+    def __init__(self, error):
+        self.error = error
+
+
+def _loads(raw):
+    try:
+        return json.loads(raw)
+    except ValueError as err:
+        return _InvalidLine(f"Invalid JSON: {err}")
+
+
+async def iter_records(request):
+    """Yield (index, record) from a JSON array body or, for NDJSON, line by line as it arrives"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        index = 0
+        pending = b""
+        async for chunk in request.stream():
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _loads(line)
+                    index += 1
+        if pending.strip():
+            yield index, _loads(pending)
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {err}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or an NDJSON stream")
+    for index, record in enumerate(records):
+        yield index, record
+
+
+def _describe(err):
+    if isinstance(err, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in err.errors()
+        )
+    return str(err)
+
+
+class _BulkWriter:
+    def __init__(self, conn, sql, secrets=None):
+        self.conn = conn
+        self.sql = sql
+        self.secrets = secrets
+        self.result = BulkImportResult(inserted=0, failed=0, errors=[])
+        self.indices = []
+        self.params = []
+        # Rows that fail validation are rejected as they arrive, rows that fail in the
+        # database only when their chunk is flushed, so rejections come out of order.
+        # Keep the MAX_REPORTED_ERRORS lowest indices (a max-heap on -index).
+        self._errors = []
+
+    def reject(self, index, error):
+        self.result.failed += 1
+        entry = (-index, error)
+        if len(self._errors) < MAX_REPORTED_ERRORS:
+            heapq.heappush(self._errors, entry)
+        elif entry > self._errors[0]:
+            heapq.heapreplace(self._errors, entry)
+
+    def finish(self):
+        self.result.errors = [BulkRowError(index=-negated, error=error)
+                              for negated, error in sorted(self._errors, reverse=True)]
+        return self.result
+
+    async def seal(self):
+        """Encrypt the secret params of the pending rows under their owners' data keys, in one batch"""
+        table, positions = self.secrets
+        keys = await user_data_keys(self.conn, [params[0] for params in self.params])
+        indices, rows = [], []
+        for index, params in zip(self.indices, self.params):
+            if params[0] in keys:
+                indices.append(index)
+                rows.append(list(params))
+            else:
+                self.reject(index, "User not found")
+        sealed = iter(await get_crypto_pool().encrypt_many_async(
+            (keys[row[0]].key, row[position], column_aad(table, column, row[0]))
+            for row in rows for position, column in positions.items()
+        ))
+        for row in rows:
+            for position in positions:
+                row[position] = next(sealed)
+            row.append(keys[row[0]].version)
+        self.indices, self.params = indices, [tuple(row) for row in rows]
+
+    async def flush(self):
+        if self.params and self.secrets:
+            await self.seal()
+        if not self.params:
+            return
+        cursor = await self.conn.cursor()
+        try:
+            try:
+                # One multi-row INSERT and one commit for the whole chunk
+                await cursor.executemany(self.sql, self.params)
+                await self.conn.commit()
+                self.result.inserted += len(self.params)
+            except aiomysql.Error:
+                # Something in the chunk violates a constraint: retry row by row
+                # so the good rows still land and each bad one gets its own error.
+                await self.conn.rollback()
+                for index, params in zip(self.indices, self.params):
+                    try:
+                        await cursor.execute(self.sql, params)
+                        self.result.inserted += 1
+                    except aiomysql.Error as err:
+                        self.reject(index, f"Database error: {err}")
+                await self.conn.commit()
+        finally:
+            await cursor.close()
+            self.indices, self.params = [], []
+
+
+async def bulk_insert(conn, records, model, sql, to_params, chunk_size=BULK_CHUNK_SIZE, secrets=None):
+    """Validate `records` with `model` and insert them with executemany in chunked transactions.
+
+    `secrets` is (table, {param position: column}) for values to encrypt before
+    insertion; the first param of every row must then be the owner's user_id, and
+    the key version is appended as the last param, so `sql` must end with key_version.
+    """
+    writer = _BulkWriter(conn, sql, secrets)
+    try:
+        async for index, record in records:
+            try:
+                if isinstance(record, _InvalidLine):
+                    raise ValueError(record.error)
+                if not isinstance(record, dict):
+                    raise ValueError("Expected a JSON object")
+                item = model(**record)
+            except ValueError as err:
+                writer.reject(index, _describe(err))
+                continue
+            writer.indices.append(index)
+            writer.params.append(to_params(item))
+            if len(writer.params) >= chunk_size:
+                await writer.flush()
+        await writer.flush()
+    except aiomysql.Error as err:
+        await conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    return writer.finish()
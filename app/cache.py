@@ -0,0 +1,243 @@
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi.encoders import jsonable_encoder
+
+from app import config
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """How one resource may be cached.
+
+    Cached values are the API response models, which never carry the *_encrypted
+    columns, so secrets are not cached at all. `shared` controls whether a resource
+    may leave the process: resources with shared=False stay in the local LRU even
+    when a shared backend is configured.
+    """
+    ttl: float
+    enabled: bool = True
+    shared: bool = True
+
+
+CACHE_POLICIES = {
+    "users": CachePolicy(ttl=300),
+    "credentials": CachePolicy(ttl=120),
+    "email_accounts": CachePolicy(ttl=120),
+    "devices": CachePolicy(ttl=300),
+    # Card holder and expiry are still payment data: keep them in this process only
+    "credit_cards": CachePolicy(ttl=60, shared=False),
+}
+
+
+class LRUCache:
+    """In-process LRU with per-entry TTL and a bound on the number of entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()        # key -> (expires_at, owner, value)
+        self._owners = {}                    # owner user_id -> set of keys
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, owner, value = entry
+        if expires_at < time.monotonic():
+            self._discard(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, owner, value, ttl):
+        if key in self._entries:
+            self._discard(key)
+        self._entries[key] = (time.monotonic() + ttl, owner, value)
+        self._owners.setdefault(owner, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    async def delete(self, key):
+        self._discard(key)
+
+    async def delete_owner(self, owner):
+        for key in list(self._owners.get(owner, ())):
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._owners.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._owners[entry[1]]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Shared backend; values are stored as JSON and each owner keeps an index set of its keys"""
+
+    def __init__(self, url, prefix="vault-cache:"):
+        import redis.asyncio as redis   # optional dependency, only needed for CACHE_BACKEND=redis
+
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+        # The owner index must outlive every key it lists
+        self._index_ttl = int(max(policy.ttl for policy in CACHE_POLICIES.values()))
+        self.evictions = 0               # evictions happen inside Redis (maxmemory policy)
+        self.expirations = 0
+
+    def _owner_key(self, owner):
+        return f"{self._prefix}owner:{owner}"
+
+    async def get(self, key):
+        raw = await self._redis.get(self._prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key, owner, value, ttl):
+        pipe = self._redis.pipeline()
+        pipe.set(self._prefix + key, json.dumps(value), ex=int(ttl))
+        pipe.sadd(self._owner_key(owner), key)
+        pipe.expire(self._owner_key(owner), self._index_ttl)
+        await pipe.execute()
+
+    async def delete(self, key):
+        await self._redis.delete(self._prefix + key)
+
+    async def delete_owner(self, owner):
+        keys = await self._redis.smembers(self._owner_key(owner))
+        names = [self._prefix + key.decode() for key in keys] + [self._owner_key(owner)]
+        await self._redis.delete(*names)
+
+
+class ReadThroughCache:
+    """Per-resource read-through cache for single-item GETs, with write invalidation.
+
+    Every invalidation bumps a version counter and records it against the key (or
+    the owner). A caller reads version() before loading an item and passes it to
+    set(), which drops the value if the item was invalidated since: a PUT or DELETE
+    that lands between the load and the set cannot leave the old value cached.
+    Versions are kept per process, for the most recent `tracked` keys and owners.
+    """
+
+    def __init__(self, local, shared=None, policies=None, tracked=None):
+        self.local = local
+        self.shared = shared
+        self.policies = CACHE_POLICIES if policies is None else policies
+        self.tracked = tracked or config.CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_sets = 0                 # set() calls dropped because of a later invalidation
+        self._version = 0
+        self._invalidated = OrderedDict()   # key or "owner:<user_id>" -> version of its last invalidation
+        self._forgotten = 0                 # newest version dropped from _invalidated
+
+    def _backend(self, policy):
+        return self.shared if (self.shared is not None and policy.shared) else self.local
+
+    async def get(self, resource, item_id):
+        policy = self.policies.get(resource)
+        if policy is None or not policy.enabled:
+            return None
+        value = await self._backend(policy).get(f"{resource}:{item_id}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def version(self):
+        """Read before loading an item; set() takes it to detect invalidations during the load"""
+        return self._version
+
+    def _bump(self, name):
+        self._version += 1
+        self._invalidated.pop(name, None)
+        self._invalidated[name] = self._version
+        while len(self._invalidated) > self.tracked:
+            _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def _invalidated_since(self, version, *names):
+        # Names no longer tracked may have been invalidated as late as _forgotten
+        return any(self._invalidated.get(name, self._forgotten) > version for name in names)
+
+    async def set(self, resource, item_id, owner, value, version=None):
+        policy = self.policies.get(resource)
+        if policy is None or not policy.enabled:
+            return
+        key = f"{resource}:{item_id}"
+        if version is not None and self._invalidated_since(version, key, f"owner:{owner}"):
+            self.stale_sets += 1
+            return
+        await self._backend(policy).set(key, owner, value, policy.ttl)
+
+    async def invalidate(self, resource, item_id):
+        """Call after a PUT/DELETE of one item"""
+        self.invalidations += 1
+        key = f"{resource}:{item_id}"
+        self._bump(key)
+        await self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    async def invalidate_user(self, user_id):
+        """Call after deleting a user: ON DELETE CASCADE removed all of their items"""
+        self.invalidations += 1
+        self._bump(f"owner:{user_id}")
+        await self.local.delete_owner(user_id)
+        if self.shared is not None:
+            await self.shared.delete_owner(user_id)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0.0,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+            "evictions": self.local.evictions + (self.shared.evictions if self.shared else 0),
+            "expirations": self.local.expirations + (self.shared.expirations if self.shared else 0),
+            "local_entries": len(self.local),
+            "shared_backend": type(self.shared).__name__ if self.shared else None,
+        }
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        shared = RedisCache(config.CACHE_REDIS_URL) if config.CACHE_BACKEND == "redis" else None
+        _cache = ReadThroughCache(LRUCache(config.CACHE_MAX_ENTRIES), shared)
+    return _cache
+
+
+async def read_through(resource, item_id, model, load, cacheable=None):
+    """Return `model` for one item from the cache, falling back to `await load()` and caching its result.
+
+    `cacheable()`, when given, is asked after the load; a false answer (the row came
+    from a replica that may not have applied the write that invalidated the entry)
+    returns the result without caching it. Neither is a result cached when the item
+    was invalidated while it loaded.
+    """
+    cache = get_cache()
+    cached = await cache.get(resource, item_id)
+    if cached is not None:
+        return model(**cached)
+    version = cache.version()
+    result = await load()
+    if cacheable is None or cacheable():
+        await cache.set(resource, item_id, result.user_id, jsonable_encoder(result), version)
+    return result
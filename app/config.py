@@ -0,0 +1,97 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Database connection settings
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = _env_int("DB_PORT", 3306)
+DB_USER = os.getenv("DB_USER", "root")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "")
+DB_NAME = os.getenv("DB_NAME", "credentials_vault")
+
+# Connection pool settings
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)                      # connections kept open
+DB_POOL_MAX_OVERFLOW = _env_int("DB_POOL_MAX_OVERFLOW", 10)      # extra connections under load
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 5.0)             # seconds to wait for a free connection
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)           # health check on checkout
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)              # max connection age in seconds
+DB_PREPARED_STATEMENTS = _env_int("DB_PREPARED_STATEMENTS", 64)  # statements prepared per connection (LRU), 0 = off
+DB_CONNECTION_BUDGET = _env_int("DB_CONNECTION_BUDGET", 0)      # connections across all WEB_WORKERS, 0 = DB_POOL_* each
+
+# Read replicas (see app.replicas): GET/HEAD reads are spread over them, writes go to DB_HOST
+DB_REPLICAS = os.getenv("DB_REPLICAS", "")                       # host[:port],host[:port]; empty = primary only
+DB_REPLICA_SELECTION = os.getenv("DB_REPLICA_SELECTION", "round_robin")  # round_robin | least_loaded
+DB_REPLICA_MAX_LAG_SECONDS = _env_float("DB_REPLICA_MAX_LAG_SECONDS", 5)  # replicas further behind are skipped
+DB_REPLICA_CHECK_SECONDS = _env_float("DB_REPLICA_CHECK_SECONDS", 1)      # lag measured this often per worker
+
+# Incremental sync: changes younger than this are held back for one poll so that a
+# transaction that allocated a lower change_id but committed later is never skipped
+SYNC_SETTLE_SECONDS = _env_int("SYNC_SETTLE_SECONDS", 1)
+
+# Read-through cache for single-item GETs
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")            # memory | redis
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 10000)         # local LRU bound
+
+# Envelope encryption of the *_encrypted columns
+MASTER_KEY_FILE = os.getenv("MASTER_KEY_FILE", "master.key")     # create with: python -m app.crypto generate-key
+CRYPTO_WORKERS = _env_int("CRYPTO_WORKERS", os.cpu_count() or 1) # processes for bulk encrypt/decrypt
+CRYPTO_INLINE_MAX = _env_int("CRYPTO_INLINE_MAX", 256)           # larger batches are split across the workers
+DATA_KEY_CACHE_SIZE = _env_int("DATA_KEY_CACHE_SIZE", 1024)      # unwrapped user keys kept in memory
+DATA_KEY_CACHE_TTL = _env_int("DATA_KEY_CACHE_TTL", 300)         # seconds before a cached key is re-read
+
+# Key rotation job (python -m app.rotation)
+KEY_ROTATION_CHUNK_SIZE = _env_int("KEY_ROTATION_CHUNK_SIZE", 500)              # rows per transaction
+KEY_ROTATION_ROWS_PER_SECOND = _env_float("KEY_ROTATION_ROWS_PER_SECOND", 500)  # throttle, 0 = unthrottled
+
+# Master-password hashing (scrypt); tune with: python -m app.passwords calibrate
+PASSWORD_SCRYPT_LOG_N = _env_int("PASSWORD_SCRYPT_LOG_N", 15)    # N = 2**15 with r=8 uses 32 MiB per hash
+PASSWORD_SCRYPT_R = _env_int("PASSWORD_SCRYPT_R", 8)
+PASSWORD_SCRYPT_P = _env_int("PASSWORD_SCRYPT_P", 1)
+PASSWORD_HASH_WORKERS = _env_int("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2))  # hashes in parallel
+PASSWORD_HASH_QUEUE = _env_int("PASSWORD_HASH_QUEUE", 64)        # waiting hashes before answering 503
+
+# Vault search (in-memory trigram indexes, see app.search)
+SEARCH_MIN_SIMILARITY = _env_float("SEARCH_MIN_SIMILARITY", 0.3)   # share of query trigrams an item must contain
+SEARCH_INDEX_MAX_ITEMS = _env_int("SEARCH_INDEX_MAX_ITEMS", 500000)  # items indexed per process, across users
+
+# Credential URL domains for autofill matching (see app.domains)
+PUBLIC_SUFFIX_FILE = os.getenv("PUBLIC_SUFFIX_FILE", "public_suffix_list.dat")  # built-in subset if missing
+
+# Vault health reports (see app.health and app.breach)
+BREACH_CORPUS_FILE = os.getenv("BREACH_CORPUS_FILE", "breached_passwords.idx")  # build with: python -m app.breach build
+HEALTH_CARD_EXPIRY_DAYS = _env_int("HEALTH_CARD_EXPIRY_DAYS", 60)  # cards expiring within this many days are flagged
+HEALTH_MAX_USERS = _env_int("HEALTH_MAX_USERS", 1000)              # users whose health state is kept per process
+
+# Query tracing and the slow-query log (see app.tracing)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")             # none | file | otlp
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")             # OTLP/JSON lines, for TRACE_EXPORTER=file
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318")  # collector, for TRACE_EXPORTER=otlp
+SLOW_QUERY_MS = _env_float("SLOW_QUERY_MS", 200)                 # round trips at least this slow are logged, 0 = off
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "")       # also append the slow-query log here
+
+# Query auditing for development and tests (see app.query_audit, tests.query_audit_plugin)
+QUERY_AUDIT = _env_bool("QUERY_AUDIT", False)                    # log N+1 / repeated queries, add X-Query-Count
+QUERY_AUDIT_LOOP_THRESHOLD = _env_int("QUERY_AUDIT_LOOP_THRESHOLD", 3)  # same statement from one call stack
+
+# Serving (python -m app.serve): one worker process per core, each with its own pool and caches
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = _env_int("WEB_PORT", 8000)
+WEB_WORKERS = _env_int("WEB_WORKERS", os.cpu_count() or 1)       # worker processes sharing DB_CONNECTION_BUDGET
+SHUTDOWN_GRACE_SECONDS = _env_float("SHUTDOWN_GRACE_SECONDS", 30)  # in-flight requests get this long to finish
+DB_POOL_DRAIN_SECONDS = _env_float("DB_POOL_DRAIN_SECONDS", 5)   # then checked-out connections get this long
+SEARCH_PRELOAD_USERS = _env_int("SEARCH_PRELOAD_USERS", 0)       # most recently active users indexed at startup
@@ -0,0 +1,226 @@
+"""Envelope encryption for the *_encrypted columns.
+
+Every user has a random 256-bit data key, stored in user_keys wrapped with
+AES-GCM under the master key read from config.MASTER_KEY_FILE. Column values are
+AES-GCM ciphertexts under the owner's data key, with the table, column and owner
+bound in as associated data, so a value copied into another column, row owner or
+table fails to decrypt instead of leaking.
+
+Stored format: "ev1:" + base64(nonce || ciphertext || tag). Values without the
+prefix predate server-side encryption and are returned as they are.
+
+Bulk paths (import, export, key rotation) go through CryptoPool, which fans chunks
+of values out to worker processes so AES-GCM does not serialize on the GIL.
+
+    python -m app.crypto generate-key [path]
+"""
+import asyncio
+import base64
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app import config
+
+PREFIX = "ev1:"
+NONCE_SIZE = 12
+KEY_SIZE = 32
+
+# Secret columns per table, in the order they appear in the schema
+ENCRYPTED_COLUMNS = {
+    "credentials": ["password_encrypted"],
+    "email_accounts": ["password_encrypted"],
+    "credit_cards": ["card_number_encrypted", "cvv_encrypted"],
+    "devices": ["admin_password_encrypted"],
+}
+
+
+class MasterKeyError(Exception):
+    pass
+
+
+def generate_key_file(path):
+    if os.path.exists(path):
+        raise MasterKeyError(f"{path} already exists; refusing to overwrite a master key")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as keyfile:
+        keyfile.write(base64.b64encode(AESGCM.generate_key(bit_length=KEY_SIZE * 8)).decode() + "\n")
+
+
+def load_master_key(path):
+    try:
+        with open(path) as keyfile:
+            key = base64.b64decode(keyfile.read().strip(), validate=True)
+    except FileNotFoundError:
+        raise MasterKeyError(f"Master key file {path} not found; create one with python -m app.crypto generate-key")
+    except ValueError:
+        raise MasterKeyError(f"Master key file {path} is not valid base64")
+    if len(key) != KEY_SIZE:
+        raise MasterKeyError(f"Master key in {path} must be {KEY_SIZE} bytes, got {len(key)}")
+    return key
+
+
+_master = None
+
+
+def master_key():
+    global _master
+    if _master is None:
+        _master = AESGCM(load_master_key(config.MASTER_KEY_FILE))
+    return _master
+
+
+def _key_aad(user_id):
+    return f"user_keys:{user_id}".encode()
+
+
+def new_data_key(user_id):
+    """Return (data key, wrapped data key) for a user"""
+    key = AESGCM.generate_key(bit_length=KEY_SIZE * 8)
+    nonce = os.urandom(NONCE_SIZE)
+    return key, nonce + master_key().encrypt(nonce, key, _key_aad(user_id))
+
+
+def unwrap_data_key(user_id, wrapped):
+    wrapped = bytes(wrapped)
+    return master_key().decrypt(wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], _key_aad(user_id))
+
+
+def column_aad(table, column, user_id):
+    return f"{table}.{column}:{user_id}".encode()
+
+
+def encrypt_value(key, plaintext, aad):
+    if plaintext is None:
+        return None
+    nonce = os.urandom(NONCE_SIZE)
+    sealed = AESGCM(key).encrypt(nonce, plaintext.encode(), aad)
+    return PREFIX + base64.b64encode(nonce + sealed).decode()
+
+
+def decrypt_value(key, stored, aad):
+    """Decrypt a stored column value; raises cryptography's InvalidTag if it was tampered with"""
+    if stored is None or not stored.startswith(PREFIX):
+        return stored
+    raw = base64.b64decode(stored[len(PREFIX):])
+    return AESGCM(key).decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], aad).decode()
+
+
+def seal(key, user_id, table, column, plaintext):
+    """Encrypt one column value of a row owned by user_id"""
+    return encrypt_value(key, plaintext, column_aad(table, column, user_id))
+
+
+def open_sealed(key, user_id, table, column, stored):
+    return decrypt_value(key, stored, column_aad(table, column, user_id))
+
+
+# Worker-process entry points: module level so they pickle. Each item is
+# (data key, value, associated data).
+
+def _encrypt_chunk(items):
+    return [encrypt_value(key, value, aad) for key, value, aad in items]
+
+
+def _decrypt_chunk(items):
+    return [decrypt_value(key, value, aad) for key, value, aad in items]
+
+
+class CryptoPool:
+    """Batches AEAD work onto a process pool.
+
+    Batches of up to `inline_max` values run inline: shipping a handful of values
+    to a worker costs more than encrypting them. Larger ones (a bulk-import,
+    export or rotation chunk) are split into one slice per worker.
+    """
+
+    def __init__(self, workers=None, inline_max=None):
+        self.workers = workers or config.CRYPTO_WORKERS
+        self.inline_max = config.CRYPTO_INLINE_MAX if inline_max is None else inline_max
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn, not fork: the server process has an event loop and threads running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _inline(self, items):
+        return len(items) <= self.inline_max or self.workers <= 1
+
+    def _chunks(self, items):
+        size = -(-len(items) // self.workers)
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _map(self, fn, items):
+        items = list(items)
+        if self._inline(items):
+            return fn(items)
+        return [value for chunk in self._pool().map(fn, self._chunks(items)) for value in chunk]
+
+    async def _map_async(self, fn, items):
+        items = list(items)
+        if self._inline(items):
+            return fn(items)
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._pool(), fn, chunk) for chunk in self._chunks(items))
+        )
+        return [value for chunk in chunks for value in chunk]
+
+    def encrypt_many(self, items):
+        return self._map(_encrypt_chunk, items)
+
+    def decrypt_many(self, items):
+        return self._map(_decrypt_chunk, items)
+
+    async def encrypt_many_async(self, items):
+        return await self._map_async(_encrypt_chunk, items)
+
+    async def decrypt_many_async(self, items):
+        return await self._map_async(_decrypt_chunk, items)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_crypto_pool = None
+
+
+def get_crypto_pool():
+    global _crypto_pool
+    if _crypto_pool is None:
+        _crypto_pool = CryptoPool()
+    return _crypto_pool
+
+
+def close_crypto_pool():
+    global _crypto_pool
+    if _crypto_pool is not None:
+        _crypto_pool.shutdown()
+        _crypto_pool = None
+
+
+def main(argv):
+    if len(argv) not in (1, 2) or argv[0] != "generate-key":
+        print("usage: python -m app.crypto generate-key [path]")
+        return 2
+    path = argv[1] if len(argv) == 2 else config.MASTER_KEY_FILE
+    try:
+        generate_key_file(path)
+    except MasterKeyError as err:
+        print(err)
+        return 1
+    print(f"Wrote a new master key to {path}; back it up, data is unrecoverable without it")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,15 +1,221 @@
+import contextlib
+import threading
+import time
+from collections import deque
+
 import mysql.connector
 from fastapi import HTTPException
 
+from app import config
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+class PooledConnection:
+    """Wraps a raw connection; close() hands it back to the pool instead of closing it"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, self._created_at)
+
+
+class ConnectionPool:
+    def __init__(self, connect, pool_size=5, max_overflow=10, timeout=5.0,
+                 pre_ping=True, recycle=1800):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.recycle = recycle
+
+        self._idle = deque()          # (raw connection, created_at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        # Counters used to size the pool
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+
+    @property
+    def max_size(self):
+        return self.pool_size + self.max_overflow
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._cond:
+            if not self._idle and self._in_use >= self.max_size:
+                self._waits += 1
+                started = time.monotonic()
+                ready = self._cond.wait_for(
+                    lambda: self._idle or self._in_use < self.max_size, timeout
+                )
+                self._wait_time += time.monotonic() - started
+                if not ready:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No connection available within {timeout}s")
+            self._in_use += 1
+            idle = self._idle.popleft() if self._idle else None
+
+        try:
+            raw, created_at = self._checkout(idle)
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, raw, created_at)
+
+    def _checkout(self, idle):
+        if idle is not None:
+            raw, created_at = idle
+            if self.recycle and time.monotonic() - created_at > self.recycle:
+                self._close_quietly(raw)
+                self._count("_recycled")
+            elif self.pre_ping and not self._is_alive(raw):
+                self._close_quietly(raw)
+                self._count("_discarded")
+            else:
+                return raw, created_at
+        raw = self._connect()
+        self._count("_created")
+        return raw, time.monotonic()
+
+    def _count(self, counter):
+        with self._cond:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def release(self, raw, created_at):
+        keep = True
+        try:
+            # Never hand out a connection with an open transaction (or a stale snapshot)
+            if raw.in_transaction:
+                raw.rollback()
+        except mysql.connector.Error:
+            keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            self._close_quietly(raw)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waits": self._waits,
+                "wait_time_seconds": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+            }
+
+    def dispose(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _is_alive(raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except mysql.connector.Error:
+            pass
+
+
+def _connect():
+    return mysql.connector.connect(
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=config.DB_NAME,
+    )
+
+
+@contextlib.contextmanager
+def change_log_off(conn):
+    """Updates made on `conn` inside the block are not written to vault_changes.
+
+    For maintenance that rewrites how rows are stored but not what the user stored
+    (re-sealing under a new key, derived columns): logging it would move every list
+    ETag and make sync clients download the rows again. See migration 0003.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET @vault_changes_skip = 1")
+        yield
+    finally:
+        cursor.execute("SET @vault_changes_skip = NULL")
+        cursor.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_POOL_MAX_OVERFLOW,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    pre_ping=config.DB_POOL_PRE_PING,
+                    recycle=config.DB_POOL_RECYCLE,
+                )
+    return _pool
+
+
 def get_connection():
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database="credentials_vault",
-              # Use dictionary cursor for named access to columns
-        )
-        return conn
+        return get_pool().acquire()
+    except PoolTimeout as err:
+        raise HTTPException(status_code=503, detail=f"Database busy: {err}")
     except mysql.connector.Error as err:
-        raise HTTPException(status_code=500, detail=f"Database connection error: {err}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database connection error: {err}")
+
+
+def get_db():
+    """FastAPI dependency yielding a pooled connection for the duration of a request"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,669 @@
+import asyncio
+import contextlib
+import functools
+import re
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from enum import Enum
+
+import aiomysql
+from fastapi import HTTPException
+from pymysql.constants import CLIENT
+
+from app import config
+from app.db import PoolTimeout
+from app.metrics import POOL_WAIT_SECONDS, observe_query, operation
+from app.query_audit import audit_connection, audit_query
+from app.replicas import Replica, ReplicaRouter, route_read
+from app.tracing import log_slow_query, record_query
+
+
+# MySQL error raised when an INSERT/UPDATE references a missing parent row
+ER_NO_REFERENCED_ROW = 1452
+# PREPARE failures that fall back to sending the statement as text
+ER_UNSUPPORTED_PS = 1295
+ER_MAX_PREPARED_STMT_COUNT_REACHED = 1461
+
+# Round trips at least this slow are logged with their EXPLAIN plans (app.tracing)
+SLOW_QUERY_SECONDS = config.SLOW_QUERY_MS / 1000 if config.SLOW_QUERY_MS > 0 else float("inf")
+
+# Statements sent to the server in the current context, when record_queries() is active
+_query_log = ContextVar("query_log", default=None)
+
+
+@contextlib.contextmanager
+def record_queries():
+    """Collect the SQL of every round trip issued inside the block (COMMIT/ROLLBACK included)"""
+    log = []
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+def _record(sql, args=None):
+    log = _query_log.get()
+    if log is not None:
+        log.append(sql)
+    audit_query(sql, args)
+
+
+def _db_params(args):
+    # pymysql would send str(member) ("DeviceType.LAPTOP") for str-based enums
+    if args is None or isinstance(args, dict):
+        return args
+    return tuple(arg.value if isinstance(arg, Enum) else arg for arg in args)
+
+
+PREPARABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE")
+# Statements with more parameters (multi-row INSERTs, long IN lists) stay text:
+# their shapes rarely repeat and each call would need as many SET variables
+MAX_PREPARED_PARAMS = 32
+_PLACEHOLDER = re.compile(r"%(s|%)")
+
+
+class PreparedStats:
+    """Counters shared by the statement caches of one pool"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity      # statements per connection; 0 = the server allows none
+        self.prepares = 0             # PREPAREs sent (cache misses that succeeded)
+        self.executes = 0             # EXECUTEs of a cached statement
+        self.text = 0                 # statements sent as text (not preparable, or fallback)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0            # DEALLOCATEs sent to stay within capacity
+        self.invalidated = 0          # cached statements dropped with a recycled/discarded connection
+        self.fallbacks = 0            # PREPAREs the server refused
+        self.unpreparable = set()     # statements the server cannot prepare (ER_UNSUPPORTED_PS)
+        self._seen = OrderedDict()    # statements sent once as text, see admit()
+
+    def admit(self, query):
+        """Whether `query` has been seen before; one-off shapes are never prepared"""
+        if query in self._seen:
+            return True
+        self._seen[query] = None
+        if len(self._seen) > 16 * max(self.capacity, 1):
+            self._seen.popitem(last=False)
+        return False
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "capacity_per_connection": self.capacity,
+            "prepares": self.prepares,
+            "executes": self.executes,
+            "text": self.text,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidated": self.invalidated,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class StatementCache:
+    """Statements PREPAREd on one connection, keyed by SQL text, least recently used first.
+
+    aiomysql only speaks the text protocol, so this uses SQL-level prepared
+    statements: PREPARE once per connection, then `SET @p..; EXECUTE .. USING @p..`.
+    The server parses and resolves the statement once instead of on every call.
+    They live in the server session, so the cache goes away with the connection.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._names = OrderedDict()
+        self._serial = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    async def name(self, cursor, query, args):
+        """Name of the prepared form of `query`, preparing it on a miss; None to send it as text"""
+        stats = self.stats
+        if (args is None or isinstance(args, dict) or len(args) > MAX_PREPARED_PARAMS
+                or not query.lstrip()[:7].upper().startswith(PREPARABLE)):
+            stats.text += 1
+            return None
+        name = self._names.get(query)
+        if name is not None:
+            self._names.move_to_end(query)
+            stats.hits += 1
+            stats.executes += 1
+            return name
+        stats.misses += 1
+        if query in stats.unpreparable or not stats.admit(query):
+            stats.text += 1
+            return None
+
+        statements = []
+        if len(self._names) >= stats.capacity:
+            _, evicted = self._names.popitem(last=False)
+            statements.append(f"DEALLOCATE PREPARE {evicted}")
+            stats.evictions += 1
+        self._serial += 1
+        name = f"vault_stmt{self._serial}"
+        text = _PLACEHOLDER.sub(lambda match: "?" if match.group(1) == "s" else "%", query)
+        statements.append(f"PREPARE {name} FROM {cursor.connection.escape(text)}")
+        try:
+            # Its own round trip, so a refused PREPARE never leaves the batch half-run
+            await cursor.execute(";\n".join(statements))
+            while await cursor.nextset():
+                pass
+        except aiomysql.Error as err:
+            if err.args[0] not in (ER_UNSUPPORTED_PS, ER_MAX_PREPARED_STMT_COUNT_REACHED):
+                raise
+            if err.args[0] == ER_UNSUPPORTED_PS:
+                stats.unpreparable.add(query)
+            stats.fallbacks += 1
+            stats.text += 1
+            return None
+        self._names[query] = name
+        stats.prepares += 1
+        stats.executes += 1
+        return name
+
+
+def _execute_prepared(cursor, name, args):
+    """SQL running prepared statement `name` with `args`: the SET (if any), then the EXECUTE"""
+    if not args:
+        return [f"EXECUTE {name}"]
+    variables = [f"@vault_p{i}" for i in range(len(args))]
+    return [
+        cursor.mogrify("SET " + ", ".join(f"{variable} = %s" for variable in variables), args),
+        f"EXECUTE {name} USING {', '.join(variables)}",
+    ]
+
+
+class InstrumentedCursor:
+    """Delegates to an aiomysql cursor, normalising parameters and recording round trips.
+
+    With a StatementCache, parameterised statements run as server-side prepared
+    statements; results, rowcount and lastrowid read the same either way.
+    """
+
+    def __init__(self, raw, statements=None, unbuffered=False):
+        self._raw = raw
+        self._statements = statements
+        self._unbuffered = unbuffered
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    async def _prepared(self, query, args):
+        if self._statements is None:
+            return None
+        return await self._statements.name(self._raw, query, args)
+
+    async def _observe(self, op, statements, started, rows):
+        """Metrics, trace span and slow-query log for one finished round trip"""
+        seconds = time.perf_counter() - started
+        observe_query(op, seconds, rows)
+        record_query(op, statements, seconds, rows)
+        if seconds >= SLOW_QUERY_SECONDS:
+            # No EXPLAIN while an unbuffered result is still being read: aiomysql would
+            # drop its unread rows to send it on the same connection
+            await log_slow_query(self._raw.connection, statements, seconds, explain=not self._unbuffered)
+
+    async def execute(self, query, args=None):
+        _record(query, args)
+        started = time.perf_counter()
+        args = _db_params(args)
+        try:
+            name = await self._prepared(query, args)
+            if name is None:
+                await self._raw.execute(query, args)
+            else:
+                statements = _execute_prepared(self._raw, name, args)
+                await self._raw.execute(";\n".join(statements))
+                if len(statements) > 1:
+                    await self._raw.nextset()       # past the SET to the EXECUTE result
+        except aiomysql.Error:
+            record_query(operation(query), [(query, args)], time.perf_counter() - started, -1, failed=True)
+            raise
+        await self._observe(operation(query), [(query, args)], started, self._raw.rowcount)
+        return self._raw.rowcount
+
+    async def executemany(self, query, args):
+        _record(query, args)
+        started = time.perf_counter()
+        try:
+            rowcount = await self._raw.executemany(query, [_db_params(row) for row in args])
+        except aiomysql.Error:
+            record_query(operation(query), [(query, None)], time.perf_counter() - started, -1, failed=True)
+            raise
+        # Not subject to the slow-query log: a multi-row write is slow by its size, not its plan
+        seconds = time.perf_counter() - started
+        observe_query(operation(query), seconds, self._raw.rowcount)
+        record_query(operation(query), [(query, None)], seconds, self._raw.rowcount)
+        return rowcount
+
+    async def execute_batch(self, statements):
+        """Send several (sql, params) statements in a single round trip.
+
+        Returns one (rowcount, rows) pair per statement. The server stops at the first
+        failing statement and the error is raised here, so callers roll back as usual.
+        """
+        _record(";\n".join(query for query, _ in statements), tuple(args for _, args in statements))
+        started = time.perf_counter()
+        parts = []
+        wanted = []         # per part: whether its result is one the caller asked for
+        for query, args in statements:
+            args = _db_params(args)
+            name = await self._prepared(query, args)
+            if name is None:
+                parts.append(self._raw.mogrify(query, args))
+                wanted.append(True)
+            else:
+                prepared = _execute_prepared(self._raw, name, args)
+                parts.extend(prepared)
+                wanted.extend([False] * (len(prepared) - 1) + [True])
+        try:
+            await self._raw.execute(";\n".join(parts))
+            results = []
+            for keep in wanted:
+                if keep:
+                    results.append((self._raw.rowcount, await self._raw.fetchall()))
+                if not await self._raw.nextset():
+                    break
+        except aiomysql.Error:
+            record_query("BATCH", statements, time.perf_counter() - started, -1, failed=True)
+            raise
+        await self._observe("BATCH", statements, started, sum(rowcount for rowcount, _ in results if rowcount > 0))
+        return results
+
+
+class AsyncPooledConnection:
+    """Async counterpart of app.db.PooledConnection; close() hands the connection back"""
+
+    def __init__(self, pool, raw, created_at, statements=None):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._statements = statements
+        self._released = False
+        self.replica = None     # the Replica it came from, None for the primary
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    async def cursor(self, *cursor_class):
+        unbuffered = bool(cursor_class) and issubclass(cursor_class[0], aiomysql.SSCursor)
+        # An unbuffered cursor streams only the first result of a round trip: aiomysql
+        # reads the EXECUTE result that follows a prepared statement's SET into memory,
+        # where SSCursor's fetch methods never look. Its statements go as text.
+        return InstrumentedCursor(await self._raw.cursor(*cursor_class),
+                                  None if unbuffered else self._statements, unbuffered)
+
+    async def commit(self):
+        _record("COMMIT")
+        started = time.perf_counter()
+        await self._raw.commit()
+        seconds = time.perf_counter() - started
+        observe_query("COMMIT", seconds, 0)
+        record_query("COMMIT", [("COMMIT", None)], seconds, 0)
+
+    async def rollback(self):
+        _record("ROLLBACK")
+        started = time.perf_counter()
+        await self._raw.rollback()
+        seconds = time.perf_counter() - started
+        observe_query("ROLLBACK", seconds, 0)
+        record_query("ROLLBACK", [("ROLLBACK", None)], seconds, 0)
+
+    async def close(self):
+        if not self._released:
+            self._released = True
+            await self._pool.release(self._raw, self._created_at, self._statements)
+
+
+class AsyncConnectionPool:
+    """asyncio-native pool with the same sizing knobs and counters as app.db.ConnectionPool"""
+
+    def __init__(self, connect, pool_size=5, max_overflow=10, timeout=5.0,
+                 pre_ping=True, recycle=1800, prepared_statements=0):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self.recycle = recycle
+        # Statements prepared per connection (0 = off); capped by the server limit on first connect
+        self.prepared_statements = prepared_statements
+        self._prepared = None
+
+        self._idle = deque()          # (raw connection, created_at, StatementCache or None)
+        self._in_use = 0
+        self._cond = asyncio.Condition()
+        self.closing = False          # set by close(): no more checkouts, returned connections are closed
+
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+
+    @property
+    def max_size(self):
+        return self.pool_size + self.max_overflow
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    async def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        acquire_started = time.perf_counter()
+        async with self._cond:
+            if not self.closing and not self._idle and self._in_use >= self.max_size:
+                self._waits += 1
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(
+                        self._cond.wait_for(lambda: self.closing or self._idle or self._in_use < self.max_size),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No connection available within {timeout}s")
+                finally:
+                    self._wait_time += time.monotonic() - started
+            if self.closing:
+                raise PoolTimeout("Connection pool is shutting down")
+            self._in_use += 1
+            idle = self._idle.popleft() if self._idle else None
+
+        try:
+            raw, created_at, statements = await self._checkout(idle)
+        except BaseException:
+            async with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - acquire_started)
+        audit_connection()
+        return AsyncPooledConnection(self, raw, created_at, statements)
+
+    async def _checkout(self, idle):
+        if idle is not None:
+            raw, created_at, statements = idle
+            if self.recycle and time.monotonic() - created_at > self.recycle:
+                await self._close_quietly(raw, statements)
+                self._recycled += 1
+            elif self.pre_ping and not await self._is_alive(raw):
+                await self._close_quietly(raw, statements)
+                self._discarded += 1
+            else:
+                return raw, created_at, statements
+        raw = await self._connect()
+        self._created += 1
+        return raw, time.monotonic(), await self._statement_cache(raw)
+
+    async def _statement_cache(self, raw):
+        if not self.prepared_statements:
+            return None
+        if self._prepared is None:
+            # max_prepared_stmt_count is a server-wide limit shared with every other
+            # client, so the pools of all WEB_WORKERS keep their connections within half of it
+            cursor = await raw.cursor()
+            try:
+                await cursor.execute("SELECT @@max_prepared_stmt_count")
+                (limit,) = await cursor.fetchone()
+            finally:
+                await cursor.close()
+            connections = self.max_size * config.WEB_WORKERS
+            self._prepared = PreparedStats(min(self.prepared_statements, limit // 2 // connections))
+        if not self._prepared.capacity:
+            return None
+        return StatementCache(self._prepared)
+
+    async def release(self, raw, created_at, statements=None):
+        keep = not raw.closed
+        if keep and raw.get_transaction_status():
+            try:
+                await raw.rollback()
+            except aiomysql.Error:
+                keep = False
+
+        async with self._cond:
+            self._in_use -= 1
+            if keep and not self.closing and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at, statements))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            await self._close_quietly(raw, statements)
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waits": self._waits,
+            "wait_time_seconds": round(self._wait_time, 6),
+            "timeouts": self._timeouts,
+            "created": self._created,
+            "recycled": self._recycled,
+            "discarded": self._discarded,
+            "prepared_statements": self._prepared.as_dict() if self._prepared else None,
+        }
+
+    async def warm(self, count=None):
+        """Open up to `count` (default pool_size) idle connections ahead of the first requests.
+
+        Returns how many were opened; raises the first connection error after
+        keeping the ones that succeeded.
+        """
+        async with self._cond:
+            wanted = self.pool_size if count is None else min(count, self.pool_size)
+            count = max(0, min(wanted - len(self._idle) - self._in_use, self.max_size - self._in_use))
+            self._in_use += count       # reserve the slots while connecting
+        results = await asyncio.gather(*(self._checkout(None) for _ in range(count)), return_exceptions=True)
+        opened = [result for result in results if not isinstance(result, BaseException)]
+        async with self._cond:
+            self._in_use -= count
+            self._idle.extend(opened)
+            self._cond.notify_all()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return len(opened)
+
+    async def dispose(self):
+        idle, self._idle = list(self._idle), deque()
+        for raw, _, statements in idle:
+            await self._close_quietly(raw, statements)
+
+    async def close(self, timeout):
+        """Drain for shutdown: refuse new checkouts, wait up to `timeout` seconds for checked-out connections, close them all"""
+        async with self._cond:
+            self.closing = True
+            self._cond.notify_all()     # waiting checkouts fail instead of timing out
+            try:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self._in_use == 0), timeout)
+            except asyncio.TimeoutError:
+                pass
+        await self.dispose()
+
+    @staticmethod
+    async def _is_alive(raw):
+        try:
+            await raw.ping(reconnect=False)
+            return True
+        except aiomysql.Error:
+            return False
+
+    async def _close_quietly(self, raw, statements=None):
+        # The server frees a session's prepared statements when it ends
+        if statements is not None:
+            self._prepared.invalidated += len(statements)
+        try:
+            await raw.ensure_closed()
+        except Exception:
+            raw.close()
+
+
+async def _connect(host=None, port=None):
+    return await aiomysql.connect(
+        host=host or config.DB_HOST,
+        port=port or config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        db=config.DB_NAME,
+        autocommit=False,
+        # FOUND_ROWS: UPDATE rowcount means "rows matched", so it doubles as an existence check.
+        # MULTI_STATEMENTS: lets InstrumentedCursor.execute_batch() send a write, its read-back and COMMIT at once.
+        client_flag=CLIENT.FOUND_ROWS | CLIENT.MULTI_STATEMENTS,
+    )
+
+
+_pool = None
+
+
+def worker_pool_limits(budget, workers, pool_size):
+    """(pool_size, max_overflow) for one of `workers` processes sharing `budget` connections"""
+    per_worker = max(1, budget // workers)
+    size = min(pool_size, per_worker)
+    return size, per_worker - size
+
+
+def _new_pool(host, port):
+    # DB_CONNECTION_BUDGET is per database server: the primary and each replica get the same share
+    pool_size, max_overflow = config.DB_POOL_SIZE, config.DB_POOL_MAX_OVERFLOW
+    if config.DB_CONNECTION_BUDGET:
+        pool_size, max_overflow = worker_pool_limits(config.DB_CONNECTION_BUDGET, config.WEB_WORKERS, pool_size)
+    return AsyncConnectionPool(
+        functools.partial(_connect, host, port),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        timeout=config.DB_POOL_TIMEOUT,
+        pre_ping=config.DB_POOL_PRE_PING,
+        recycle=config.DB_POOL_RECYCLE,
+        prepared_statements=config.DB_PREPARED_STATEMENTS,
+    )
+
+
+def get_pool():
+    # Created lazily so it binds to the event loop that serves requests
+    global _pool
+    if _pool is None:
+        _pool = _new_pool(config.DB_HOST, config.DB_PORT)
+    return _pool
+
+
+def replica_addresses(spec):
+    """[(host, port)] from DB_REPLICAS ("host[:port],host[:port]")"""
+    addresses = []
+    for entry in spec.split(","):
+        host, _, port = entry.strip().partition(":")
+        if host:
+            addresses.append((host, int(port) if port else config.DB_PORT))
+    return addresses
+
+
+_replicas = None
+
+
+def get_replica_router():
+    global _replicas
+    if _replicas is None:
+        _replicas = ReplicaRouter(
+            [Replica(f"{host}:{port}", _new_pool(host, port)) for host, port in replica_addresses(config.DB_REPLICAS)],
+            selection=config.DB_REPLICA_SELECTION,
+            max_lag=config.DB_REPLICA_MAX_LAG_SECONDS,
+            check_interval=config.DB_REPLICA_CHECK_SECONDS,
+        )
+    return _replicas
+
+
+async def close_pool(timeout=0):
+    """Close the primary's and the replicas' pools, first waiting up to `timeout` seconds for checked-out connections"""
+    global _pool, _replicas
+    if _replicas is not None:
+        await _replicas.close(timeout)
+        _replicas = None
+    if _pool is not None:
+        await _pool.close(timeout)
+        _pool = None
+
+
+async def get_connection(primary=False):
+    """A pooled connection for the current request: a replica for GET/HEAD reads when one is fresh enough, else the primary"""
+    replica = route_read(get_replica_router(), primary)
+    if replica is not None:
+        try:
+            conn = await replica.pool.acquire(timeout=min(config.DB_POOL_TIMEOUT, 1.0))
+            conn.replica = replica
+            return conn
+        except (PoolTimeout, aiomysql.Error, OSError):
+            # Busy or unreachable: skip it until the next lag check and read from the primary
+            replica.mark_failed()
+    try:
+        return await get_pool().acquire()
+    except PoolTimeout as err:
+        raise HTTPException(status_code=503, detail=f"Database busy: {err}")
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database connection error: {err}")
+
+
+class LazyConnection:
+    """Checks a pooled connection out on first use, so requests served from cache never touch the pool"""
+
+    def __init__(self, primary=False):
+        self._conn = None
+        self._primary = primary
+
+    async def _acquire(self):
+        if self._conn is None:
+            self._conn = await get_connection(self._primary)
+        return self._conn
+
+    @property
+    def from_replica(self):
+        """Whether reads so far came from a replica, which may lag behind the primary"""
+        return self._conn is not None and self._conn.replica is not None
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError(f"{name!r} is not available before the connection is used")
+        return getattr(self._conn, name)
+
+    async def cursor(self, *cursor_class):
+        return await (await self._acquire()).cursor(*cursor_class)
+
+    async def commit(self):
+        if self._conn is not None:
+            await self._conn.commit()
+
+    async def rollback(self):
+        if self._conn is not None:
+            await self._conn.rollback()
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+async def get_db():
+    """FastAPI dependency yielding a pooled async connection for the duration of a request"""
+    conn = LazyConnection()
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+async def get_primary_db():
+    """get_db for reads that must not come from a replica (change-log cursors)"""
+    conn = LazyConnection(primary=True)
+    try:
+        yield conn
+    finally:
+        await conn.close()
@@ -0,0 +1,260 @@
+"""Hosts and registrable domains of credential URLs, for autofill lookups by origin.
+
+Every credential stores the normalized host of its URL (url_host) and that host's
+registrable domain (url_domain, "example.co.uk" for "login.example.co.uk"), and
+GET /users/{user_id}/credentials/match?origin= looks credentials up by the
+origin's registrable domain through idx_credentials_user_domain.
+
+Registrable domains follow the Public Suffix List rules. The full list is read
+from config.PUBLIC_SUFFIX_FILE (https://publicsuffix.org/list/public_suffix_list.dat)
+when it exists; otherwise a built-in subset with the common multi-label suffixes
+is used. Either way the rules are compiled once at startup into lookup sets.
+
+    python -m app.domains backfill [--all] [--chunk-size N]
+    python -m app.domains lookup URL...
+"""
+import argparse
+import ipaddress
+import os
+import sys
+from urllib.parse import urlsplit
+
+from app import config
+from app.db import _connect, change_log_off
+
+# Multi-label public suffixes (and a few wildcard/exception rules) used when no
+# list file is present. Single-label TLDs need no entry: the PSL default rule
+# treats any unlisted TLD as a public suffix.
+BUILTIN_RULES = """
+co.uk org.uk me.uk ltd.uk plc.uk net.uk sch.uk ac.uk gov.uk nhs.uk police.uk
+com.au net.au org.au edu.au gov.au asn.au id.au
+co.nz net.nz org.nz govt.nz ac.nz school.nz geek.nz
+co.jp ne.jp or.jp ac.jp ad.jp ed.jp go.jp gr.jp lg.jp
+co.kr or.kr ne.kr re.kr go.kr ac.kr
+com.cn net.cn org.cn gov.cn edu.cn ac.cn
+com.hk net.hk org.hk edu.hk gov.hk idv.hk
+com.tw net.tw org.tw edu.tw gov.tw idv.tw
+com.sg net.sg org.sg edu.sg gov.sg
+com.my net.my org.my edu.my gov.my
+co.id or.id ac.id go.id web.id
+co.in net.in org.in firm.in gen.in ind.in ac.in edu.in gov.in
+co.th in.th ac.th go.th or.th
+com.vn net.vn org.vn edu.vn gov.vn
+com.ph net.ph org.ph edu.ph gov.ph
+com.pk net.pk org.pk edu.pk gov.pk
+co.il org.il net.il ac.il gov.il muni.il
+com.tr net.tr org.tr edu.tr gov.tr gen.tr
+com.sa net.sa org.sa edu.sa gov.sa
+com.eg net.eg org.eg edu.eg gov.eg
+co.za net.za org.za edu.za gov.za web.za
+com.ng net.ng org.ng edu.ng gov.ng
+co.ke or.ke ac.ke go.ke
+com.br net.br org.br edu.br gov.br art.br blog.br
+com.ar net.ar org.ar edu.ar gob.ar
+com.mx net.mx org.mx edu.mx gob.mx
+com.co net.co org.co edu.co gov.co
+com.pe net.pe org.pe edu.pe gob.pe
+com.ua net.ua org.ua edu.ua gov.ua in.ua kiev.ua
+com.pl net.pl org.pl edu.pl gov.pl waw.pl
+co.at or.at ac.at gv.at
+com.es nom.es org.es edu.es gob.es
+com.gr net.gr org.gr edu.gr gov.gr
+com.pt org.pt edu.pt gov.pt
+com.ru net.ru org.ru msk.ru spb.ru
+*.ck !www.ck
+*.bd *.np *.er *.fk *.jm *.kh *.mm *.pg
+github.io gitlab.io netlify.app vercel.app pages.dev workers.dev web.app firebaseapp.com
+herokuapp.com appspot.com blogspot.com azurewebsites.net cloudfront.net azureedge.net
+s3.amazonaws.com elasticbeanstalk.com onrender.com fly.dev glitch.me repl.co
+"""
+
+
+class SuffixTable:
+    """Compiled Public Suffix List rules"""
+
+    def __init__(self, rules):
+        self.exact = set()
+        self.wildcard = set()       # "ck" for the rule "*.ck"
+        self.exception = set()      # "www.ck" for the rule "!www.ck"
+        for rule in rules:
+            if rule.startswith("!"):
+                target = self.exception
+                rule = rule[1:]
+            elif rule.startswith("*."):
+                target = self.wildcard
+                rule = rule[2:]
+            else:
+                target = self.exact
+            rule = _to_ascii(rule)
+            if rule:
+                target.add(rule)
+
+    def __len__(self):
+        return len(self.exact) + len(self.wildcard) + len(self.exception)
+
+    def public_suffix(self, host):
+        labels = host.split(".")
+        # Longest matching rule wins; an exception rule beats the wildcard it overrides
+        for i in range(len(labels)):
+            candidate = ".".join(labels[i:])
+            if candidate in self.exception:
+                return ".".join(labels[i + 1:])
+            if candidate in self.exact:
+                return candidate
+            if i + 1 < len(labels) and ".".join(labels[i + 1:]) in self.wildcard:
+                return candidate
+        return labels[-1]
+
+    def registrable_domain(self, host):
+        """The public suffix plus one label; the host itself for IPs, single labels and bare suffixes"""
+        if "." not in host or _is_ip(host):
+            return host
+        suffix = self.public_suffix(host)
+        if suffix == host:
+            return host
+        label = host[:-len(suffix) - 1].rsplit(".", 1)[-1]
+        return f"{label}.{suffix}"
+
+
+def parse_rules(text):
+    """Rules of a public_suffix_list.dat file: the first word of each non-comment line"""
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            rules.append(line.split()[0])
+    return rules
+
+
+def _to_ascii(name):
+    try:
+        return name.encode("idna").decode("ascii").lower() if name else None
+    except UnicodeError:
+        return None
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+_table = None
+
+
+def load_suffix_table(path=None):
+    """Compile the suffix rules; called once at startup"""
+    global _table
+    path = path or config.PUBLIC_SUFFIX_FILE
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as listfile:
+            rules = parse_rules(listfile.read())
+    else:
+        rules = BUILTIN_RULES.split()
+    _table = SuffixTable(rules)
+    return _table
+
+
+def suffix_table():
+    return _table or load_suffix_table()
+
+
+def url_host(url):
+    """Lower-case ASCII host of a URL or bare origin/hostname, None if there is none"""
+    if not url:
+        return None
+    url = url.strip()
+    if "://" not in url:
+        url = "//" + url
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    host = host.rstrip(".")
+    if _is_ip(host):
+        return host
+    return _to_ascii(host)
+
+
+def url_keys(url):
+    """(url_host, url_domain) as stored on a credential"""
+    host = url_host(url)
+    if host is None:
+        return None, None
+    return host, suffix_table().registrable_domain(host)
+
+
+def backfill(conn, chunk_size, recompute=False):
+    """Fill url_host/url_domain on existing credentials, a chunk per transaction.
+
+    With `recompute`, rows that already have values are redone too, e.g. after
+    updating the suffix list. Returns the number of rows changed.
+    """
+    cursor = conn.cursor()
+    last_id = changed = 0
+    pending = "" if recompute else " AND url_host IS NULL"
+    try:
+        with change_log_off(conn):
+            while True:
+                cursor.execute(
+                    f"""SELECT credential_id, url, url_host, url_domain FROM credentials
+                        WHERE credential_id > %s AND url IS NOT NULL{pending}
+                        ORDER BY credential_id LIMIT %s""",
+                    (last_id, chunk_size),
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    return changed
+                last_id = rows[-1][0]
+                updates = []
+                for credential_id, url, host, domain in rows:
+                    keys = url_keys(url)
+                    if keys != (host, domain):
+                        updates.append(keys + (credential_id, url))
+                if updates:
+                    # Skip rows whose URL changed since the read; their writer set the keys.
+                    # updated_at is left alone and nothing is logged for sync: the
+                    # credential's content did not change.
+                    cursor.executemany(
+                        """UPDATE credentials SET url_host = %s, url_domain = %s, updated_at = updated_at
+                           WHERE credential_id = %s AND url <=> %s""",
+                        updates,
+                    )
+                    changed += len(updates)
+                conn.commit()
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Credential URL hosts and registrable domains")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="fill url_host/url_domain on existing credentials")
+    fill.add_argument("--all", action="store_true", help="recompute rows that already have values")
+    fill.add_argument("--chunk-size", type=int, default=1000)
+    lookup = sub.add_parser("lookup", help="print the host and registrable domain of URLs")
+    lookup.add_argument("urls", nargs="+")
+    args = parser.parse_args(argv)
+
+    table = load_suffix_table()
+    if args.command == "lookup":
+        for url in args.urls:
+            host, domain = url_keys(url)
+            print(f"{url}\thost={host}\tdomain={domain}")
+        return 0
+
+    print(f"{len(table)} suffix rules loaded")
+    conn = _connect()
+    try:
+        print(f"updated {backfill(conn, args.chunk_size, args.all)} credentials")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+
+def etag_for(payload) -> str:
+    """Weak ETag derived from the JSON form of a response payload"""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return f'W/"{hashlib.sha1(body.encode()).hexdigest()}"'
+
+
+def body_etag(body: bytes) -> str:
+    """Weak ETag of an already-encoded JSON body"""
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == wanted:
+            return True
+    return False
+
+
+def conditional(request, response, etag):
+    """Attach `etag`; return a bare 304 if the client already holds this version, else None"""
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
+async def change_head(cursor, user_id):
+    """Latest vault_changes id for a user: changes whenever any of their items does"""
+    await cursor.execute(
+        "SELECT COALESCE(MAX(change_id), 0) FROM vault_changes WHERE user_id = %s", (user_id,)
+    )
+    return (await cursor.fetchone())[0]
+
+
+def list_etag(resource, user_id, head, after_id, limit):
+    return f'W/"{resource}-{user_id}-{head}-{after_id}-{limit}"'
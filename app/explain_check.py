@@ -0,0 +1,156 @@
+"""Fail if any request-path query is planned as a full table scan or a filesort.
+
+Collects every literal SQL string passed to cursor.execute()/execute_batch() in
+app/routers, the statements of the routers' repositories and those of the
+QUERY_MODULES (each has a statements() generator), runs EXPLAIN on the
+SELECT/UPDATE/DELETE statements with placeholder values, and exits non-zero when
+any table is accessed with type=ALL or sorted with "Using filesort" (other than
+the BOUNDED_SORTS). Run it against a database that holds realistic row counts; on
+near-empty tables MySQL may legitimately prefer a scan.
+
+    python -m app.explain_check
+"""
+import ast
+import importlib
+import itertools
+import sys
+from pathlib import Path
+
+from app.db import _connect
+from app.repository import Repository
+
+ROUTERS_DIR = Path(__file__).resolve().parent / "routers"
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+# Request-path modules outside the routers whose SQL is built per section
+QUERY_MODULES = ("app.sync", "app.vault", "app.search", "app.health", "app.keystore", "app.export")
+# Sorts no index can provide, over rows the WHERE clause bounds: statement fragment -> why that is fine
+BOUNDED_SORTS = {
+    "ORDER BY url_host = %s DESC": "one user's credentials under one registrable domain",
+    "ORDER BY MAX(change_id) DESC": "startup preload, one row per user, once per worker",
+}
+
+
+def _attribute(node, module):
+    """Value of a module-level name or attribute chain (e.g. CREDENTIAL_ROWS.select) in the router module"""
+    if isinstance(node, ast.Name):
+        return getattr(module, node.id, None)
+    if isinstance(node, ast.Attribute):
+        owner = _attribute(node.value, module)
+        return getattr(owner, node.attr, None) if owner is not None else None
+    return None
+
+
+def _literal(node, constants, module=None):
+    """Resolve a string literal, a module-level string constant, an f-string over
+    module-level values, or a concatenation of them"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _literal(node.left, constants, module), _literal(node.right, constants, module)
+        if left is not None and right is not None:
+            return left + right
+    if isinstance(node, ast.JoinedStr) and module is not None:
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                value = _attribute(value.value, module)
+                if not isinstance(value, str):
+                    return None
+                parts.append(value)
+            else:
+                parts.append(value.value)
+        return "".join(parts)
+    return None
+
+
+def _statements(call, constants, module):
+    if call.func.attr == "execute_batch":
+        # execute_batch([(sql, params), ...])
+        if call.args and isinstance(call.args[0], ast.List):
+            for item in call.args[0].elts:
+                if isinstance(item, ast.Tuple) and item.elts:
+                    yield _literal(item.elts[0], constants, module)
+    elif call.args:
+        yield _literal(call.args[0], constants, module)
+
+
+def router_queries(directory=ROUTERS_DIR):
+    """Yield (location, sql) for each literal statement executed by the routers"""
+    for path in sorted(directory.glob("*.py")):
+        tree = ast.parse(path.read_text(), filename=str(path))
+        module = importlib.import_module(f"app.routers.{path.stem}")
+        constants = {}
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                value = _literal(node.value, constants)
+                if value is not None:
+                    constants[node.targets[0].id] = value
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call)
+                    and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany", "execute_batch")):
+                for sql in _statements(node, constants, module):
+                    if sql is None:
+                        continue
+                    sql = " ".join(sql.split())
+                    if sql.upper().startswith(EXPLAINABLE):
+                        yield f"{path.name}:{node.lineno}", sql
+        # Statements a router declares through app.repository rather than spells out
+        for name, value in vars(module).items():
+            if isinstance(value, Repository):
+                for sql in value.statements():
+                    sql = " ".join(sql.split())
+                    if sql.upper().startswith(EXPLAINABLE):
+                        yield f"{path.name}:{name}", sql
+
+
+def module_queries(modules=QUERY_MODULES):
+    """Yield (location, sql) for each statement the QUERY_MODULES declare"""
+    for name in modules:
+        module = importlib.import_module(name)
+        for sql in module.statements():
+            sql = " ".join(sql.split())
+            if sql.upper().startswith(EXPLAINABLE):
+                yield f"{name.rsplit('.', 1)[1]}.py:statements", sql
+
+
+def plan_problems(cursor, sql):
+    """Full scans and unexpected filesorts in the plan of `sql`"""
+    # LAST_INSERT_ID() is 0 outside the write it follows; any constant plans the same way
+    cursor.execute("EXPLAIN " + sql.replace("%s", "1"))
+    problems = []
+    for row in cursor.fetchall():
+        if row.get("type") == "ALL":
+            problems.append(f"full scan of {row['table']}")
+        if "Using filesort" in (row.get("Extra") or "") and not any(sort in sql for sort in BOUNDED_SORTS):
+            problems.append(f"filesort on {row['table']}")
+    return problems
+
+
+def main():
+    conn = _connect()
+    cursor = conn.cursor(dictionary=True)
+    failures = 0
+    try:
+        seen = set()
+        for location, sql in itertools.chain(router_queries(), module_queries()):
+            if sql in seen:
+                continue
+            seen.add(sql)
+            problems = plan_problems(cursor, sql)
+            if problems:
+                failures += 1
+                print(f"FAIL {location}: {', '.join(problems)}\n    {sql}")
+            else:
+                print(f"ok   {location}")
+    finally:
+        cursor.close()
+        conn.close()
+    print(f"{len(seen)} queries checked, {failures} with full scans or filesorts")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Vault health reports: reused secrets, breached passwords and expiring cards.
+
+Each process keeps health state for recently checked users. The state is built
+from one snapshot on the first report, then updated from vault_changes: only the
+items changed since the previous report have their secrets re-read and
+decrypted, so a repeated report on a large vault costs one log read. The report
+itself is cached until the state or the date changes. Writes from any process
+reach the state through the change log; changes still inside the sync settle
+window are applied as well, without moving the cursor past them.
+
+Plaintext secrets are not kept: only a per-process keyed fingerprint, to find
+reuse, and the result of the breach check.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import os
+from collections import OrderedDict, namedtuple
+
+from cryptography.exceptions import InvalidTag
+
+from app import config
+from app.breach import get_breach_corpus
+from app.crypto import PREFIX, column_aad, decrypt_value, get_crypto_pool
+from app.keystore import user_key_versions
+from app.sync import USER_EXISTS_SQL, load_changes
+from app.vault import SETTLED_HEAD_SQL
+
+# Sections whose secrets are compared: type -> (table, primary key, secret column, label columns)
+SECRET_SOURCES = {
+    "credentials": ("credentials", "credential_id", "password_encrypted", ("title", "url", "username")),
+    "email_accounts": ("email_accounts", "email_id", "password_encrypted", ("email_address",)),
+}
+CARD_COLUMNS = ("card_holder_name", "card_type", "expiration_date")
+CARDS_SQL = f"SELECT card_id, {', '.join(CARD_COLUMNS)} FROM credit_cards WHERE user_id = %s"
+
+# fingerprint is None when the stored value could not be decrypted
+SecretCheck = namedtuple("SecretCheck", "fingerprint breached label")
+
+_FINGERPRINT_KEY = os.urandom(32)
+
+
+def _fingerprint(secret):
+    return hmac.new(_FINGERPRINT_KEY, secret.encode(), hashlib.sha256).digest()
+
+
+def _secret_statement(user_id, item_type, ids=None):
+    table, pk, column, labels = SECRET_SOURCES[item_type]
+    sql = f"SELECT {pk}, {column}, key_version, {', '.join(labels)} FROM {table} WHERE user_id = %s"
+    if ids is None:
+        return sql, (user_id,)
+    return f"{sql} AND {pk} IN ({', '.join(['%s'] * len(ids))})", (user_id, *ids)
+
+
+def statements():
+    """The SQL this module sends, for app.explain_check"""
+    yield USER_EXISTS_SQL
+    yield SETTLED_HEAD_SQL
+    yield CARDS_SQL
+    for item_type in SECRET_SOURCES:
+        yield _secret_statement(0, item_type)[0]
+        yield _secret_statement(0, item_type, [0, 0])[0]
+
+
+def _open_one(item):
+    try:
+        return decrypt_value(*item)
+    except (InvalidTag, ValueError):
+        return None
+
+
+async def _check_secrets(cursor, user_id, rows_by_type):
+    """{(type, id): SecretCheck} for fetched secret rows; rows without a secret are left out"""
+    # Keys are read after the rows: a row is only ever sealed under a key version
+    # that was committed before it, so every version the rows use is present.
+    keys = await user_key_versions(cursor, user_id)
+    checks, items, pending = {}, [], []
+    for item_type, rows in rows_by_type.items():
+        table, _, column, _ = SECRET_SOURCES[item_type]
+        for item_id, stored, version, *labels in rows:
+            if stored is None:
+                continue
+            label = next((value for value in labels if value), None)
+            key = keys.get(version)
+            if key is None and stored.startswith(PREFIX):
+                checks[(item_type, item_id)] = SecretCheck(None, False, label)
+                continue
+            items.append((key, stored, column_aad(table, column, user_id)))
+            pending.append(((item_type, item_id), label))
+    try:
+        plaintexts = await get_crypto_pool().decrypt_many_async(items)
+    except (InvalidTag, ValueError):
+        # One tampered or malformed value fails the whole batch; find it item by item
+        plaintexts = [_open_one(item) for item in items]
+
+    corpus = get_breach_corpus()
+    for (item, label), plaintext in zip(pending, plaintexts):
+        if plaintext is None:
+            checks[item] = SecretCheck(None, False, label)
+        else:
+            breached = corpus is not None and corpus.contains(hashlib.sha1(plaintext.encode()).digest())
+            checks[item] = SecretCheck(_fingerprint(plaintext), breached, label)
+    return checks
+
+
+class UserHealth:
+    """One user's health state and cached report"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor            # last settled vault_changes id applied
+        self.secrets = {}               # (type, id) -> SecretCheck
+        self.cards = {}                 # card_id -> {card_holder_name, card_type, expiration_date}
+        self.version = 0                # bumped on every applied change, keys the cached report
+        self._report = None             # ((version, date), report)
+
+    def report(self, user_id, today):
+        if self._report is not None and self._report[0] == (self.version, today):
+            return self._report[1]
+
+        groups = {}
+        for item, check in self.secrets.items():
+            if check.fingerprint is not None:
+                groups.setdefault(check.fingerprint, []).append(item)
+        reused = sorted((sorted(items) for items in groups.values() if len(items) > 1),
+                        key=lambda items: (-len(items), items[0]))
+
+        def describe(item):
+            return {"type": item[0], "id": item[1], "label": self.secrets[item].label}
+
+        soon = today + datetime.timedelta(days=config.HEALTH_CARD_EXPIRY_DAYS)
+        expiring = sorted(
+            (card["expiration_date"], card_id) for card_id, card in self.cards.items()
+            if card["expiration_date"] is not None and card["expiration_date"] <= soon
+        )
+        report = {
+            "user_id": user_id,
+            "summary": {
+                "secrets_checked": len(self.secrets),
+                "reused_groups": len(reused),
+                "reused_items": sum(len(items) for items in reused),
+                "breached": sum(1 for check in self.secrets.values() if check.breached),
+                "unreadable": sum(1 for check in self.secrets.values() if check.fingerprint is None),
+                "expiring_cards": len(expiring),
+                "breach_check": get_breach_corpus() is not None,
+            },
+            "reused": [{"count": len(items), "items": [describe(item) for item in items]} for items in reused],
+            "breached": [describe(item) for item in sorted(self.secrets) if self.secrets[item].breached],
+            "expiring_cards": [
+                {
+                    "card_id": card_id,
+                    "card_holder_name": self.cards[card_id]["card_holder_name"],
+                    "card_type": self.cards[card_id]["card_type"],
+                    "expiration_date": expiration_date,
+                    "expired": expiration_date < today,
+                }
+                for expiration_date, card_id in expiring
+            ],
+        }
+        self._report = ((self.version, today), report)
+        return report
+
+
+class HealthReports:
+    """Per-user UserHealth instances, least recently checked evicted first"""
+
+    def __init__(self, max_users=None):
+        self.max_users = max_users or config.HEALTH_MAX_USERS
+        self._states = OrderedDict()    # user_id -> UserHealth
+        self._locks = {}
+
+    async def _build(self, cursor, user_id):
+        statements = [
+            (USER_EXISTS_SQL, (user_id,)),
+            (SETTLED_HEAD_SQL, (user_id, config.SYNC_SETTLE_SECONDS)),
+            (CARDS_SQL, (user_id,)),
+        ]
+        statements.extend(_secret_statement(user_id, item_type) for item_type in SECRET_SOURCES)
+        results = await cursor.execute_batch(statements)
+        if not results[0][1]:
+            return None
+        state = UserHealth(results[1][1][0][0])
+        for card_id, *values in results[2][1]:
+            state.cards[card_id] = dict(zip(CARD_COLUMNS, values))
+        state.secrets = await _check_secrets(
+            cursor, user_id, {item_type: rows for item_type, (_, rows) in zip(SECRET_SOURCES, results[3:])}
+        )
+        return state
+
+    async def _apply(self, cursor, user_id, state, changes):
+        refetch = {}
+        for change in changes:
+            item_type, item_id = change["type"], change["id"]
+            if item_type in SECRET_SOURCES:
+                if change["operation"] == "upsert":
+                    refetch.setdefault(item_type, []).append(item_id)
+                else:
+                    state.secrets.pop((item_type, item_id), None)
+            elif item_type == "credit_cards":
+                if change["operation"] == "upsert":
+                    state.cards[item_id] = {column: change["item"][column] for column in CARD_COLUMNS}
+                else:
+                    state.cards.pop(item_id, None)
+        if refetch:
+            statements = [_secret_statement(user_id, item_type, ids) for item_type, ids in refetch.items()]
+            results = await cursor.execute_batch(statements)
+            checks = await _check_secrets(
+                cursor, user_id, {item_type: rows for item_type, (_, rows) in zip(refetch, results)}
+            )
+            for item_type, ids in refetch.items():
+                for item_id in ids:
+                    # Gone since the log was read, or its secret was cleared
+                    state.secrets.pop((item_type, item_id), None)
+            state.secrets.update(checks)
+        if changes:
+            state.version += 1
+
+    async def _catch_up(self, cursor, user_id, state):
+        has_more = True
+        while has_more:
+            changes, state.cursor, has_more = await load_changes(cursor, user_id, state.cursor, 5000)
+            await self._apply(cursor, user_id, state, changes)
+        # Replayed again once settled, so applying them now is safe and shows the
+        # user's own writes straight away
+        changes, _, _ = await load_changes(cursor, user_id, state.cursor, 5000, settled=False)
+        await self._apply(cursor, user_id, state, changes)
+
+    async def get(self, cursor, user_id):
+        """The user's health report, or None if the user does not exist"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = await self._build(cursor, user_id)
+                if state is None:
+                    self._locks.pop(user_id, None)
+                    return None
+                self._states[user_id] = state
+                while len(self._states) > self.max_users:
+                    evicted, _ = self._states.popitem(last=False)
+                    evicted_lock = self._locks.get(evicted)
+                    if evicted_lock is not None and not evicted_lock.locked():
+                        del self._locks[evicted]
+            else:
+                self._states.move_to_end(user_id)
+                await self._catch_up(cursor, user_id, state)
+            return state.report(user_id, datetime.date.today())
+
+    def drop_user(self, user_id):
+        self._states.pop(user_id, None)
+        self._locks.pop(user_id, None)
+
+
+_health_reports = None
+
+
+def get_health_reports():
+    global _health_reports
+    if _health_reports is None:
+        _health_reports = HealthReports()
+    return _health_reports
@@ -0,0 +1,139 @@
+"""Per-user data keys: load from user_keys, create on first use, cache unwrapped in memory.
+
+A user can hold several key versions while a rotation is under way (see
+app.rotation); writes always use the newest one and record its version on the row.
+"""
+import time
+from collections import OrderedDict, namedtuple
+
+from app import config
+from app.crypto import new_data_key, unwrap_data_key
+from app.vault import VAULT_SECTIONS
+
+DataKey = namedtuple("DataKey", "version key")
+
+CURRENT_VERSION_SQL = "SELECT COALESCE(MAX(target_version), 1) FROM key_rotation_jobs"
+KEY_VERSIONS_SQL = "SELECT key_version, wrapped_key FROM user_keys WHERE user_id = %s"
+
+
+def _keys_sql(count):
+    placeholders = ", ".join(["%s"] * count)
+    return f"SELECT user_id, key_version, wrapped_key FROM user_keys WHERE user_id IN ({placeholders}) ORDER BY user_id, key_version"
+
+
+def _owner_sql(table, pk):
+    return f"SELECT user_id FROM {table} WHERE {pk} = %s"
+
+
+def statements():
+    """The SQL this module sends, for app.explain_check"""
+    yield _keys_sql(2)
+    yield CURRENT_VERSION_SQL
+    yield KEY_VERSIONS_SQL
+    for table, pk, _ in VAULT_SECTIONS.values():
+        yield _owner_sql(table, pk)
+
+
+_data_keys = OrderedDict()    # user_id -> (loaded_at, current DataKey)
+
+
+def _remember(user_id, data_key):
+    _data_keys[user_id] = (time.monotonic(), data_key)
+    _data_keys.move_to_end(user_id)
+    while len(_data_keys) > config.DATA_KEY_CACHE_SIZE:
+        _data_keys.popitem(last=False)
+
+
+def _cached(user_id):
+    entry = _data_keys.get(user_id)
+    # Entries expire so a rotation's new key version is picked up within the TTL
+    if entry is None or time.monotonic() - entry[0] > config.DATA_KEY_CACHE_TTL:
+        return None
+    _data_keys.move_to_end(user_id)
+    return entry[1]
+
+
+def forget_user_key(user_id):
+    _data_keys.pop(user_id, None)
+
+
+async def _load_current(cursor, user_ids):
+    await cursor.execute(_keys_sql(len(user_ids)), tuple(user_ids))
+    # Later (higher) versions overwrite earlier ones
+    return {user_id: (version, wrapped) for user_id, version, wrapped in await cursor.fetchall()}
+
+
+async def current_key_version(cursor):
+    """Version new keys are created at: the target of the latest rotation, 1 before any"""
+    await cursor.execute(CURRENT_VERSION_SQL)
+    return (await cursor.fetchone())[0]
+
+
+async def user_data_keys(conn, user_ids, create=True):
+    """Return {user_id: current DataKey} for the given users.
+
+    Users without a key get one when `create` is set; the new keys are committed
+    straight away so no later rollback can orphan data encrypted under them.
+    Users that do not exist are left out of the result.
+    """
+    keys = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        data_key = _cached(user_id)
+        if data_key is not None:
+            keys[user_id] = data_key
+        else:
+            missing.append(user_id)
+    if not missing:
+        return keys
+
+    cursor = await conn.cursor()
+    try:
+        wrapped = await _load_current(cursor, missing)
+        absent = [user_id for user_id in missing if user_id not in wrapped]
+        if absent and create:
+            version = await current_key_version(cursor)
+            # INSERT IGNORE: a concurrent request may create the same key first, and
+            # rows for users that do not exist are skipped instead of failing the batch.
+            # The re-read (so every process agrees on whichever key won) rides along
+            # with the insert and its COMMIT in one round trip.
+            rows = [(user_id, version, new_data_key(user_id)[1]) for user_id in absent]
+            results = await cursor.execute_batch([
+                ("INSERT IGNORE INTO user_keys (user_id, key_version, wrapped_key) VALUES "
+                 + ", ".join(["(%s, %s, %s)"] * len(rows)), tuple(value for row in rows for value in row)),
+                ("COMMIT", None),
+                (_keys_sql(len(absent)), tuple(absent)),
+            ])
+            wrapped.update((user_id, (key_version, wrapped_key)) for user_id, key_version, wrapped_key in results[2][1])
+    finally:
+        await cursor.close()
+
+    for user_id, (version, wrapped_key) in wrapped.items():
+        data_key = DataKey(version, unwrap_data_key(user_id, wrapped_key))
+        _remember(user_id, data_key)
+        keys[user_id] = data_key
+    return keys
+
+
+async def user_data_key(conn, user_id, create=True):
+    """Current DataKey of one user, or None if the user does not exist (or has no key and create is off)"""
+    return (await user_data_keys(conn, [user_id], create)).get(user_id)
+
+
+async def user_key_versions(cursor, user_id):
+    """Every key version a user holds, as {version: key}, for reading rows written under older ones"""
+    await cursor.execute(KEY_VERSIONS_SQL, (user_id,))
+    return {version: unwrap_data_key(user_id, wrapped) for version, wrapped in await cursor.fetchall()}
+
+
+async def item_data_key(conn, table, pk, item_id):
+    """Return (owner user_id, current DataKey) for a row, or None when the row does not exist"""
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(_owner_sql(table, pk), (item_id,))
+        row = await cursor.fetchone()
+    finally:
+        await cursor.close()
+    if row is None:
+        return None
+    return row[0], await user_data_key(conn, row[0])
@@ -1,11 +1,70 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import users, credentials, email_accounts, credit_cards, devices
+from app import config
+from app.breach import close_breach_corpus, open_breach_corpus
+from app.crypto import close_crypto_pool
+from app.db_async import close_pool, get_pool, get_replica_router
+from app.domains import load_suffix_table
+from app.metrics import MetricsMiddleware
+from app.passwords import close_hashing_pool
+from app.query_audit import QueryAuditMiddleware
+from app.replicas import ReadRoutingMiddleware
+from app.search import get_search_indexes
+from app.tracing import TracingMiddleware, start_tracing, stop_tracing
+from app.routers import users, credentials, email_accounts, credit_cards, devices, admin, vault, metrics, probes
+
+log = logging.getLogger("app.main")
+
+
+async def warm_up():
+    """Open the pools' connections, measure replica lag and preload search indexes before the worker takes traffic"""
+    pool = get_pool()
+    replicas = get_replica_router()
+    try:
+        await asyncio.gather(pool.warm(), *(replica.pool.warm() for replica in replicas.replicas))
+    except Exception as err:
+        log.warning("Warmup incomplete: %s", err)
+    await replicas.start()
+    try:
+        if config.SEARCH_PRELOAD_USERS:
+            conn = await pool.acquire()
+            try:
+                cursor = await conn.cursor()
+                try:
+                    await get_search_indexes().preload(cursor, config.SEARCH_PRELOAD_USERS)
+                finally:
+                    await cursor.close()
+            finally:
+                await conn.close()
+    except Exception as err:
+        # The worker still starts: /readyz reports the database until it is reachable
+        log.warning("Warmup incomplete: %s", err)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_tracing()
+    load_suffix_table()
+    open_breach_corpus()
+    await warm_up()
+    yield
+    # The server has stopped accepting connections and let in-flight requests finish
+    await close_pool(config.DB_POOL_DRAIN_SECONDS)
+    close_crypto_pool()
+    close_hashing_pool()
+    close_breach_corpus()
+    stop_tracing()
+
 
 app = FastAPI(
     title="password_saver_api",
     description="API for managing passwords and credentials",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ✅ Allow all origins
@@ -16,10 +75,22 @@ app.add_middleware(
     allow_methods=["*"],   # Allow all HTTP methods
     allow_headers=["*"],   # Allow all headers
 )
+# Per-route latency, status and DB time, served at /metrics
+app.add_middleware(MetricsMiddleware)
+# Request IDs, query spans and the slow-query log's request context
+app.add_middleware(TracingMiddleware)
+# Queries per request, repeated statements and N+1 loops in dev mode and tests
+app.add_middleware(QueryAuditMiddleware)
+# GET/HEAD reads to replicas, read-after tokens on writes (no-op without DB_REPLICAS)
+app.add_middleware(ReadRoutingMiddleware)
 
 # ✅ Include Routers
 app.include_router(users.router)
 app.include_router(credentials.router)
 app.include_router(email_accounts.router)
 app.include_router(credit_cards.router)
-app.include_router(devices.router)
\ No newline at end of file
+app.include_router(devices.router)
+app.include_router(vault.router)
+app.include_router(admin.router)
+app.include_router(metrics.router)
+app.include_router(probes.router)
@@ -0,0 +1,158 @@
+"""In-process metrics in the Prometheus text exposition format (served at /metrics).
+
+Counters and histograms are updated on the request path, so they are plain dicts
+of label values -> numbers with no locking (one event loop per process). Gauges
+over the pools and caches are read from their stats() at scrape time instead.
+Requests are labelled by route template ("/credentials/{credential_id}"), never the
+raw path, and statements by their operation, so label cardinality stays bounded.
+Each worker process keeps its own series; Prometheus sums them per instance.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Seconds; fine-grained at the low end where cached reads and single-row queries sit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPERATIONS = frozenset(("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "COMMIT", "ROLLBACK"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Database seconds spent by the current request, when it runs under MetricsMiddleware
+_request_db_time = ContextVar("request_db_time", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def family(name, kind, help_text, samples):
+    """Text for one metric family; samples are (suffix, label names, label values, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for suffix, names, values, value in samples:
+        lines.append(f"{name}{suffix}{_labels(names, values)} {_number(value)}")
+    return "\n".join(lines)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, *values, amount=1):
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self):
+        return family(self.name, "counter", self.help,
+                      (("", self.labels, values, value) for values, value in sorted(self._values.items())))
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}       # label values -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *values):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labels, values, (("le", _number(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status code",
+                   ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route template",
+                            ("method", "route"))
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Database time per HTTP request by route template",
+                               ("method", "route"))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Database round-trip time by statement operation",
+                          ("operation",))
+QUERY_ROWS = Counter("db_query_rows_total", "Rows returned (SELECT) or affected (writes) by statement operation",
+                     ("operation",))
+POOL_WAIT_SECONDS = Histogram("db_pool_acquire_seconds", "Time to check a connection out of the pool, waiting included")
+
+METRICS = (REQUESTS, REQUEST_SECONDS, REQUEST_DB_SECONDS, QUERY_SECONDS, QUERY_ROWS, POOL_WAIT_SECONDS)
+
+
+def operation(query):
+    """Statement operation used as a label: the leading keyword, or OTHER"""
+    words = query.lstrip()[:8].split(None, 1)
+    keyword = words[0].upper() if words else ""
+    return keyword if keyword in OPERATIONS else "OTHER"
+
+
+def observe_query(op, seconds, rows):
+    QUERY_SECONDS.observe(seconds, op)
+    if rows > 0:
+        QUERY_ROWS.inc(op, amount=rows)
+    spent = _request_db_time.get()
+    if spent is not None:
+        spent[0] += seconds
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and database time per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500        # unless a response starts, the request failed
+        spent = [0.0]
+        token = _request_db_time.set(spent)
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db_time.reset(token)
+            # Set by the router on a match; unmatched paths share one series
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.inc(method, route, status)
+            REQUEST_SECONDS.observe(elapsed, method, route)
+            REQUEST_DB_SECONDS.observe(spent[0], method, route)
+
+
+def render(*families):
+    """The exposition text: every registered metric, then the given pre-rendered families"""
+    return "\n".join([metric.render() for metric in METRICS] + list(families)) + "\n"
@@ -0,0 +1,150 @@
+"""Versioned schema migrations.
+
+Migrations live in migrations/ as NNNN_name.up.sql / NNNN_name.down.sql pairs and are
+applied in version order. Applied versions are recorded in the schema_migrations table.
+
+    python -m app.migrate status
+    python -m app.migrate upgrade [VERSION]
+    python -m app.migrate downgrade VERSION
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.db import _connect
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.(up|down)\.sql$")
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    up: Path
+    down: Path = None
+
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILENAME.match(path.name)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        migration = migrations.setdefault(version, Migration(version, name, None))
+        setattr(migration, direction, path)
+    for migration in migrations.values():
+        if migration.up is None:
+            raise ValueError(f"Migration {migration.version} has no .up.sql file")
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split a migration file on statement-terminating semicolons, dropping comment lines"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def _ensure_table(cursor):
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+
+
+def applied_versions(cursor):
+    _ensure_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations ORDER BY version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _run(conn, cursor, path):
+    # MySQL commits DDL implicitly, so a failing migration can be partially applied;
+    # keep each migration small enough to be re-run by hand if that happens.
+    for statement in split_statements(path.read_text()):
+        cursor.execute(statement)
+    conn.commit()
+
+
+def upgrade(conn, target=None, migrations=None):
+    migrations = discover() if migrations is None else migrations
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for migration in migrations:
+            if migration.version in done or (target is not None and migration.version > target):
+                continue
+            _run(conn, cursor, migration.up)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+            conn.commit()
+            applied.append(migration.version)
+        return applied
+    finally:
+        cursor.close()
+
+
+def downgrade(conn, target, migrations=None):
+    """Revert every applied migration with a version greater than `target`"""
+    migrations = discover() if migrations is None else migrations
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        reverted = []
+        for migration in reversed(migrations):
+            if migration.version not in done or migration.version <= target:
+                continue
+            if migration.down is None:
+                raise ValueError(f"Migration {migration.version} has no .down.sql file")
+            _run(conn, cursor, migration.down)
+            cursor.execute("DELETE FROM schema_migrations WHERE version = %s", (migration.version,))
+            conn.commit()
+            reverted.append(migration.version)
+        return reverted
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or revert schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    up = sub.add_parser("upgrade")
+    up.add_argument("version", type=int, nargs="?")
+    down = sub.add_parser("downgrade")
+    down.add_argument("version", type=int)
+    args = parser.parse_args(argv)
+
+    conn = _connect()
+    try:
+        if args.command == "status":
+            cursor = conn.cursor()
+            try:
+                done = applied_versions(cursor)
+            finally:
+                cursor.close()
+            for migration in discover():
+                state = "applied" if migration.version in done else "pending"
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+        elif args.command == "upgrade":
+            for version in upgrade(conn, args.version):
+                print(f"applied {version:04d}")
+        else:
+            for version in downgrade(conn, args.version):
+                print(f"reverted {version:04d}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+class BulkRowError(BaseModel):
+    """Why one input row was rejected (index is 0-based in the submitted order)"""
+    index: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    """Model for bulk import responses"""
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
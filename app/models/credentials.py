@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class CredentialBase(BaseModel):
     """Base model with common fields"""
@@ -22,4 +22,19 @@ class CredentialResponse(CredentialBase):
 
 class CredentialUpdate(CredentialBase):
     """Model for updating credentials (all fields optional)"""
-    password_encrypted: Optional[str] = None
\ No newline at end of file
+    password_encrypted: Optional[str] = None
+
+class CredentialMatch(CredentialResponse):
+    """Credential matching an origin: "host" for the same host, "domain" for the same registrable domain"""
+    match: str
+
+class CredentialMatches(BaseModel):
+    """Model for credentials matching an origin, same-host matches first"""
+    host: str
+    domain: str
+    items: List[CredentialMatch]
+
+class CredentialPage(BaseModel):
+    """Model for one keyset-paginated page of credentials"""
+    items: List[CredentialResponse]
+    next_page_token: Optional[str] = None
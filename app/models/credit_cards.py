@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 class CardType(str, Enum):
@@ -33,4 +33,9 @@ class CreditCardCreateDB(CreditCardBase):
 class CreditCardResponse(CreditCardBase):
     card_id: int
     user_id: int
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class CreditCardPage(BaseModel):
+    """Model for one keyset-paginated page of credit cards"""
+    items: List[CreditCardResponse]
+    next_page_token: Optional[str] = None
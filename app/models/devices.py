@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 class DeviceType(str, Enum):
@@ -39,4 +39,9 @@ class DeviceUpdate(BaseModel):
     operating_system: Optional[str] = None
     admin_password_encrypted: Optional[str] = None
     purchase_date: Optional[date] = None
-    notes: Optional[str] = None
\ No newline at end of file
+    notes: Optional[str] = None
+
+class DevicePage(BaseModel):
+    """Model for one keyset-paginated page of devices"""
+    items: List[DeviceResponse]
+    next_page_token: Optional[str] = None
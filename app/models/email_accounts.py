@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class EmailAccountBase(BaseModel):
     """Base model with common fields"""
@@ -27,4 +27,9 @@ class EmailAccountUpdate(BaseModel):
     password_encrypted: Optional[str] = None
     recovery_email: Optional[str] = None
     two_factor_enabled: Optional[bool] = None
-    # Note: user_id is intentionally excluded from updates
\ No newline at end of file
+    # Note: user_id is intentionally excluded from updates
+
+class EmailAccountPage(BaseModel):
+    """Model for one keyset-paginated page of email accounts"""
+    items: List[EmailAccountResponse]
+    next_page_token: Optional[str] = None
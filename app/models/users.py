@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class UserCreateModel(BaseModel):
     """Model for user creation input"""
@@ -8,9 +8,19 @@ class UserCreateModel(BaseModel):
     master_password_hash: str
     email: Optional[str] = None
 
+class UserLoginModel(BaseModel):
+    """Model for login input"""
+    username: str
+    master_password_hash: str
+
 class UserResponseModel(BaseModel):
     """Model for API responses (excludes sensitive data)"""
     user_id: int
     username: str
     email: Optional[str] = None
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class UserPage(BaseModel):
+    """Model for one keyset-paginated page of users"""
+    items: List[UserResponseModel]
+    next_page_token: Optional[str] = None
@@ -0,0 +1,40 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_page_token(scope: Optional[int], last_id: int) -> str:
+    """Opaque token for the page after `last_id`, bound to the user it was issued for"""
+    payload = json.dumps({"u": scope, "a": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_page_token(token: str, scope: Optional[int]) -> int:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        owner, last_id = payload["u"], int(payload["a"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page token")
+    if owner != scope:
+        raise HTTPException(status_code=400, detail="Page token was issued for a different user")
+    return last_id
+
+
+def resolve_after_id(after_id: Optional[int], page_token: Optional[str], scope: Optional[int]) -> int:
+    if page_token:
+        return decode_page_token(page_token, scope)
+    return after_id or 0
+
+
+def next_page_token(rows, limit: int, scope: Optional[int]) -> Optional[str]:
+    """Rows are fetched with LIMIT limit + 1; the extra row only signals that another page exists"""
+    if len(rows) <= limit:
+        return None
+    return encode_page_token(scope, rows[limit - 1][0])
@@ -0,0 +1,207 @@
+"""Server-side hashing of users' master passwords with scrypt, a memory-hard KDF.
+
+Clients keep sending `master_password_hash` (typically already derived client-side);
+the server hashes it again before storing it, so a leaked users table cannot be
+replayed as-is. Stored format:
+
+    $scrypt$ln=<log2 N>,r=<r>,p=<p>$<salt b64>$<hash b64>
+
+Hashing runs on a dedicated process pool behind a concurrency limit and a bounded
+queue: a login burst costs at most PASSWORD_HASH_WORKERS cores, and requests
+beyond the queue are refused with 503 instead of piling up. Hashes made with other
+cost parameters than the configured ones are upgraded on the next successful login.
+
+    python -m app.passwords calibrate [--target-ms 250] [--max-memory-mb 256]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+
+from app import config
+
+PREFIX = "$scrypt$"
+SALT_SIZE = 16
+HASH_SIZE = 32
+
+
+def current_params():
+    return {"ln": config.PASSWORD_SCRYPT_LOG_N, "r": config.PASSWORD_SCRYPT_R, "p": config.PASSWORD_SCRYPT_P}
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _derive(password, salt, ln, r, p):
+    n = 1 << ln
+    # scrypt needs 128 * r * N bytes; OpenSSL's default cap (32 MiB) is too low for real parameters
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n + (1 << 20), dklen=HASH_SIZE)
+
+
+def parse(encoded):
+    """Return (params, salt, digest) of a stored hash, or None if it is not one of ours"""
+    if not encoded or not encoded.startswith(PREFIX):
+        return None
+    try:
+        params, salt, digest = encoded[len(PREFIX):].split("$")
+        values = dict(item.split("=") for item in params.split(","))
+        return {key: int(values[key]) for key in ("ln", "r", "p")}, _unb64(salt), _unb64(digest)
+    except (ValueError, KeyError):
+        return None
+
+
+def hash_password(password, params=None):
+    params = params or current_params()
+    salt = os.urandom(SALT_SIZE)
+    digest = _derive(password, salt, params["ln"], params["r"], params["p"])
+    return f"{PREFIX}ln={params['ln']},r={params['r']},p={params['p']}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password, encoded):
+    parsed = parse(encoded)
+    if parsed is None:
+        # Stored before server-side hashing: the column holds the client's value
+        return encoded is not None and hmac.compare_digest(password.encode(), encoded.encode())
+    params, salt, digest = parsed
+    return hmac.compare_digest(_derive(password, salt, params["ln"], params["r"], params["p"]), digest)
+
+
+def needs_rehash(encoded):
+    parsed = parse(encoded)
+    return parsed is None or parsed[0] != current_params()
+
+
+class HashingPool:
+    """Runs hash/verify calls on a process pool with a cap on running and queued calls"""
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or config.PASSWORD_HASH_WORKERS
+        self.queue_size = config.PASSWORD_HASH_QUEUE if queue_size is None else queue_size
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pending = 0
+        self.rejected = 0
+        self._dummy = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Password hashing is saturated, retry shortly",
+                                headers={"Retry-After": "1"})
+        self._pending += 1
+        try:
+            # Only `workers` calls are handed to the pool at once; the rest wait here
+            # rather than in the executor's unbounded queue
+            async with self._slots:
+                return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password):
+        return await self._run(hash_password, password, current_params())
+
+    async def verify(self, password, encoded):
+        if encoded is None:
+            # Unknown user: spend the same work as a real check so timing does not reveal it
+            if self._dummy is None:
+                self._dummy = await self.hash(os.urandom(16).hex())
+            await self._run(verify_password, password, self._dummy)
+            return False
+        if parse(encoded) is None:
+            return verify_password(password, encoded)
+        return await self._run(verify_password, password, encoded)
+
+    def stats(self):
+        return {"workers": self.workers, "queue_size": self.queue_size,
+                "pending": self._pending, "rejected": self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_hashing_pool = None
+
+
+def get_hashing_pool():
+    global _hashing_pool
+    if _hashing_pool is None:
+        _hashing_pool = HashingPool()
+    return _hashing_pool
+
+
+def close_hashing_pool():
+    global _hashing_pool
+    if _hashing_pool is not None:
+        _hashing_pool.shutdown()
+        _hashing_pool = None
+
+
+def _time_verify(params, rounds):
+    encoded = hash_password("calibration", params)
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        verify_password("calibration", encoded)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def calibrate(target_ms, max_memory_mb, r=8, p=1, rounds=3):
+    """Largest log2 N whose verify time stays within target_ms and memory within max_memory_mb"""
+    best = None
+    for ln in range(10, 25):
+        if 128 * r * (1 << ln) > max_memory_mb * 2**20:
+            break
+        params = {"ln": ln, "r": r, "p": p}
+        elapsed = _time_verify(params, rounds)
+        print(f"ln={ln:2d} r={r} p={p}  memory={128 * r * (1 << ln) / 2**20:7.1f} MiB  verify={elapsed * 1000:8.1f} ms")
+        if elapsed * 1000 > target_ms:
+            break
+        best = params
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the master-password KDF for this host")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="pick scrypt parameters for a target verify latency")
+    cal.add_argument("--target-ms", type=float, default=250)
+    cal.add_argument("--max-memory-mb", type=int, default=256)
+    cal.add_argument("-r", type=int, default=8)
+    cal.add_argument("-p", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    best = calibrate(args.target_ms, args.max_memory_mb, args.r, args.p)
+    if best is None:
+        print("Even the smallest parameters exceed the target; raise --target-ms")
+        return 1
+    print(f"\nPASSWORD_SCRYPT_LOG_N={best['ln']}\nPASSWORD_SCRYPT_R={best['r']}\nPASSWORD_SCRYPT_P={best['p']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
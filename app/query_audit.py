@@ -0,0 +1,158 @@
+"""Per-request query auditing for development and tests.
+
+While QUERY_AUDIT is on, or while the query_audit fixture (tests.query_audit_plugin) is
+listening, QueryAuditMiddleware records every database round trip a request
+makes, where in the application it came from and how many pooled connections the
+request checked out, and flags:
+
+- repeated: the same statement with the same arguments sent more than once;
+- loop: one statement sent QUERY_AUDIT_LOOP_THRESHOLD or more times with different
+  arguments from the same application call stack (the N+1 pattern);
+- connections: more than one pooled connection checked out by one request.
+
+COMMIT and ROLLBACK are not counted as queries. In dev mode the findings are
+logged to "app.query_audit" and every response carries X-Query-Count; the
+fixture turns findings and per-endpoint query budgets into test failures. With
+auditing off a query costs one ContextVar lookup.
+"""
+import contextlib
+import json
+import logging
+import os
+import sys
+import sysconfig
+from contextvars import ContextVar
+
+from app import config
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(APP_DIR) + os.sep
+# Frames from these files are plumbing and middleware, not the code that decided to query
+_PLUMBING = frozenset(os.path.join(APP_DIR, name) for name in ("db_async.py", "query_audit.py", "metrics.py", "tracing.py"))
+_LIBRARIES = tuple({sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")})
+_TRANSACTION_CONTROL = frozenset(("COMMIT", "ROLLBACK"))
+
+audit_log = logging.getLogger("app.query_audit")
+
+_audit = ContextVar("query_audit", default=None)
+_listeners = []
+
+
+def _call_site():
+    """Application and test frames (file:line, innermost first) that led to the current query"""
+    frame = sys._getframe(1)
+    site = []
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not (filename in _PLUMBING or filename.startswith(_LIBRARIES) or filename.startswith("<")):
+            site.append(f"{filename[len(_ROOT):] if filename.startswith(_ROOT) else filename}:{frame.f_lineno}")
+        frame = frame.f_back
+    return tuple(site)
+
+
+class RequestAudit:
+    """The round trips and connection checkouts of one request"""
+
+    __slots__ = ("scope", "statements", "connections")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.statements = []        # (sql, args, call site) per round trip
+        self.connections = 0
+
+    @property
+    def endpoint(self):
+        """Method and route template ("GET /devices/{device_id}"), or the raw path when no route matched"""
+        route = getattr(self.scope.get("route"), "path", None)
+        return f"{self.scope['method']} {route or self.scope['path']}"
+
+    @property
+    def queries(self):
+        return len(self.statements)
+
+    def findings(self, loop_threshold=None):
+        """Human-readable problems with this request's database access, if any"""
+        threshold = config.QUERY_AUDIT_LOOP_THRESHOLD if loop_threshold is None else loop_threshold
+        sent = {}
+        by_site = {}
+        for sql, args, site in self.statements:
+            key = (sql, repr(args))
+            sent[key] = sent.get(key, 0) + 1
+            by_site.setdefault((sql, site), set()).add(key[1])
+        found = []
+        for (sql, args), count in sent.items():
+            if count > 1:
+                found.append(f"repeated: {count} x {_short(sql)} with args {args}")
+        for (sql, site), distinct in by_site.items():
+            if len(distinct) >= threshold:
+                where = " < ".join(site) or "unknown"
+                found.append(f"loop: {len(distinct)} x {_short(sql)} from {where}")
+        if self.connections > 1:
+            found.append(f"connections: {self.connections} pooled connections checked out")
+        return found
+
+
+def _short(sql, limit=120):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= limit else sql[:limit - 3] + "..."
+
+
+def audit_query(sql, args):
+    """Count a round trip against the current request, when it is being audited"""
+    audit = _audit.get()
+    if audit is not None and sql not in _TRANSACTION_CONTROL:
+        audit.statements.append((sql, args, _call_site()))
+
+
+def audit_connection():
+    """Count a pool checkout against the current request, when it is being audited"""
+    audit = _audit.get()
+    if audit is not None:
+        audit.connections += 1
+
+
+@contextlib.contextmanager
+def listen():
+    """Collect the RequestAudit of every request that finishes inside the block, from any thread"""
+    audits = []
+    _listeners.append(audits)
+    try:
+        yield audits
+    finally:
+        _listeners.remove(audits)
+
+
+class QueryAuditMiddleware:
+    """ASGI middleware auditing each request's queries in dev mode or for listening tests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (config.QUERY_AUDIT or _listeners):
+            await self.app(scope, receive, send)
+            return
+        audit = RequestAudit(scope)
+        token = _audit.set(audit)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start" and config.QUERY_AUDIT:
+                # Queries made after the response starts (streamed bodies) are not in it
+                message["headers"] = list(message.get("headers", [])) + [(b"x-query-count", str(audit.queries).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _audit.reset(token)
+            for audits in list(_listeners):
+                audits.append(audit)
+            if config.QUERY_AUDIT:
+                findings = audit.findings()
+                if findings:
+                    audit_log.warning(json.dumps({
+                        "endpoint": audit.endpoint,
+                        "queries": audit.queries,
+                        "connections": audit.connections,
+                        "findings": findings,
+                    }))
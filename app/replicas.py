@@ -0,0 +1,226 @@
+"""Read-replica routing: GET/HEAD reads go to a replica that is fresh enough, everything else to the primary.
+
+DB_REPLICAS lists the replicas ("host[:port],..."; same user, password and
+database as the primary). Each worker keeps a pool per replica and measures its
+lag every DB_REPLICA_CHECK_SECONDS with SHOW REPLICA STATUS (MySQL 8.0.22+). A
+replica is skipped while it is more than DB_REPLICA_MAX_LAG_SECONDS behind, while
+replication is stopped, or when its last check is stale or failed; with no
+replica left, reads use the primary.
+
+Read-your-writes: a response to any request that used the primary for something
+other than GET/HEAD carries a timestamp token, as the X-Read-After header and the
+read_after cookie. A request that sends it back (either way) is only routed to a
+replica known to have applied everything up to that time, so a client never reads
+past its own writes. Seconds_Behind_Source counts whole seconds, so a replica is
+only trusted up to one second before its measured position.
+
+Reads that advance a change-log cursor (vault snapshots, /changes, search and
+health catch-up) use get_primary_db: a lagging replica can show a later change
+before an earlier one that committed late, and the cursor would skip it for good.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+
+from app import config
+
+READ_METHODS = frozenset(("GET", "HEAD"))
+TOKEN_HEADER = b"x-read-after"
+TOKEN_COOKIE = "read_after"
+
+# The current request's routing state, set by ReadRoutingMiddleware
+_routing = ContextVar("read_routing", default=None)
+
+
+class RequestRouting:
+    __slots__ = ("reads_only", "read_after", "wrote")
+
+    def __init__(self, reads_only, read_after):
+        self.reads_only = reads_only
+        self.read_after = read_after      # client's token: replicas must have applied writes up to this time
+        self.wrote = False                # a primary connection was checked out for a non-read request
+
+
+class Replica:
+    """One replica's pool and its last measured lag"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None             # seconds behind the primary; None until measured, or while unusable
+        self.checked_at = 0.0       # time.time() of the measurement
+        self.reads = 0
+        self.failures = 0
+
+    def applied_until(self):
+        """Wall-clock time up to which this replica is known to have applied the primary's writes"""
+        if self.lag is None:
+            return float("-inf")
+        return self.checked_at - self.lag - 1
+
+    def usable(self, now, max_lag, check_interval):
+        return self.lag is not None and self.lag <= max_lag and now - self.checked_at <= 3 * check_interval
+
+    def mark_failed(self):
+        self.lag = None
+        self.failures += 1
+
+
+async def replica_lag(cursor):
+    """Seconds_Behind_Source of the server behind `cursor`, or None if it is not replicating"""
+    await cursor.execute("SHOW REPLICA STATUS")
+    row = await cursor.fetchone()
+    if row is None:
+        return None
+    names = [column[0] for column in cursor.description]
+    lag = dict(zip(names, row)).get("Seconds_Behind_Source")
+    return None if lag is None else float(lag)
+
+
+class ReplicaRouter:
+    """Chooses a replica per read and keeps the replicas' lag current from a background task"""
+
+    def __init__(self, replicas, selection="round_robin", max_lag=5.0, check_interval=1.0):
+        if selection not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown replica selection {selection!r}")
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.primary_reads = 0      # reads that fell back to the primary
+        self._next = 0
+        self._monitor = None
+
+    def choose(self, read_after=None):
+        """A replica for one read, or None to read from the primary"""
+        now = time.time()
+        candidates = [
+            replica for replica in self.replicas
+            if replica.usable(now, self.max_lag, self.check_interval)
+            and (read_after is None or replica.applied_until() >= read_after)
+        ]
+        if not candidates:
+            self.primary_reads += 1
+            return None
+        if self.selection == "least_loaded":
+            replica = min(candidates, key=lambda replica: replica.pool.in_use / replica.pool.max_size)
+        else:
+            self._next += 1
+            replica = candidates[self._next % len(candidates)]
+        replica.reads += 1
+        return replica
+
+    async def check(self):
+        """Measure every replica's lag once"""
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def _check(self, replica):
+        try:
+            conn = await replica.pool.acquire(timeout=self.check_interval)
+            try:
+                cursor = await conn.cursor()
+                try:
+                    lag = await replica_lag(cursor)
+                finally:
+                    await cursor.close()
+            finally:
+                await conn.close()
+        except Exception:
+            replica.mark_failed()
+            return
+        replica.lag = lag
+        replica.checked_at = time.time()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self):
+        """Measure the replicas, then keep measuring them in the background (startup hook)"""
+        if self.replicas and self._monitor is None:
+            await self.check()
+            self._monitor = asyncio.create_task(self._run())
+
+    async def close(self, timeout):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+        for replica in self.replicas:
+            await replica.pool.close(timeout)
+
+    def stats(self):
+        return {
+            "selection": self.selection,
+            "max_lag_seconds": self.max_lag,
+            "primary_reads": self.primary_reads,
+            "replicas": {
+                replica.name: {
+                    "lag_seconds": replica.lag,
+                    "usable": replica.usable(time.time(), self.max_lag, self.check_interval),
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                    "pool": replica.pool.stats(),
+                }
+                for replica in self.replicas
+            },
+        }
+
+
+def route_read(router, primary=False):
+    """The replica that should serve the current request's next checkout, or None for the primary"""
+    routing = _routing.get()
+    if routing is None or not routing.reads_only:
+        if routing is not None:
+            routing.wrote = True
+        return None
+    if primary or not router.replicas:
+        return None
+    return router.choose(routing.read_after)
+
+
+def _token(headers):
+    value = headers.get(TOKEN_HEADER)
+    if value is None and b"cookie" in headers:
+        morsel = SimpleCookie(headers[b"cookie"].decode("latin-1")).get(TOKEN_COOKIE)
+        value = morsel.value.encode() if morsel else None
+    try:
+        # A token from the future only pins the client to the primary until then
+        return min(float(value), time.time()) if value else None
+    except ValueError:
+        return None
+
+
+class ReadRoutingMiddleware:
+    """ASGI middleware tracking whether a request may read from replicas and issuing read-after tokens"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.DB_REPLICAS:
+            await self.app(scope, receive, send)
+            return
+        routing = RequestRouting(scope["method"] in READ_METHODS, _token(dict(scope["headers"])))
+        token = _routing.set(routing)
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and routing.wrote:
+                # The handler has returned, so its writes are committed
+                value = f"{time.time():.3f}"
+                max_age = int(config.DB_REPLICA_MAX_LAG_SECONDS) + 2
+                message["headers"] = list(message.get("headers", [])) + [
+                    (TOKEN_HEADER, value.encode()),
+                    (b"set-cookie", f"{TOKEN_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Lax".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_token)
+        finally:
+            _routing.reset(token)
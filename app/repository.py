@@ -0,0 +1,288 @@
+"""Table-driven CRUD shared by the resource routers.
+
+A Table declares a resource: its columns, which of them clients write, which are
+sealed under the owner's data key and which are derived from others. A
+Repository turns that into the statements every router used to spell out by
+hand, so each router is a thin declaration and a fix here applies to all of them:
+
+- reads go through the read-through cache and answer conditional requests;
+- list pages go from rows straight to JSON (app.serialize) behind a change-log ETag;
+- every write sends the statement, its read-back and COMMIT in one round trip,
+  and rolls back on any database error;
+- partial updates write only the fields that were provided;
+- SQL is built once per distinct column set and reused (see Repository.sql).
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple, Type
+
+import aiomysql
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+from app.bulk import bulk_insert
+from app.cache import get_cache, read_through
+from app.crypto import seal
+from app.db_async import ER_NO_REFERENCED_ROW
+from app.etag import body_etag, change_head, conditional, etag_for, list_etag
+from app.keystore import item_data_key, user_data_key
+from app.pagination import next_page_token
+from app.search import SEARCH_FIELDS, get_search_indexes
+from app.serialize import RowSerializer, json_response
+
+
+@dataclass(frozen=True)
+class Table:
+    name: str
+    pk: str
+    label: str                                  # "Credential": used in 404 and delete messages
+    response: Type[BaseModel]
+    columns: Tuple[str, ...]                    # read back for responses, field for field with `response`
+    writable: Tuple[str, ...]                   # columns clients write (user_id aside)
+    secrets: Tuple[str, ...] = ()               # writable columns sealed under the owner's data key
+    aliases: Dict[str, str] = field(default_factory=dict)   # column -> request field when the names differ
+    derived: Tuple[str, ...] = ()               # columns computed from written values by `derive`
+    derive: Optional[Callable[[dict], dict]] = None
+    owned: bool = True                          # rows belong to a user through user_id
+
+
+def _database_error(err):
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {err}")
+
+
+class Repository:
+    def __init__(self, table: Table):
+        self.table = table
+        self.rows = RowSerializer(table.response, table.columns)
+        self.searchable = table.name in SEARCH_FIELDS
+        self._statements = {}
+        name, pk = table.name, table.pk
+        self._select_one = f"SELECT {self.rows.select} FROM {name} WHERE {pk} = %s"
+        self._select_inserted = f"SELECT {self.rows.select} FROM {name} WHERE {pk} = LAST_INSERT_ID()"
+        self._select_owner = f"SELECT user_id FROM {name} WHERE {pk} = %s"
+        self._delete = f"DELETE FROM {name} WHERE {pk} = %s"
+        if table.owned:
+            self._page = f"SELECT {self.rows.select} FROM {name} WHERE user_id = %s AND {pk} > %s ORDER BY {pk} LIMIT %s"
+        else:
+            self._page = f"SELECT {self.rows.select} FROM {name} WHERE {pk} > %s ORDER BY {pk} LIMIT %s"
+        self._insert_columns = (("user_id",) if table.owned else ()) + table.writable + table.derived
+
+    @property
+    def not_found(self):
+        return f"{self.table.label} not found"
+
+    def sql(self, kind: str, columns: Tuple[str, ...]) -> str:
+        """INSERT or UPDATE for a column set, built on first use and kept for the process"""
+        key = (kind, columns)
+        statement = self._statements.get(key)
+        if statement is None:
+            if kind == "insert":
+                statement = f"INSERT INTO {self.table.name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            else:
+                statement = f"UPDATE {self.table.name} SET {', '.join(f'{column} = %s' for column in columns)} WHERE {self.table.pk} = %s"
+            self._statements[key] = statement
+        return statement
+
+    def statements(self):
+        """Representative SQL of every statement shape, for app.explain_check"""
+        yield self._select_one
+        yield self._select_owner
+        yield self._page
+        yield self._delete
+        yield self.sql("update", self.table.writable)
+
+    def values(self, model: BaseModel) -> dict:
+        """{column: value} for the writable columns (and user_id) present on a request model"""
+        fields = type(model).model_fields
+        values = {}
+        for column in (("user_id",) if self.table.owned else ()) + self.table.writable:
+            source = self.table.aliases.get(column, column)
+            if source in fields:
+                values[column] = getattr(model, source)
+        return values
+
+    def _derive(self, values):
+        if self.table.derive is not None:
+            values.update(self.table.derive(values))
+        return values
+
+    def _response(self, row):
+        return self.table.response(**dict(zip(self.table.columns, row)))
+
+    def _index(self, result):
+        if self.searchable:
+            get_search_indexes().upsert(result.user_id, self.table.name, getattr(result, self.table.pk), result)
+
+    async def _seal(self, conn, values, item_id=None):
+        """Seal the provided secrets under the owner's current key and record its version.
+
+        The owner is the row's user_id from the request when it has one (a create,
+        or an update that moves the row), the stored owner otherwise.
+        """
+        table = self.table
+        given = [column for column in table.secrets if values.get(column) is not None]
+        if not given and (item_id is not None or not table.secrets):
+            return values
+        try:
+            if "user_id" in values:
+                owner = values["user_id"]
+                found = owner, await user_data_key(conn, owner)
+            else:
+                found = await item_data_key(conn, table.name, table.pk, item_id)
+        except aiomysql.Error as err:
+            await conn.rollback()
+            raise _database_error(err)
+        if found is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=self.not_found)
+        owner, key = found
+        if key is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        for column in given:
+            values[column] = seal(key.key, owner, table.name, column, values[column])
+        values["key_version"] = key.version
+        return values
+
+    async def get(self, conn, item_id, request, response):
+        async def load():
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(self._select_one, (item_id,))
+                row = await cursor.fetchone()
+            except aiomysql.Error as err:
+                raise _database_error(err)
+            finally:
+                await cursor.close()
+            if not row:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=self.not_found)
+            return self._response(row)
+
+        # Only rows read from the primary are cached: a lagging replica could bring back
+        # the value a write just invalidated, and every later hit would serve it
+        result = await read_through(self.table.name, item_id, self.table.response, load,
+                                    cacheable=lambda: not conn.from_replica)
+        not_modified = conditional(request, response, etag_for(result))
+        if not_modified:
+            return not_modified
+        return result
+
+    async def page(self, conn, request, response, user_id, after_id, limit):
+        """One keyset page of a user's rows (of all rows for tables that are not owned)"""
+        cursor = await conn.cursor()
+        try:
+            if self.table.owned:
+                # The user's change-log head moves on every write to their items, so an
+                # unchanged page is answered with 304 before any rows are read.
+                etag = list_etag(self.table.name, user_id, await change_head(cursor, user_id), after_id, limit)
+                not_modified = conditional(request, response, etag)
+                if not_modified:
+                    return not_modified
+                await cursor.execute(self._page, (user_id, after_id, limit + 1))
+            else:
+                await cursor.execute(self._page, (after_id, limit + 1))
+            rows = await cursor.fetchall()
+        except aiomysql.Error as err:
+            raise _database_error(err)
+        finally:
+            await cursor.close()
+
+        scope = user_id if self.table.owned else None
+        body = self.rows.page(rows[:limit], next_page_token(rows, limit, scope))
+        if not self.table.owned:
+            not_modified = conditional(request, response, body_etag(body))
+            if not_modified:
+                return not_modified
+        return json_response(body, response)
+
+    async def create(self, conn, model, **overrides):
+        values = self.values(model)
+        values.update(overrides)
+        values = await self._seal(conn, self._derive(values))
+        columns = tuple(values)
+        cursor = await conn.cursor()
+        try:
+            # Insert, read back the stored row and commit in one round trip
+            results = await cursor.execute_batch([
+                (self.sql("insert", columns), tuple(values.values())),
+                (self._select_inserted, None),
+                ("COMMIT", None),
+            ])
+        except aiomysql.IntegrityError as err:
+            await conn.rollback()
+            if err.args[0] == ER_NO_REFERENCED_ROW:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+            raise _database_error(err)
+        except aiomysql.Error as err:
+            await conn.rollback()
+            raise _database_error(err)
+        finally:
+            await cursor.close()
+        result = self._response(results[1][1][0])
+        self._index(result)
+        return result
+
+    async def update(self, conn, item_id, model, partial=False, **overrides):
+        """Write the request's fields; with `partial`, only the ones that were provided"""
+        values = self.values(model)
+        values.update(overrides)
+        # A secret left out keeps its stored ciphertext, even on a full update
+        optional = values.keys() if partial else self.table.secrets
+        values = {column: value for column, value in values.items() if value is not None or column not in optional}
+        if not values:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
+        values = await self._seal(conn, self._derive(values), item_id)
+        columns = tuple(values)
+        cursor = await conn.cursor()
+        try:
+            # Update, read back and commit in one round trip; the UPDATE rowcount
+            # (rows matched, see FOUND_ROWS) is the existence check.
+            results = await cursor.execute_batch([
+                (self.sql("update", columns), (*values.values(), item_id)),
+                (self._select_one, (item_id,)),
+                ("COMMIT", None),
+            ])
+        except aiomysql.Error as err:
+            await conn.rollback()
+            raise _database_error(err)
+        finally:
+            await cursor.close()
+        if results[0][0] == 0:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=self.not_found)
+        await get_cache().invalidate(self.table.name, item_id)
+        result = self._response(results[1][1][0])
+        self._index(result)
+        return result
+
+    async def bulk(self, conn, records, model):
+        """Bulk insert of request records, see app.bulk"""
+        table = self.table
+        columns = self._insert_columns
+
+        def to_params(item):
+            return tuple(self._derive(self.values(item)).values())
+
+        secrets = None
+        if table.secrets:
+            secrets = (table.name, {columns.index(column): column for column in table.secrets})
+            columns += ("key_version",)     # appended by the sealing step
+        return await bulk_insert(conn, records, model, self.sql("insert", columns), to_params, secrets=secrets)
+
+    async def delete(self, conn, item_id):
+        """Delete a row; returns the user it belonged to"""
+        cursor = await conn.cursor()
+        try:
+            results = await cursor.execute_batch([
+                (self._select_owner, (item_id,)),
+                (self._delete, (item_id,)),
+                ("COMMIT", None),
+            ])
+        except aiomysql.Error as err:
+            await conn.rollback()
+            raise _database_error(err)
+        finally:
+            await cursor.close()
+        if results[1][0] == 0:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=self.not_found)
+        owner = results[0][1][0][0]
+        await get_cache().invalidate(self.table.name, item_id)
+        if self.searchable:
+            get_search_indexes().remove(owner, self.table.name, item_id)
+        return owner
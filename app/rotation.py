@@ -0,0 +1,456 @@
+"""Online key rotation: re-encrypt every vault secret under a new data key version.
+
+A job targets the next key version and works through phases, each walking its
+table in primary-key chunks:
+
+  user_keys   give every user a key at the target version, so live writes move
+              to it as soon as the servers' key caches expire
+  <tables>    re-seal rows whose key_version is below the target
+  sweep       re-run the tables for rows written under an older key meanwhile
+
+Each chunk commits together with its checkpoint, so a crashed or paused job
+resumes where it stopped. Rows are updated only if they still hold the value
+that was read, so the job never overwrites a concurrent write. Work is throttled
+to a rows-per-second budget to leave headroom for live traffic.
+
+    python -m app.rotation start [--rows-per-second N] [--chunk-size N]
+    python -m app.rotation resume [JOB_ID]
+    python -m app.rotation pause JOB_ID
+    python -m app.rotation status [JOB_ID]
+    python -m app.rotation prune
+"""
+import argparse
+import json
+import sys
+import time
+
+from app import config
+from app.crypto import ENCRYPTED_COLUMNS, column_aad, get_crypto_pool, new_data_key, unwrap_data_key
+from app.db import _connect, change_log_off
+
+# (checkpoint name, primary key) in the order a job processes them
+ROTATION_TABLES = [
+    ("credentials", "credential_id"),
+    ("email_accounts", "email_id"),
+    ("credit_cards", "card_id"),
+    ("devices", "device_id"),
+]
+USER_KEYS_PHASE = "user_keys"
+MAX_SWEEPS = 5
+
+LATEST_JOB_SQL = "SELECT * FROM key_rotation_jobs ORDER BY job_id DESC LIMIT 1"
+JOB_SQL = "SELECT * FROM key_rotation_jobs WHERE job_id = %s"
+CHECKPOINTS_SQL = (
+    "SELECT * FROM key_rotation_checkpoints WHERE job_id = %s ORDER BY FIELD(table_name, "
+    + ", ".join(f"'{name}'" for name in [USER_KEYS_PHASE] + [table for table, _ in ROTATION_TABLES])
+    + ")"
+)
+
+
+class RotationError(Exception):
+    pass
+
+
+class Throttle:
+    """Sleeps between chunks so work averages at most `rate` rows per second"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._started = time.monotonic()
+        self._rows = 0
+
+    def wait(self, rows):
+        if not self.rate:
+            return
+        self._rows += rows
+        ahead = self._rows / self.rate - (time.monotonic() - self._started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def progress(job, checkpoints):
+    """Summarise a job row and its checkpoint rows (dicts) for the CLI and the admin endpoint"""
+    rows_total = sum(c["rows_total"] for c in checkpoints)
+    rows_done = sum(c["rows_done"] for c in checkpoints)
+    rate = rows_done / job["active_seconds"] if job["active_seconds"] else None
+    remaining = max(rows_total - rows_done, 0)
+    return {
+        "job_id": job["job_id"],
+        "target_version": job["target_version"],
+        "status": job["status"],
+        "error": job["error"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "max_rows_per_second": job["max_rows_per_second"],
+        "rows_total": rows_total,
+        "rows_done": rows_done,
+        "percent": round(100 * rows_done / rows_total, 2) if rows_total else 100.0,
+        "rows_per_second": round(rate, 1) if rate else None,
+        "eta_seconds": 0 if job["status"] == "done" else (round(remaining / rate) if rate else None),
+        "phases": [
+            {"name": c["table_name"], "rows_total": c["rows_total"], "rows_done": c["rows_done"],
+             "last_pk": c["last_pk"], "done": bool(c["done"])}
+            for c in checkpoints
+        ],
+    }
+
+
+class RotationJob:
+    def __init__(self, conn, job_id, chunk_size=None):
+        self.conn = conn
+        self.job_id = job_id
+        self.chunk_size = chunk_size or config.KEY_ROTATION_CHUNK_SIZE
+        self.cursor = conn.cursor(buffered=True)
+        self.cursor.execute(
+            "SELECT target_version, max_rows_per_second FROM key_rotation_jobs WHERE job_id = %s", (job_id,)
+        )
+        row = self.cursor.fetchone()
+        if row is None:
+            raise RotationError(f"Key rotation job {job_id} not found")
+        self.target, rate = row
+        self.throttle = Throttle(rate)
+        self._keys = {}          # (user_id, version) -> unwrapped key, for this run only
+
+    @classmethod
+    def start(cls, conn, rows_per_second=None, chunk_size=None):
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT job_id FROM key_rotation_jobs WHERE status <> 'done'")
+            unfinished = cursor.fetchone()
+            if unfinished:
+                raise RotationError(f"Job {unfinished[0]} has not finished; resume it instead")
+            cursor.execute(
+                """SELECT GREATEST(COALESCE((SELECT MAX(key_version) FROM user_keys), 0),
+                                   COALESCE((SELECT MAX(target_version) FROM key_rotation_jobs), 0)) + 1"""
+            )
+            target = cursor.fetchone()[0]
+            rate = config.KEY_ROTATION_ROWS_PER_SECOND if rows_per_second is None else rows_per_second
+            cursor.execute(
+                "INSERT INTO key_rotation_jobs (target_version, max_rows_per_second) VALUES (%s, %s)",
+                (target, rate),
+            )
+            job_id = cursor.lastrowid
+            cursor.execute(
+                """INSERT INTO key_rotation_checkpoints (job_id, table_name, rows_total)
+                   SELECT %s, %s, COUNT(*) FROM users u
+                   WHERE NOT EXISTS (SELECT 1 FROM user_keys k WHERE k.user_id = u.user_id AND k.key_version = %s)""",
+                (job_id, USER_KEYS_PHASE, target),
+            )
+            for table, _ in ROTATION_TABLES:
+                cursor.execute(
+                    f"""INSERT INTO key_rotation_checkpoints (job_id, table_name, rows_total)
+                        SELECT %s, %s, COUNT(*) FROM {table} WHERE key_version < %s""",
+                    (job_id, table, target),
+                )
+            conn.commit()
+        finally:
+            cursor.close()
+        return cls(conn, job_id, chunk_size)
+
+    def _status(self):
+        self.cursor.execute("SELECT status FROM key_rotation_jobs WHERE job_id = %s", (self.job_id,))
+        return self.cursor.fetchone()[0]
+
+    def _set_status(self, status, error=None):
+        finished = "CURRENT_TIMESTAMP" if status == "done" else "NULL"
+        self.cursor.execute(
+            f"UPDATE key_rotation_jobs SET status = %s, error = %s, finished_at = {finished} WHERE job_id = %s",
+            (status, error, self.job_id),
+        )
+        self.conn.commit()
+
+    def _checkpoint(self, name):
+        self.cursor.execute(
+            "SELECT last_pk, done FROM key_rotation_checkpoints WHERE job_id = %s AND table_name = %s",
+            (self.job_id, name),
+        )
+        return self.cursor.fetchone()
+
+    def _advance(self, name, last_pk, rows, elapsed, done=False):
+        # Runs in the same transaction as the chunk it records
+        self.cursor.execute(
+            """UPDATE key_rotation_checkpoints SET last_pk = %s, rows_done = rows_done + %s, done = %s
+               WHERE job_id = %s AND table_name = %s""",
+            (last_pk, rows, done, self.job_id, name),
+        )
+        self.cursor.execute(
+            "UPDATE key_rotation_jobs SET active_seconds = active_seconds + %s WHERE job_id = %s",
+            (elapsed, self.job_id),
+        )
+        self.conn.commit()
+
+    def _create_target_keys(self, user_ids):
+        self.cursor.executemany(
+            "INSERT IGNORE INTO user_keys (user_id, key_version, wrapped_key) VALUES (%s, %s, %s)",
+            [(user_id, self.target, new_data_key(user_id)[1]) for user_id in user_ids],
+        )
+        # Committed on its own: a key must never disappear with a rolled-back chunk
+        self.conn.commit()
+
+    def _load_keys(self, wanted):
+        """Unwrap the (user_id, version) keys a chunk needs"""
+        missing = sorted({key for key in wanted if key not in self._keys})
+        if missing:
+            user_ids = sorted({user_id for user_id, _ in missing})
+            placeholders = ", ".join(["%s"] * len(user_ids))
+            self.cursor.execute(
+                f"SELECT user_id, key_version, wrapped_key FROM user_keys WHERE user_id IN ({placeholders})",
+                tuple(user_ids),
+            )
+            if len(self._keys) > 100000:
+                self._keys.clear()
+            for user_id, version, wrapped in self.cursor.fetchall():
+                if (user_id, version) in wanted:
+                    self._keys[(user_id, version)] = unwrap_data_key(user_id, wrapped)
+        absent = [key for key in wanted if key not in self._keys]
+        if absent:
+            raise RotationError(f"No data key for (user_id, version) {absent[0]}")
+        return self._keys
+
+    def _run_user_keys(self):
+        last_pk, done = self._checkpoint(USER_KEYS_PHASE)
+        while not done:
+            started = time.monotonic()
+            self.cursor.execute(
+                """SELECT u.user_id FROM users u
+                   WHERE u.user_id > %s
+                     AND NOT EXISTS (SELECT 1 FROM user_keys k WHERE k.user_id = u.user_id AND k.key_version = %s)
+                   ORDER BY u.user_id LIMIT %s""",
+                (last_pk, self.target, self.chunk_size),
+            )
+            user_ids = [row[0] for row in self.cursor.fetchall()]
+            if user_ids:
+                self._create_target_keys(user_ids)
+                last_pk = user_ids[-1]
+            done = len(user_ids) < self.chunk_size
+            self._advance(USER_KEYS_PHASE, last_pk, len(user_ids), time.monotonic() - started, done)
+            if not done and not self._continue(len(user_ids)):
+                return False
+        return True
+
+    def _reseal_chunk(self, table, pk, last_pk):
+        """Re-encrypt one chunk; returns (rows read, rows rewritten, last primary key)"""
+        columns = ENCRYPTED_COLUMNS[table]
+        self.cursor.execute(
+            f"""SELECT {pk}, user_id, key_version, {', '.join(columns)} FROM {table}
+                WHERE {pk} > %s AND key_version < %s ORDER BY {pk} LIMIT %s""",
+            (last_pk, self.target, self.chunk_size),
+        )
+        rows = self.cursor.fetchall()
+        if not rows:
+            return 0, 0, last_pk
+
+        # Users created after the user_keys phase may still lack a target key
+        unkeyed = sorted({row[1] for row in rows if (row[1], self.target) not in self._keys})
+        if unkeyed:
+            self._create_target_keys(unkeyed)
+        keys = self._load_keys(
+            {(row[1], row[2]) for row in rows if row[2]} | {(row[1], self.target) for row in rows}
+        )
+
+        pool = get_crypto_pool()
+        plaintexts = pool.decrypt_many(
+            (keys.get((user_id, version)), value, column_aad(table, column, user_id))
+            for _, user_id, version, *values in rows
+            for column, value in zip(columns, values)
+        )
+        sealed = iter(pool.encrypt_many(
+            (keys[(row[1], self.target)], plaintext, column_aad(table, column, row[1]))
+            for row, plaintext_row in zip(rows, _split(plaintexts, len(columns)))
+            for column, plaintext in zip(columns, plaintext_row)
+        ))
+
+        # Compare-and-set on the old version and ciphertexts: a row rewritten by a
+        # live request since it was read is left for the sweep. updated_at is kept,
+        # and run() keeps these updates out of the change log, because what the
+        # user stored did not change.
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        guards = " AND ".join(f"{column} <=> %s" for column in columns)
+        sql = (f"UPDATE {table} SET {assignments}, key_version = %s, updated_at = updated_at "
+               f"WHERE {pk} = %s AND key_version = %s AND {guards}")
+        rewritten = 0
+        for item_id, _, version, *values in rows:
+            new_values = [next(sealed) for _ in columns]
+            self.cursor.execute(sql, (*new_values, self.target, item_id, version, *values))
+            rewritten += self.cursor.rowcount
+        return len(rows), rewritten, rows[-1][0]
+
+    def _run_table(self, table, pk):
+        last_pk, done = self._checkpoint(table)
+        while not done:
+            started = time.monotonic()
+            read, rewritten, last_pk = self._reseal_chunk(table, pk, last_pk)
+            done = read < self.chunk_size
+            self._advance(table, last_pk, rewritten, time.monotonic() - started, done)
+            if not done and not self._continue(read):
+                return False
+        return True
+
+    def _remaining(self):
+        remaining = {}
+        for table, _ in ROTATION_TABLES:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE key_version < %s", (self.target,))
+            count = self.cursor.fetchone()[0]
+            if count:
+                remaining[table] = count
+        return remaining
+
+    def _reopen(self, remaining):
+        for table, count in remaining.items():
+            self.cursor.execute(
+                """UPDATE key_rotation_checkpoints SET last_pk = 0, done = FALSE, rows_total = rows_total + %s
+                   WHERE job_id = %s AND table_name = %s""",
+                (count, self.job_id, table),
+            )
+        self.conn.commit()
+
+    def _continue(self, rows):
+        self.throttle.wait(rows)
+        return self._status() == "running"
+
+    def _run_phases(self):
+        self._set_status("running")
+        if not self._run_user_keys():
+            return "paused"
+        for sweep in range(MAX_SWEEPS + 1):
+            for table, pk in ROTATION_TABLES:
+                if not self._run_table(table, pk):
+                    return "paused"
+            remaining = self._remaining()
+            if not remaining:
+                self._set_status("done")
+                return "done"
+            if sweep < MAX_SWEEPS:
+                self._reopen(remaining)
+        self._set_status("failed", f"Rows still under older keys after {MAX_SWEEPS} sweeps: {remaining}")
+        return "failed"
+
+    def run(self):
+        """Run or resume the job until it is done, paused or fails; returns the final status"""
+        self.cursor.execute("SELECT GET_LOCK(%s, 0)", (f"key_rotation_{self.job_id}",))
+        if self.cursor.fetchone()[0] != 1:
+            raise RotationError(f"Job {self.job_id} is already being run by another process")
+        try:
+            with change_log_off(self.conn):
+                return self._run_phases()
+        except Exception as err:
+            self.conn.rollback()
+            self._set_status("failed", str(err))
+            raise
+        finally:
+            self.cursor.execute("SELECT RELEASE_LOCK(%s)", (f"key_rotation_{self.job_id}",))
+            self.cursor.fetchone()
+
+
+def _split(values, size):
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def _latest_job_id(cursor, statuses=None):
+    sql = "SELECT job_id FROM key_rotation_jobs"
+    if statuses:
+        sql += " WHERE status IN (" + ", ".join(["%s"] * len(statuses)) + ")"
+    cursor.execute(sql + " ORDER BY job_id DESC LIMIT 1", tuple(statuses or ()))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def job_progress(conn, job_id=None):
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        if job_id is None:
+            cursor.execute(LATEST_JOB_SQL)
+        else:
+            cursor.execute(JOB_SQL, (job_id,))
+        job = cursor.fetchone()
+        if job is None:
+            return None
+        cursor.execute(CHECKPOINTS_SQL, (job["job_id"],))
+        return progress(job, cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def prune(conn):
+    """Delete key versions older than the last finished rotation once nothing can use them"""
+    cursor = conn.cursor(buffered=True)
+    try:
+        cursor.execute(
+            """SELECT target_version, TIMESTAMPDIFF(SECOND, finished_at, NOW()) FROM key_rotation_jobs
+               WHERE status = 'done' ORDER BY job_id DESC LIMIT 1"""
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise RotationError("No finished rotation to prune after")
+        target, age = row
+        # Servers cache a user's current key for DATA_KEY_CACHE_TTL; until that has
+        # passed one of them may still write under an old version.
+        if age < config.DATA_KEY_CACHE_TTL:
+            raise RotationError(f"Rotation finished {age}s ago; wait until DATA_KEY_CACHE_TTL ({config.DATA_KEY_CACHE_TTL}s) has passed")
+        for table, _ in ROTATION_TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE key_version BETWEEN 1 AND %s", (target - 1,))
+            count = cursor.fetchone()[0]
+            if count:
+                raise RotationError(f"{count} {table} rows still use an older key; start a new rotation first")
+        cursor.execute("DELETE FROM user_keys WHERE key_version < %s", (target,))
+        deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rotate the per-user data keys online")
+    sub = parser.add_subparsers(dest="command", required=True)
+    start = sub.add_parser("start", help="begin a rotation to a new key version")
+    start.add_argument("--rows-per-second", type=float, default=None)
+    start.add_argument("--chunk-size", type=int, default=None)
+    resume = sub.add_parser("resume", help="continue a paused, failed or crashed job")
+    resume.add_argument("job_id", type=int, nargs="?")
+    resume.add_argument("--chunk-size", type=int, default=None)
+    pause = sub.add_parser("pause", help="ask a running job to stop after its current chunk")
+    pause.add_argument("job_id", type=int)
+    status = sub.add_parser("status", help="show progress and ETA")
+    status.add_argument("job_id", type=int, nargs="?")
+    sub.add_parser("prune", help="delete superseded key versions")
+    args = parser.parse_args(argv)
+
+    conn = _connect()
+    try:
+        if args.command == "start":
+            job = RotationJob.start(conn, args.rows_per_second, args.chunk_size)
+            print(f"Started job {job.job_id} to key version {job.target}")
+            print(f"Job {job.job_id}: {job.run()}")
+        elif args.command == "resume":
+            job_id = args.job_id
+            if job_id is None:
+                cursor = conn.cursor(buffered=True)
+                job_id = _latest_job_id(cursor, ("running", "paused", "failed"))
+                cursor.close()
+                if job_id is None:
+                    raise RotationError("No unfinished job to resume")
+            print(f"Job {job_id}: {RotationJob(conn, job_id, args.chunk_size).run()}")
+        elif args.command == "pause":
+            cursor = conn.cursor(buffered=True)
+            cursor.execute(
+                "UPDATE key_rotation_jobs SET status = 'paused' WHERE job_id = %s AND status = 'running'",
+                (args.job_id,),
+            )
+            conn.commit()
+            print(f"Job {args.job_id}: {'pausing' if cursor.rowcount else 'not running'}")
+            cursor.close()
+        elif args.command == "status":
+            print(json.dumps(job_progress(conn, args.job_id), indent=2, default=str))
+        elif args.command == "prune":
+            print(f"Deleted {prune(conn)} superseded keys")
+    except RotationError as err:
+        print(err)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
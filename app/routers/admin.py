@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app import db, db_async
+from app.cache import get_cache
+from app.db_async import get_db
+from app.passwords import get_hashing_pool
+from app.rotation import CHECKPOINTS_SQL, JOB_SQL, LATEST_JOB_SQL, progress
+from typing import Optional
+
+import aiomysql
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/pool")
+async def get_pool_stats():
+    stats = {"async": db_async.get_pool().stats()}
+    replicas = db_async.get_replica_router()
+    if replicas.replicas:
+        stats["replicas"] = replicas.stats()
+    if db._pool is not None:
+        # The blocking pool is only created by CLI tools and benchmarks
+        stats["sync"] = db._pool.stats()
+    stats["password_hashing"] = get_hashing_pool().stats()
+    return stats
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    return get_cache().stats()
+
+
+@router.get("/key-rotation")
+async def get_key_rotation(job_id: Optional[int] = None, conn=Depends(get_db)):
+    """Progress and ETA of a key rotation job (python -m app.rotation), the latest by default"""
+    cursor = await conn.cursor(aiomysql.DictCursor)
+    try:
+        if job_id is None:
+            await cursor.execute(LATEST_JOB_SQL)
+        else:
+            await cursor.execute(JOB_SQL, (job_id,))
+        job = await cursor.fetchone()
+        if job is None:
+            raise HTTPException(status_code=404, detail="Key rotation job not found")
+        await cursor.execute(CHECKPOINTS_SQL, (job["job_id"],))
+        return progress(job, await cursor.fetchall())
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
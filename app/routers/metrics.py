@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Response
+from app import db_async
+from app.cache import get_cache
+from app.metrics import CONTENT_TYPE, family, render
+from app.passwords import get_hashing_pool
+
+
+router = APIRouter(tags=["metrics"])
+
+
+def _pool_families(stats):
+    prepared = stats["prepared_statements"] or {}
+    return [
+        family("db_pool_connections", "gauge", "Connections of the async pool by state",
+               [("", ("state",), ("in_use",), stats["in_use"]), ("", ("state",), ("idle",), stats["idle"])]),
+        family("db_pool_max_connections", "gauge", "Pool size plus overflow",
+               [("", (), (), stats["pool_size"] + stats["max_overflow"])]),
+        family("db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection",
+               [("", (), (), stats["waits"])]),
+        family("db_pool_wait_seconds_total", "counter", "Time spent waiting for a free connection",
+               [("", (), (), stats["wait_time_seconds"])]),
+        family("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting",
+               [("", (), (), stats["timeouts"])]),
+        family("db_pool_connections_closed_total", "counter", "Connections closed on checkout by reason",
+               [("", ("reason",), ("recycled",), stats["recycled"]), ("", ("reason",), ("discarded",), stats["discarded"])]),
+        family("db_pool_connections_created_total", "counter", "Connections opened",
+               [("", (), (), stats["created"])]),
+        family("db_prepared_statements_lookups_total", "counter", "Prepared statement cache lookups by result",
+               [("", ("result",), ("hit",), prepared.get("hits", 0)), ("", ("result",), ("miss",), prepared.get("misses", 0))]),
+        family("db_prepared_statements_evictions_total", "counter", "Prepared statements deallocated to stay within capacity",
+               [("", (), (), prepared.get("evictions", 0))]),
+    ]
+
+
+def _cache_families(stats):
+    return [
+        family("cache_lookups_total", "counter", "Read-through cache lookups by result",
+               [("", ("result",), ("hit",), stats["hits"]), ("", ("result",), ("miss",), stats["misses"])]),
+        family("cache_hit_ratio", "gauge", "Read-through cache hits over lookups since start",
+               [("", (), (), stats["hit_rate"])]),
+        family("cache_invalidations_total", "counter", "Read-through cache invalidations",
+               [("", (), (), stats["invalidations"])]),
+        family("cache_evictions_total", "counter", "Read-through cache evictions",
+               [("", (), (), stats["evictions"])]),
+        family("cache_local_entries", "gauge", "Entries in the in-process cache",
+               [("", (), (), stats["local_entries"])]),
+    ]
+
+
+def _replica_families(stats):
+    replicas = stats["replicas"]
+    return [
+        family("db_replica_lag_seconds", "gauge", "Last measured replication lag; NaN while unknown or failed",
+               [("", ("replica",), (name,), float("nan") if replica["lag_seconds"] is None else replica["lag_seconds"])
+                for name, replica in replicas.items()]),
+        family("db_replica_usable", "gauge", "Whether the replica is fresh enough to serve reads",
+               [("", ("replica",), (name,), int(replica["usable"])) for name, replica in replicas.items()]),
+        family("db_replica_reads_total", "counter", "Reads routed by server",
+               [("", ("server",), (name,), replica["reads"]) for name, replica in replicas.items()]
+               + [("", ("server",), ("primary",), stats["primary_reads"])]),
+        family("db_replica_check_failures_total", "counter", "Failed lag checks and checkouts by replica",
+               [("", ("replica",), (name,), replica["failures"]) for name, replica in replicas.items()]),
+    ]
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    hashing = get_hashing_pool().stats()
+    replicas = db_async.get_replica_router()
+    body = render(
+        *_pool_families(db_async.get_pool().stats()),
+        *(_replica_families(replicas.stats()) if replicas.replicas else ()),
+        *_cache_families(get_cache().stats()),
+        family("password_hash_pending", "gauge", "Master-password hashes queued or running",
+               [("", (), (), hashing["pending"])]),
+        family("password_hash_rejected_total", "counter", "Hashes refused because the queue was full",
+               [("", (), (), hashing["rejected"])]),
+    )
+    return Response(content=body, media_type=CONTENT_TYPE)
@@ -0,0 +1,51 @@
+import time
+import aiomysql
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app import db_async
+from app.db import PoolTimeout
+
+
+router = APIRouter(tags=["probes"])
+
+# Seconds /readyz waits for a pooled connection before reporting the pool exhausted
+READY_TIMEOUT = 2.0
+
+
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the worker's event loop is answering"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: not draining, a pooled connection is available and the database answers"""
+    pool = db_async.get_pool()
+    if pool.closing:
+        return JSONResponse({"status": "draining"}, status_code=503)
+    try:
+        conn = await pool.acquire(timeout=READY_TIMEOUT)
+        try:
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute("SELECT 1")
+                await cursor.fetchall()
+            finally:
+                await cursor.close()
+        finally:
+            await conn.close()
+    except (PoolTimeout, aiomysql.Error, OSError) as err:
+        return JSONResponse({"status": "unavailable", "detail": str(err)}, status_code=503)
+    stats = pool.stats()
+    body = {"status": "ready", "pool": {key: stats[key] for key in ("pool_size", "max_overflow", "in_use", "idle")}}
+    replicas = db_async.get_replica_router()
+    if replicas.replicas:
+        # Informational: reads fall back to the primary, so a lagging replica does not make the worker unready
+        now = time.time()
+        body["replicas"] = {
+            replica.name: {"lag_seconds": replica.lag,
+                           "usable": replica.usable(now, replicas.max_lag, replicas.check_interval)}
+            for replica in replicas.replicas
+        }
+    return body
@@ -1,128 +1,105 @@
-from fastapi import APIRouter, HTTPException, status
-from app.db import get_connection
-from app.models.users import  UserCreateModel, UserResponseModel
-from datetime import datetime
-from typing import List
-import mysql.connector
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from app.db_async import get_db
+from app.cache import get_cache
+from app.keystore import forget_user_key
+from app.passwords import get_hashing_pool, needs_rehash
+from app.health import get_health_reports
+from app.repository import Repository, Table
+from app.search import get_search_indexes
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, resolve_after_id
+from app.models.users import  UserCreateModel, UserLoginModel, UserResponseModel, UserPage
+from typing import Optional
+import aiomysql
 
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-@router.get("/", response_model=List[UserResponseModel])
-def get_users():
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT user_id, username, email, created_at FROM users")
-        users = cursor.fetchall()
-        return [
-            UserResponseModel(
-                user_id=user[0],
-                username=user[1],
-                email=user[2],
-                created_at=user[3]
-            ) for user in users
-        ]
-    except mysql.connector.Error as err:
-        raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+USERS = Repository(Table(
+    name="users",
+    pk="user_id",
+    label="User",
+    response=UserResponseModel,
+    columns=("user_id", "username", "email", "created_at"),
+    writable=("username", "master_password_hash", "email"),
+    owned=False,
+))
+
+@router.get("/", response_model=UserPage)
+async def get_users(
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    conn=Depends(get_db),
+):
+    after_id = resolve_after_id(after_id, page_token, None)
+    return await USERS.page(conn, request, response, None, after_id, limit)
 
 @router.get("/{user_id}", response_model=UserResponseModel)
-def get_user(user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
+async def get_user(user_id: int, request: Request, response: Response, conn=Depends(get_db)):
+    return await USERS.get(conn, user_id, request, response)
+
+@router.post("/", response_model=UserResponseModel, status_code=status.HTTP_201_CREATED)
+async def create_user(user: UserCreateModel, conn=Depends(get_db)):
+    # Hashed before a connection is checked out: the KDF is the slow part
+    password_hash = await get_hashing_pool().hash(user.master_password_hash)
+    return await USERS.create(conn, user, master_password_hash=password_hash)
+
+@router.post("/login", response_model=UserResponseModel)
+async def login(credentials: UserLoginModel, conn=Depends(get_db)):
+    hashing = get_hashing_pool()
+    cursor = await conn.cursor()
     try:
-        cursor.execute("SELECT user_id, username, email, created_at FROM users WHERE user_id = %s", (user_id,))
-        user = cursor.fetchone()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        await cursor.execute("SELECT user_id, username, email, created_at, master_password_hash FROM users WHERE username = %s", (credentials.username,))
+        user = await cursor.fetchone()
+        # Release the connection before the KDF runs so a login burst cannot drain the pool
+        await cursor.close()
+        await conn.close()
+
+        # Unknown usernames are checked against a dummy hash, so the response time
+        # does not tell which usernames exist
+        stored = user[4] if user else None
+        if not await hashing.verify(credentials.master_password_hash, stored) or not user:
+            raise HTTPException(status_code=401, detail="Invalid username or password")
+
+        if needs_rehash(stored):
+            # Cost parameters changed (or the row predates server-side hashing). The new
+            # hash is computed without a connection too; one is checked out again only
+            # for the write. The compare-and-set keeps a concurrent password change from
+            # being overwritten.
+            password_hash = await hashing.hash(credentials.master_password_hash)
+            cursor = await conn.cursor()
+            await cursor.execute_batch([
+                ("UPDATE users SET master_password_hash = %s WHERE user_id = %s AND master_password_hash = %s",
+                 (password_hash, user[0], stored)),
+                ("COMMIT", None),
+            ])
+
         return UserResponseModel(
             user_id=user[0],
             username=user[1],
             email=user[2],
             created_at=user[3]
         )
-    except mysql.connector.Error as err:
+    except aiomysql.Error as err:
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
     finally:
-        cursor.close()
-        conn.close()
-
-@router.post("/", response_model=UserResponseModel, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreateModel):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO users (username, master_password_hash, email) VALUES (%s, %s, %s)",
-            (user.username, user.master_password_hash, user.email)
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
-        
-        # Fetch the created user to get the actual created_at timestamp
-        cursor.execute("SELECT username, email, created_at FROM users WHERE user_id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        
-        return UserResponseModel(
-            user_id=user_id,
-            username=user_data[0],
-            email=user_data[1],
-            created_at=user_data[2]  # Use the actual DB timestamp
-        )
-    except mysql.connector.Error as err:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+        await cursor.close()
 
 @router.put("/{user_id}", response_model=UserResponseModel)
-def update_user(user_id: int, user: UserCreateModel):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE users SET username = %s, master_password_hash = %s, email = %s WHERE user_id = %s",
-            (user.username, user.master_password_hash, user.email, user_id)
-        )
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        conn.commit()
-        
-        # Fetch the updated user data
-        cursor.execute("SELECT username, email, created_at FROM users WHERE user_id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        
-        return UserResponseModel(
-            user_id=user_id,
-            username=user_data[0],
-            email=user_data[1],
-            created_at=user_data[2]
-        )
-    except mysql.connector.Error as err:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+async def update_user(user_id: int, user: UserCreateModel, conn=Depends(get_db)):
+    password_hash = await get_hashing_pool().hash(user.master_password_hash)
+    return await USERS.update(conn, user_id, user, master_password_hash=password_hash)
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_200_OK)
-def delete_user(user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        conn.commit()
-        return {"detail": "User deleted successfully"}
-    except mysql.connector.Error as err:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        cursor.close()
-        conn.close()
+async def delete_user(user_id: int, conn=Depends(get_db)):
+    await USERS.delete(conn, user_id)
+    # The user's own entry and, through ON DELETE CASCADE, every vault item they owned
+    await get_cache().invalidate_user(user_id)
+    forget_user_key(user_id)
+    get_search_indexes().drop_user(user_id)
+    get_health_reports().drop_user(user_id)
+    return {"detail": "User deleted successfully"}
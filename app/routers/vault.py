@@ -0,0 +1,175 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.db_async import get_connection, get_db, get_primary_db
+from app.domains import url_keys
+from app.export import EXPORT_FORMATS
+from app.health import get_health_reports
+from app.pagination import decode_page_token, encode_page_token
+from app.search import get_search_indexes
+from app.serialize import dumps, json_response
+from app.sync import DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT, load_changes
+from app.vault import load_vault, select_columns
+from app.models.credentials import CredentialMatch, CredentialMatches
+from typing import Optional
+
+import aiomysql
+
+
+router = APIRouter(prefix="/users", tags=["vault"])
+
+# Snapshots, /changes, search and health advance vault_changes cursors, so they read
+# from the primary (see app.replicas); the other reads may be served by a replica.
+
+@router.get("/{user_id}/vault")
+async def get_vault(
+    user_id: int,
+    sections: Optional[str] = Query(None, description="Comma-separated sections, default all"),
+    exclude: Optional[str] = Query(None, description="Comma-separated fields to skip, e.g. notes,credit_cards.billing_address"),
+    conn=Depends(get_primary_db),
+):
+    selected = select_columns(sections, exclude)
+    cursor = await conn.cursor()
+    try:
+        vault = await load_vault(cursor, user_id, selected)
+        if vault is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return json_response(dumps(vault))
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
+
+@router.get("/{user_id}/changes")
+async def get_changes(
+    user_id: int,
+    since: Optional[str] = Query(None, description="Cursor from /vault or a previous /changes call"),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+    conn=Depends(get_primary_db),
+):
+    since_id = decode_page_token(since, user_id) if since else 0
+    cursor = await conn.cursor()
+    try:
+        changes, last_id, has_more = await load_changes(cursor, user_id, since_id, limit)
+        return json_response(dumps({
+            "changes": changes,
+            "cursor": encode_page_token(user_id, last_id),
+            "has_more": has_more,
+        }))
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
+
+@router.get("/{user_id}/search")
+async def search_vault(
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    sections: Optional[str] = Query(None, description="Comma-separated sections, default all"),
+    limit: int = Query(20, ge=1, le=100),
+    conn=Depends(get_primary_db),
+):
+    """Typo-tolerant search over titles, usernames, URLs, notes, addresses, holders and device details"""
+    selected = set(select_columns(sections)) if sections else None
+    cursor = await conn.cursor()
+    try:
+        index = await get_search_indexes().get(cursor, user_id)
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
+    if index is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"results": index.search(q, limit, selected)}
+
+@router.get("/{user_id}/health")
+async def get_health(user_id: int, conn=Depends(get_primary_db)):
+    """Reused and breached secrets and cards expiring soon"""
+    cursor = await conn.cursor()
+    try:
+        report = await get_health_reports().get(cursor, user_id)
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
+    if report is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return report
+
+@router.get("/{user_id}/credentials/match", response_model=CredentialMatches)
+async def match_credentials(
+    user_id: int,
+    origin: str = Query(..., min_length=1, max_length=2048, description="Page origin or URL, e.g. https://login.example.com"),
+    limit: int = Query(50, ge=1, le=200),
+    conn=Depends(get_db),
+):
+    """Credentials saved for the origin's registrable domain, for autofill"""
+    host, domain = url_keys(origin)
+    if host is None:
+        raise HTTPException(status_code=400, detail="Invalid origin")
+    cursor = await conn.cursor()
+    try:
+        results = await cursor.execute_batch([
+            ("SELECT 1 FROM users WHERE user_id = %s", (user_id,)),
+            # Same-host credentials sort first, then the rest of the domain
+            ("""SELECT credential_id, user_id, title, username, url, notes, created_at, url_host FROM credentials
+                WHERE user_id = %s AND url_domain = %s
+                ORDER BY url_host = %s DESC, credential_id LIMIT %s""",
+             (user_id, domain, host, limit)),
+        ])
+    except aiomysql.Error as err:
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    finally:
+        await cursor.close()
+    if not results[0][1]:
+        raise HTTPException(status_code=404, detail="User not found")
+    return CredentialMatches(
+        host=host,
+        domain=domain,
+        items=[
+            CredentialMatch(
+                credential_id=cred[0],
+                user_id=cred[1],
+                title=cred[2],
+                username=cred[3],
+                url=cred[4],
+                notes=cred[5],
+                created_at=cred[6],
+                match="host" if cred[7] == host else "domain",
+            ) for cred in results[1][1]
+        ],
+    )
+
+@router.get("/{user_id}/export")
+async def export_vault(user_id: int, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    # The connection outlives this handler: it is released by the stream once the
+    # last batch has been sent, so it is acquired here rather than via Depends(get_db).
+    conn = await get_connection()
+    try:
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
+            if not await cursor.fetchone():
+                raise HTTPException(status_code=404, detail="User not found")
+        finally:
+            await cursor.close()
+    except aiomysql.Error as err:
+        await conn.close()
+        raise HTTPException(status_code=500, detail=f"Database error: {err}")
+    except HTTPException:
+        await conn.close()
+        raise
+
+    exporter, media_type = EXPORT_FORMATS[format]
+
+    async def stream():
+        try:
+            async for chunk in exporter(conn, user_id):
+                yield chunk
+        finally:
+            await conn.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="vault-{user_id}.{format}"'},
+    )
@@ -0,0 +1,261 @@
+"""Typo-tolerant search over the non-secret fields of a user's vault.
+
+Each process keeps an in-memory trigram index per recently searched user. The
+index is built on first use from one snapshot read, then kept current
+incrementally: the routers apply their own writes directly, and every search
+first replays the user's vault_changes log from the index's cursor, which picks up
+bulk imports, cascades and writes served by other processes.
+
+Matching is trigram similarity (the share of the query's trigrams found in an
+item), so "githb" still finds "GitHub". Postings are walked rarest first and the
+walk stops as soon as the items not yet seen can no longer make the top results,
+so common trigrams ("com", "www") are rarely scanned.
+"""
+import asyncio
+import heapq
+import math
+import re
+from collections import OrderedDict
+
+from app import config
+from app.sync import USER_EXISTS_SQL, load_changes
+from app.vault import SETTLED_HEAD_SQL
+
+# Searchable fields per section, with the weight of a match in each
+SEARCH_FIELDS = {
+    "credentials": ("credentials", "credential_id", {"title": 3, "username": 2, "url": 2, "notes": 1}),
+    "email_accounts": ("email_accounts", "email_id", {"email_address": 3, "provider": 1}),
+    "credit_cards": ("credit_cards", "card_id", {"card_holder_name": 2}),
+    "devices": ("devices", "device_id", {"brand": 2, "model": 2, "serial_number": 2}),
+}
+
+# Most recently active users first; a loose index scan over idx_vault_changes_user_change
+PRELOAD_SQL = "SELECT user_id FROM vault_changes GROUP BY user_id ORDER BY MAX(change_id) DESC LIMIT %s"
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def _fields_sql(item_type):
+    table, pk, fields = SEARCH_FIELDS[item_type]
+    return f"SELECT {pk}, {', '.join(fields)} FROM {table} WHERE user_id = %s"
+
+
+def statements():
+    """The SQL this module sends, for app.explain_check"""
+    yield USER_EXISTS_SQL
+    yield SETTLED_HEAD_SQL
+    for item_type in SEARCH_FIELDS:
+        yield _fields_sql(item_type)
+    yield PRELOAD_SQL
+
+
+def trigrams(text):
+    """Padded trigrams of every word, as in pg_trgm: "git" -> "  g", " gi", "git", "it " """
+    grams = set()
+    for word in _WORD.findall((text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _fields(item_type, item):
+    values = item if isinstance(item, dict) else dict(item)
+    return tuple(values.get(field) for field in SEARCH_FIELDS[item_type][2])
+
+
+def _weighted_trigrams(item_type, fields):
+    """{trigram: weight of the heaviest field containing it}"""
+    weights = {}
+    for value, weight in zip(fields, SEARCH_FIELDS[item_type][2].values()):
+        for gram in trigrams(value):
+            if weights.get(gram, 0) < weight:
+                weights[gram] = weight
+    return weights
+
+
+class VaultIndex:
+    """Trigram index over one user's items"""
+
+    def __init__(self, cursor=0):
+        self.cursor = cursor            # last vault_changes id applied
+        self._postings = {}             # trigram -> {doc number: field weight}
+        self._docs = {}                 # doc number -> (item_type, item_id, field values)
+        self._numbers = {}              # (item_type, item_id) -> doc number
+        self._next = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, item_type, item_id, item):
+        self.remove(item_type, item_id)
+        fields = _fields(item_type, item)
+        number = self._next
+        self._next += 1
+        self._docs[number] = (item_type, item_id, fields)
+        self._numbers[(item_type, item_id)] = number
+        for gram, weight in _weighted_trigrams(item_type, fields).items():
+            self._postings.setdefault(gram, {})[number] = weight
+
+    def remove(self, item_type, item_id):
+        number = self._numbers.pop((item_type, item_id), None)
+        if number is None:
+            return
+        _, _, fields = self._docs.pop(number)
+        for gram in _weighted_trigrams(item_type, fields):
+            docs = self._postings.get(gram)
+            if docs is not None:
+                docs.pop(number, None)
+                if not docs:
+                    del self._postings[gram]
+
+    def search(self, query, limit, types=None, threshold=None):
+        threshold = config.SEARCH_MIN_SIMILARITY if threshold is None else threshold
+        grams = trigrams(query)
+        if not grams:
+            return []
+        total = len(grams)
+        needed = max(1, math.ceil(threshold * total))
+        postings = sorted((self._postings.get(gram, {}) for gram in grams), key=len)
+
+        scored = {}         # doc number -> (matched trigrams, summed field weights), None if filtered out
+        kth = []            # min-heap of the `limit` best match counts so far
+        # Any item with `needed` matches contains one of the total - needed + 1 rarest
+        # trigrams. Items outside the first j postings match at most total - j
+        # trigrams, so once `limit` items beat that the remaining postings can't
+        # change the result and are skipped; common trigrams rarely get scanned.
+        for j, posting in enumerate(postings[:total - needed + 1]):
+            if len(kth) == limit and kth[0] > total - j:
+                break
+            for number in posting:
+                if number in scored:
+                    continue
+                if types and self._docs[number][0] not in types:
+                    scored[number] = None
+                    continue
+                matched = weighted = 0
+                for other in postings:
+                    weight = other.get(number)
+                    if weight:
+                        matched += 1
+                        weighted += weight
+                scored[number] = (matched, weighted)
+                if matched >= needed:
+                    if len(kth) < limit:
+                        heapq.heappush(kth, matched)
+                    elif matched > kth[0]:
+                        heapq.heapreplace(kth, matched)
+
+        # Rank by overall similarity, then by the weight of the fields that matched
+        best = heapq.nsmallest(
+            limit,
+            ((-score[0], -score[1], number) for number, score in scored.items() if score and score[0] >= needed),
+        )
+        results = []
+        for matched, weighted, number in best:
+            item_type, item_id, fields = self._docs[number]
+            results.append({
+                "type": item_type,
+                "id": item_id,
+                "score": round(-matched / total, 4),
+                "fields": dict(zip(SEARCH_FIELDS[item_type][2], fields)),
+            })
+        return results
+
+
+class SearchIndexes:
+    """Per-user VaultIndex instances, least recently searched evicted first"""
+
+    def __init__(self, max_items=None):
+        self.max_items = max_items or config.SEARCH_INDEX_MAX_ITEMS
+        self._indexes = OrderedDict()   # user_id -> VaultIndex
+        self._locks = {}
+
+    def _evict(self):
+        total = sum(len(index) for index in self._indexes.values())
+        while total > self.max_items and len(self._indexes) > 1:
+            user_id, index = self._indexes.popitem(last=False)
+            total -= len(index)
+            lock = self._locks.get(user_id)
+            if lock is not None and not lock.locked():
+                del self._locks[user_id]
+
+    async def _build(self, cursor, user_id):
+        # Cursor and rows come from one snapshot. The cursor only covers settled log
+        # entries, so a write that committed late is replayed rather than skipped.
+        statements = [
+            (USER_EXISTS_SQL, (user_id,)),
+            (SETTLED_HEAD_SQL, (user_id, config.SYNC_SETTLE_SECONDS)),
+        ]
+        statements.extend((_fields_sql(item_type), (user_id,)) for item_type in SEARCH_FIELDS)
+        results = await cursor.execute_batch(statements)
+        if not results[0][1]:
+            return None
+        index = VaultIndex(results[1][1][0][0])
+        for item_type, (_, rows) in zip(SEARCH_FIELDS, results[2:]):
+            names = list(SEARCH_FIELDS[item_type][2])
+            for item_id, *values in rows:
+                index.upsert(item_type, item_id, dict(zip(names, values)))
+        return index
+
+    async def _catch_up(self, cursor, user_id, index):
+        has_more = True
+        while has_more:
+            changes, index.cursor, has_more = await load_changes(cursor, user_id, index.cursor, 5000)
+            for change in changes:
+                if change["type"] not in SEARCH_FIELDS:
+                    continue
+                if change["operation"] == "upsert":
+                    index.upsert(change["type"], change["id"], change["item"])
+                else:
+                    index.remove(change["type"], change["id"])
+
+    async def get(self, cursor, user_id):
+        """The user's index brought up to date, or None if the user does not exist"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = await self._build(cursor, user_id)
+                if index is None:
+                    self._locks.pop(user_id, None)
+                    return None
+                self._indexes[user_id] = index
+                self._evict()
+            else:
+                self._indexes.move_to_end(user_id)
+            await self._catch_up(cursor, user_id, index)
+            return index
+
+    async def preload(self, cursor, users):
+        """Build the indexes of the `users` most recently active users (startup warmup); returns how many"""
+        await cursor.execute(PRELOAD_SQL, (users,))
+        loaded = 0
+        for (user_id,) in await cursor.fetchall():
+            if await self.get(cursor, user_id) is not None:
+                loaded += 1
+        return loaded
+
+    def upsert(self, user_id, item_type, item_id, item):
+        """Apply a router's own write, if this process has the user's index loaded"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.upsert(item_type, item_id, item)
+
+    def remove(self, user_id, item_type, item_id):
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.remove(item_type, item_id)
+
+    def drop_user(self, user_id):
+        self._indexes.pop(user_id, None)
+        self._locks.pop(user_id, None)
+
+
+_search_indexes = None
+
+
+def get_search_indexes():
+    global _search_indexes
+    if _search_indexes is None:
+        _search_indexes = SearchIndexes()
+    return _search_indexes
@@ -0,0 +1,84 @@
+"""Fast JSON for list endpoints: database rows straight to response bytes.
+
+The regular path builds a pydantic model per row, has FastAPI validate it again
+against response_model and then runs jsonable_encoder and json.dumps over the
+result. Rows read from our own tables are already well-typed, so list endpoints
+map them to JSON through a RowSerializer instead: the column-to-field mapping
+is checked against the response model once, at import time, and each request
+only zips rows with field names and hands them to orjson.
+
+response_model stays on the routes for the OpenAPI schema; FastAPI does not
+validate a Response that is returned directly.
+"""
+import datetime
+import enum
+import json
+import typing
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:     # optional: falls back to the standard library, same output, slower
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """JSON bytes for dicts/lists of DB values (str, int, None, date, datetime, enum)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def _is_bool(annotation):
+    return annotation is bool or bool in typing.get_args(annotation)
+
+
+class RowSerializer:
+    """Precompiled mapping from SELECT columns to a response model's JSON fields"""
+
+    def __init__(self, model, columns):
+        fields = model.model_fields
+        unknown = [column for column in columns if column not in fields]
+        missing = [name for name in fields if name not in columns]
+        if unknown or missing:
+            raise ValueError(f"{model.__name__}: columns {unknown} are not fields, fields {missing} have no column")
+        self.model = model
+        self.columns = tuple(columns)
+        self.select = ", ".join(columns)
+        # MySQL BOOLEAN is TINYINT: the only values that need converting
+        self._bool_positions = [i for i, column in enumerate(columns) if _is_bool(fields[column].annotation)]
+
+    def records(self, rows):
+        columns = self.columns
+        if not self._bool_positions:
+            return [dict(zip(columns, row)) for row in rows]
+        records = []
+        for row in rows:
+            record = dict(zip(columns, row))
+            for i in self._bool_positions:
+                value = row[i]
+                if value is not None:
+                    record[columns[i]] = bool(value)
+            records.append(record)
+        return records
+
+    def page(self, rows, next_page_token):
+        """JSON of a keyset page ({items, next_page_token}) for already-sliced rows"""
+        return dumps({"items": self.records(rows), "next_page_token": next_page_token})
+
+
+def json_response(body, response=None):
+    """Response for pre-encoded JSON, keeping headers (e.g. ETag) set on the injected `response`"""
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,50 @@
+"""Production entry point: worker processes sharing one listening socket.
+
+    python -m app.serve                         # WEB_WORKERS processes on WEB_HOST:WEB_PORT
+    python -m app.serve --workers 4 --port 8080
+
+Workers share nothing: each has its own event loop, connection pool, caches and
+search indexes, and warms them before it accepts requests (see app.main). With
+DB_CONNECTION_BUDGET set, each worker's pool gets an equal share of it, so all
+workers together never open more connections than the database was sized for.
+
+On SIGTERM or SIGINT every worker stops accepting connections, lets in-flight
+requests finish for up to SHUTDOWN_GRACE_SECONDS, then returns and closes its
+database connections. A worker that dies is replaced. Probe /healthz for
+liveness and /readyz for readiness.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from app import config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_WORKERS, help="worker processes, default one per core")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if config.DB_CONNECTION_BUDGET and config.DB_CONNECTION_BUDGET < args.workers:
+        parser.error(f"DB_CONNECTION_BUDGET={config.DB_CONNECTION_BUDGET} is less than one connection per worker")
+
+    # Workers are fresh interpreters that read app.config from the environment;
+    # this is how each one learns its share of DB_CONNECTION_BUDGET
+    os.environ["WEB_WORKERS"] = str(args.workers)
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=config.SHUTDOWN_GRACE_SECONDS,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from app import config
+from app.vault import SETTLED_HEAD_SQL, VAULT_SECTIONS, as_record
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+CHANGES_SQL = """SELECT change_id, item_type, item_id, operation FROM vault_changes
+                 WHERE user_id = %s AND change_id > %s
+                   AND changed_at <= NOW(6) - INTERVAL %s SECOND
+                 ORDER BY change_id LIMIT %s"""
+USER_EXISTS_SQL = "SELECT 1 FROM users WHERE user_id = %s"
+
+
+def _items_statement(user_id, item_type, ids):
+    table, pk, columns = VAULT_SECTIONS[item_type]
+    return (f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = %s AND {pk} IN ({', '.join(['%s'] * len(ids))})",
+            (user_id, *ids))
+
+
+def statements():
+    """The SQL this module sends, for app.explain_check"""
+    yield CHANGES_SQL
+    for item_type in VAULT_SECTIONS:
+        yield _items_statement(0, item_type, [0, 0])[0]
+
+
+async def load_changes(cursor, user_id, since, limit, settled=True):
+    """Changes to a user's vault after change_id `since`.
+
+    Returns (changes, last change_id, has_more). Several log entries for the same
+    item collapse into one; upserts carry the item's current state, and items that
+    no longer exist (or moved to another user) are reported as deletes.
+
+    With `settled` off, changes still inside the settle window are returned too;
+    only callers that replay changes idempotently and do not advance their cursor
+    past them can use that.
+    """
+    await cursor.execute(
+        CHANGES_SQL, (user_id, since, config.SYNC_SETTLE_SECONDS if settled else 0, limit + 1)
+    )
+    log = await cursor.fetchall()
+    has_more = len(log) > limit
+    log = log[:limit]
+    if not log:
+        return [], since, False
+
+    latest = {}
+    for change_id, item_type, item_id, operation in log:
+        latest.pop((item_type, item_id), None)          # keep dict order = order of last change
+        latest[(item_type, item_id)] = operation
+
+    upserts = {}
+    for (item_type, item_id), operation in latest.items():
+        if operation == "upsert" and item_type in VAULT_SECTIONS:
+            upserts.setdefault(item_type, []).append(item_id)
+
+    current = {}
+    if upserts:
+        batch = [_items_statement(user_id, item_type, ids) for item_type, ids in upserts.items()]
+        for item_type, (_, rows) in zip(upserts, await cursor.execute_batch(batch)):
+            columns = VAULT_SECTIONS[item_type][2]
+            for row in rows:
+                current[(item_type, row[0])] = as_record(columns, row)
+
+    changes = []
+    for (item_type, item_id), operation in latest.items():
+        item = current.get((item_type, item_id))
+        if operation == "upsert" and item is not None:
+            changes.append({"type": item_type, "id": item_id, "operation": "upsert", "item": item})
+        else:
+            changes.append({"type": item_type, "id": item_id, "operation": "delete", "item": None})
+    return changes, log[-1][0], has_more
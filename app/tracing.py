@@ -0,0 +1,292 @@
+"""Request-scoped query tracing and the slow-query log.
+
+TracingMiddleware gives every request an ID (X-Request-ID, taken from the request
+when the client sent one) and, when an exporter is configured, a trace: one
+server span for the request and one client span per database round trip, with
+the statement template (placeholders, never values), duration, rows and the route
+that issued it. Traces continue an incoming W3C `traceparent`. Spans are written
+in the OTLP/JSON encoding, one request per line, to a file (TRACE_EXPORTER=file)
+or POSTed to a collector's /v1/traces (TRACE_EXPORTER=otlp) from a background
+thread, so the request path only appends to a queue.
+
+With tracing off the per-query cost is one ContextVar lookup. Independently of
+tracing, a round trip slower than SLOW_QUERY_MS is logged to the
+"app.slow_queries" logger (and SLOW_QUERY_LOG_FILE if set) with its EXPLAIN plan.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+import httpx
+
+from app import config
+
+SERVICE_NAME = "password_saver_api"
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+slow_log = logging.getLogger("app.slow_queries")
+
+_request = ContextVar("request_trace", default=None)
+_exporter = None
+
+
+def _id(size):
+    return os.urandom(size).hex()
+
+
+def _attributes(values):
+    attributes = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+class RequestTrace:
+    """What is known about the current request; `spans` is None unless exporting"""
+
+    __slots__ = ("request_id", "scope", "trace_id", "span_id", "parent_id", "spans")
+
+    def __init__(self, request_id, scope, trace_id, parent_id, exporting):
+        self.request_id = request_id
+        self.scope = scope
+        self.trace_id = trace_id
+        self.span_id = _id(8)
+        self.parent_id = parent_id
+        self.spans = [] if exporting else None
+
+    @property
+    def route(self):
+        return getattr(self.scope.get("route"), "path", None)
+
+    def query(self, operation, statement, seconds, rows, failed=False):
+        end = time.time_ns()
+        self.spans.append({
+            "traceId": self.trace_id,
+            "spanId": _id(8),
+            "parentSpanId": self.span_id,
+            "name": operation,
+            "kind": SPAN_KIND_CLIENT,
+            "startTimeUnixNano": str(end - int(seconds * 1e9)),
+            "endTimeUnixNano": str(end),
+            "attributes": _attributes({
+                "db.system": "mysql",
+                "db.operation": operation,
+                "db.statement": statement,
+                "db.response.returned_rows": rows if rows >= 0 else None,
+                "http.route": self.route,
+                "request.id": self.request_id,
+            }),
+            "status": {"code": STATUS_ERROR} if failed else {},
+        })
+
+
+def record_query(operation, statements, seconds, rows, failed=False):
+    """Add a database span for (template, args) `statements` to the current request's trace, if traced"""
+    trace = _request.get()
+    if trace is not None and trace.spans is not None:
+        trace.query(operation, ";\n".join(template for template, _ in statements), seconds, rows, failed)
+
+
+class TracingMiddleware:
+    """ASGI middleware assigning request IDs and collecting each request's spans"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or _id(8)
+        parent = _TRACEPARENT.match(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id = (parent.group(1), parent.group(2)) if parent else (_id(16), None)
+        trace = RequestTrace(request_id, scope, trace_id, parent_id, _exporter is not None)
+        token = _request.set(trace)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        start = time.time_ns()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request.reset(token)
+            if trace.spans is not None:
+                _export_request(trace, scope, status, start, time.time_ns())
+
+
+def _export_request(trace, scope, status, start, end):
+    route = trace.route
+    span = {
+        "traceId": trace.trace_id,
+        "spanId": trace.span_id,
+        "name": f"{scope['method']} {route or 'unmatched'}",
+        "kind": SPAN_KIND_SERVER,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": _attributes({
+            "http.request.method": scope["method"],
+            "http.route": route,
+            "url.path": scope["path"],
+            "http.response.status_code": status,
+            "request.id": trace.request_id,
+        }),
+        "status": {"code": STATUS_ERROR} if status >= 500 else {},
+    }
+    if trace.parent_id:
+        span["parentSpanId"] = trace.parent_id
+    _exporter.submit([span] + trace.spans)
+
+
+def _payload(spans):
+    return {"resourceSpans": [{
+        "resource": {"attributes": _attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+        "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}],
+    }]}
+
+
+class _Exporter:
+    """Hands finished requests to a daemon thread; drops them if it falls behind"""
+
+    def __init__(self, max_queued=10000):
+        self._queue = queue.Queue(max_queued)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def submit(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                return
+            while len(batch) < 512:
+                try:
+                    spans = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if spans is None:
+                    self._write(batch)
+                    return
+                batch.append(spans)
+            self._write(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class FileExporter(_Exporter):
+    """OTLP/JSON lines, one request (resourceSpans) per line, as the collector's file receiver reads them"""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        super().__init__()
+
+    def _write(self, batch):
+        for spans in batch:
+            self._file.write(json.dumps(_payload(spans), separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class OtlpHttpExporter(_Exporter):
+    """POSTs batches in the OTLP/HTTP JSON encoding to a collector"""
+
+    def __init__(self, endpoint):
+        self._url = endpoint.rstrip("/") + "/v1/traces"
+        self._client = httpx.Client(timeout=5.0)
+        self.failed = 0
+        super().__init__()
+
+    def _write(self, batch):
+        spans = [span for request in batch for span in request]
+        try:
+            self._client.post(self._url, json=_payload(spans)).raise_for_status()
+        except httpx.HTTPError:
+            self.failed += len(batch)
+
+    def close(self):
+        super().close()
+        self._client.close()
+
+
+def start_tracing():
+    """Create the configured exporter and the slow-query log file handler (startup hook)"""
+    global _exporter
+    if config.TRACE_EXPORTER == "file":
+        _exporter = FileExporter(config.TRACE_FILE)
+    elif config.TRACE_EXPORTER == "otlp":
+        _exporter = OtlpHttpExporter(config.TRACE_OTLP_ENDPOINT)
+    if config.SLOW_QUERY_LOG_FILE and not slow_log.handlers:
+        slow_log.addHandler(logging.FileHandler(config.SLOW_QUERY_LOG_FILE))
+    slow_log.setLevel(logging.WARNING)
+
+
+def stop_tracing():
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+async def log_slow_query(connection, statements, seconds, explain=True):
+    """Log a slow round trip with the EXPLAIN plan of each statement in it.
+
+    `statements` are (template, args) pairs. EXPLAIN runs on a separate cursor of
+    the same connection, after the caller's results were read, and never fails
+    the request. Without `explain` (the results are still streaming) "plans" is null.
+    """
+    plans = [] if explain else None
+    for template, args in statements if explain else ():
+        if not template.lstrip()[:7].upper().startswith(EXPLAINABLE):
+            continue
+        cursor = await connection.cursor()
+        try:
+            await cursor.execute("EXPLAIN " + template, args)
+            names = [column[0] for column in cursor.description]
+            plans.append([dict(zip(names, row)) for row in await cursor.fetchall()])
+        except Exception as err:
+            plans.append({"error": str(err)})
+        finally:
+            await cursor.close()
+    trace = _request.get()
+    slow_log.warning(json.dumps({
+        "duration_ms": round(seconds * 1000, 3),
+        "request_id": trace.request_id if trace else None,
+        "route": trace.route if trace else None,
+        "statements": [" ".join(template.split()) for template, _ in statements],
+        "plans": plans,
+    }, default=str))
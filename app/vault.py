@@ -0,0 +1,97 @@
+from fastapi import HTTPException
+
+from app import config
+from app.pagination import encode_page_token
+
+# Vault sections: response key -> (table, primary key, columns returned by the API).
+# Columns mirror the *Response models, so secrets never leave through this endpoint.
+VAULT_SECTIONS = {
+    "credentials": ("credentials", "credential_id",
+                    ["credential_id", "user_id", "title", "username", "url", "notes", "created_at"]),
+    "email_accounts": ("email_accounts", "email_id",
+                       ["email_id", "user_id", "email_address", "provider", "recovery_email",
+                        "two_factor_enabled", "created_at"]),
+    "credit_cards": ("credit_cards", "card_id",
+                     ["card_id", "user_id", "card_holder_name", "expiration_date", "billing_address",
+                      "card_type", "created_at"]),
+    "devices": ("devices", "device_id",
+                ["device_id", "user_id", "device_type", "brand", "model", "serial_number",
+                 "operating_system", "purchase_date", "notes", "created_at"]),
+}
+
+BOOLEAN_COLUMNS = {"two_factor_enabled"}
+
+USER_SQL = "SELECT user_id, username, email, created_at FROM users WHERE user_id = %s"
+# Where a snapshot's sync cursor starts: the last change outside the settle window
+SETTLED_HEAD_SQL = """SELECT COALESCE(MAX(change_id), 0) FROM vault_changes
+                      WHERE user_id = %s AND changed_at <= NOW(6) - INTERVAL %s SECOND"""
+
+
+def _split(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def select_columns(sections=None, exclude=None):
+    """Resolve ?sections= and ?exclude= into {section: columns}.
+
+    `exclude` takes bare column names ("notes", dropped from every section) or
+    section-qualified ones ("devices.notes"). Primary keys are always returned.
+    """
+    names = _split(sections) or list(VAULT_SECTIONS)
+    unknown = [name for name in names if name not in VAULT_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown vault sections: {', '.join(unknown)}")
+
+    excluded = _split(exclude)
+    selected = {}
+    for name in names:
+        _, pk, columns = VAULT_SECTIONS[name]
+        selected[name] = [
+            column for column in columns
+            if column == pk or (column not in excluded and f"{name}.{column}" not in excluded)
+        ]
+    return selected
+
+
+def as_record(columns, row):
+    record = dict(zip(columns, row))
+    for column in BOOLEAN_COLUMNS.intersection(record):
+        record[column] = bool(record[column])
+    return record
+
+
+def _section_sql(name, columns):
+    table, pk, _ = VAULT_SECTIONS[name]
+    return f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = %s ORDER BY {pk}"
+
+
+def statements():
+    """The SQL this module sends, for app.explain_check"""
+    yield USER_SQL
+    yield SETTLED_HEAD_SQL
+    for name, (_, _, columns) in VAULT_SECTIONS.items():
+        yield _section_sql(name, columns)
+
+
+async def load_vault(cursor, user_id, selected):
+    """Fetch the user and every selected section in one multi-statement round trip"""
+    statements = [
+        (USER_SQL, (user_id,)),
+        # Sync cursor for this snapshot. It stops before changes still inside the
+        # settle window: a lower change_id may commit after them, and a cursor past
+        # it would skip it. /changes replays the ones the snapshot already holds.
+        (SETTLED_HEAD_SQL, (user_id, config.SYNC_SETTLE_SECONDS)),
+    ]
+    statements.extend((_section_sql(name, columns), (user_id,)) for name, columns in selected.items())
+    results = await cursor.execute_batch(statements)
+
+    users = results[0][1]
+    if not users:
+        return None
+    vault = {
+        "user": as_record(["user_id", "username", "email", "created_at"], users[0]),
+        "cursor": encode_page_token(user_id, results[1][1][0][0]),
+    }
+    for (name, columns), (_, rows) in zip(selected.items(), results[2:]):
+        vault[name] = [as_record(columns, row) for row in rows]
+    return vault
@@ -0,0 +1,83 @@
+"""Compare the blocking (threadpool) and asyncio database paths under concurrent load.
+
+Both variants serve GET /credentials/{credential_id} with the same SQL and response
+model; only the driver and handler type differ. Requires a local MySQL loaded with
+database.sql and at least a few credentials rows (see DB_* in app/config.py).
+
+    python -m benchmarks.async_vs_sync --concurrency 50 --requests 5000
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+
+from app.db import get_connection, get_db
+from app.models.credentials import CredentialResponse
+from benchmarks.common import run_load, serve
+
+
+# Blocking variant: a plain `def` handler that FastAPI runs on its AnyIO threadpool
+sync_app = FastAPI()
+
+@sync_app.get("/credentials/{credential_id}", response_model=CredentialResponse)
+def get_credential_sync(credential_id: int, conn=Depends(get_db)):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT credential_id, user_id, title, username, url, notes, password_encrypted, created_at FROM credentials WHERE credential_id = %s", (credential_id,))
+        cred = cursor.fetchone()
+        if not cred:
+            raise HTTPException(status_code=404, detail="Credential not found")
+        return CredentialResponse(
+            credential_id=cred[0],
+            user_id=cred[1],
+            title=cred[2],
+            username=cred[3],
+            url=cred[4],
+            notes=cred[5],
+            created_at=cred[7]
+        )
+    finally:
+        cursor.close()
+
+
+def credential_ids(limit=1000):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT credential_id FROM credentials ORDER BY credential_id LIMIT %s", (limit,))
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+async def drive(base_url, ids, concurrency, total):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def request(client, i):
+            return await client.get(f"/credentials/{ids[i % len(ids)]}")
+        await run_load(client, request, concurrency, min(total, 200))   # warm pools
+        return await run_load(client, request, concurrency, total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    ids = credential_ids()
+    if not ids:
+        raise SystemExit("No credentials rows to read; seed the database first")
+
+    results = {}
+    for name, app_path in (("sync", "benchmarks.async_vs_sync:sync_app"), ("async", "app.main:app")):
+        with serve(app_path) as (base_url, _):
+            results[name] = asyncio.run(drive(base_url, ids, args.concurrency, args.requests))
+    print(json.dumps({"concurrency": args.concurrency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure envelope-encryption throughput inline and on the crypto process pool.
+
+Encrypts and decrypts a batch of password-sized values under a few data keys,
+first in this process and then through CryptoPool with 1..N workers, and reports
+ops/s overall and per core. Needs no database or master key file.
+
+    python -m benchmarks.crypto --values 200000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.crypto import CryptoPool, _decrypt_chunk, _encrypt_chunk, column_aad
+
+
+def make_items(count, users=16, size=24):
+    keys = [AESGCM.generate_key(bit_length=256) for _ in range(users)]
+    return [
+        (keys[i % users], os.urandom(size // 2).hex(), column_aad("credentials", "password_encrypted", i % users))
+        for i in range(count)
+    ]
+
+
+def timed(fn, items):
+    started = time.perf_counter()
+    result = fn(items)
+    return result, time.perf_counter() - started
+
+
+def rates(count, seconds, cores):
+    ops = count / seconds
+    return {"seconds": round(seconds, 3), "ops_per_s": round(ops), "ops_per_s_per_core": round(ops / cores)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--values", type=int, default=200000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    items = make_items(args.values)
+    sealed, seconds = timed(_encrypt_chunk, items)
+    results = [{"mode": "inline", "encrypt": rates(args.values, seconds, 1)}]
+    opened = [(key, value, aad) for (key, _, aad), value in zip(items, sealed)]
+    _, seconds = timed(_decrypt_chunk, opened)
+    results[0]["decrypt"] = rates(args.values, seconds, 1)
+
+    for workers in sorted(set(args.workers)):
+        pool = CryptoPool(workers=workers, inline_max=0)
+        try:
+            pool.encrypt_many(items[:workers])      # start the workers outside the timing
+            _, encrypt_seconds = timed(pool.encrypt_many, items)
+            _, decrypt_seconds = timed(pool.decrypt_many, opened)
+        finally:
+            pool.shutdown()
+        results.append({
+            "mode": f"pool x{workers}",
+            "encrypt": rates(args.values, encrypt_seconds, workers),
+            "decrypt": rates(args.values, decrypt_seconds, workers),
+        })
+    print(json.dumps({"values": args.values, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Measure vault export throughput and server peak RSS for a growing number of rows.
+
+Seeds one throwaway user per size with that many credentials, streams
+GET /users/{id}/export in each format and reports rows/s, MB/s and the server's
+peak RSS. A flat RSS across sizes shows the export is not materialising the vault.
+
+    python -m benchmarks.export --sizes 1000 100000 1000000
+"""
+import argparse
+import json
+import time
+import uuid
+
+import httpx
+
+from app.db import get_connection
+from benchmarks.common import peak_rss_mb, serve
+
+
+def seed_user(rows, batch=5000):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO users (username, master_password_hash) VALUES (%s, %s)",
+            (f"bench-{uuid.uuid4().hex[:12]}", "x"),
+        )
+        user_id = cursor.lastrowid
+        for start in range(0, rows, batch):
+            cursor.executemany(
+                "INSERT INTO credentials (user_id, title, username, url, password_encrypted) VALUES (%s, %s, %s, %s, %s)",
+                [(user_id, f"site {i}", f"user{i}", f"https://site{i}.example.com/login", "x" * 64)
+                 for i in range(start, min(rows, start + batch))],
+            )
+            conn.commit()
+        return user_id
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def drop_user(user_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def measure(base_url, user_id, fmt):
+    started = time.perf_counter()
+    lines = size = 0
+    with httpx.stream("GET", f"{base_url}/users/{user_id}/export", params={"format": fmt}, timeout=None) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - started
+    rows = lines - 1 if fmt == "csv" else lines
+    return {"rows": rows, "seconds": round(elapsed, 3),
+            "rows_per_s": round(rows / elapsed), "mb_per_s": round(size / elapsed / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.sizes:
+        user_id = seed_user(rows)
+        try:
+            # A fresh server per size so the RSS high-water mark belongs to this run
+            with serve("app.main:app") as (base_url, proc):
+                result = {"vault_rows": rows}
+                for fmt in ("ndjson", "csv"):
+                    result[fmt] = measure(base_url, user_id, fmt)
+                result["server_peak_rss_mb"] = peak_rss_mb(proc.pid)
+            results.append(result)
+        finally:
+            drop_user(user_id)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Load-test every CRUD router at fixed concurrency levels and save the results as JSON.
+
+Seeds a database with --users users holding --items rows in each vault section,
+starts the API in a subprocess and drives, per resource and concurrency level,
+list, get, create, update and delete (the rows it created). Each run reports
+p50/p95/p99 latency, requests/s, database round trips per request (read from the
+server's /metrics) and the server's peak RSS so far.
+
+--backend sqlite (the default) needs nothing but this checkout: it serves the app
+through benchmarks.standin in a temporary directory, with its own master key.
+--backend mysql uses the database in DB_* (app/config.py) with the schema from
+migrations applied and MASTER_KEY_FILE set; seeded users are removed afterwards.
+
+    python -m benchmarks.load --concurrency 1 16 64 --requests 500 --output before.json
+    python -m benchmarks.load --concurrency 1 16 64 --requests 500 --compare before.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import tempfile
+import uuid
+
+import httpx
+
+from app.crypto import generate_key_file
+from benchmarks.common import peak_rss_mb, run_load, serve
+
+
+# Per resource: path prefix, primary key, and request bodies for create and update
+RESOURCES = {
+    "credentials": ("/credentials", "credential_id",
+                    lambda user_id, i: {"user_id": user_id, "title": f"bench {i}", "username": f"user{i}",
+                                        "url": f"https://site{i % 500}.example.com/login", "password_encrypted": f"pw-{i}"},
+                    lambda user_id, i: {"title": f"bench {i} (edited)", "username": f"user{i}",
+                                        "url": f"https://site{i % 500}.example.com/account", "notes": "edited"}),
+    "email_accounts": ("/email_accounts", "email_id",
+                       lambda user_id, i: {"user_id": user_id, "email_address": f"bench{i}@example.com",
+                                           "provider": "example", "password_encrypted": f"pw-{i}"},
+                       lambda user_id, i: {"provider": "example (edited)", "two_factor_enabled": True}),
+    "credit_cards": ("/credit_cards", "card_id",
+                     lambda user_id, i: {"user_id": user_id, "card_holder_name": f"Holder {i}", "card_number": "4111111111111111",
+                                         "cvv": "123", "expiration_date": "2030-01-01", "card_type": "Credit"},
+                     lambda user_id, i: {"user_id": user_id, "card_holder_name": f"Holder {i} (edited)",
+                                         "card_number": "4111111111111111", "cvv": "321", "expiration_date": "2031-01-01",
+                                         "card_type": "Debit"}),
+    "devices": ("/devices", "device_id",
+                lambda user_id, i: {"user_id": user_id, "device_type": "Laptop", "brand": "Example", "model": f"M{i}",
+                                    "serial_number": f"SN{i:08d}", "admin_password_encrypted": f"pw-{i}"},
+                lambda user_id, i: {"device_type": "Desktop", "brand": "Example", "model": f"M{i} (edited)",
+                                    "serial_number": f"SN{i:08d}", "notes": "edited"}),
+    "users": ("/users", "user_id",
+              lambda user_id, i: {"username": f"bench-{uuid.uuid4().hex[:12]}", "master_password_hash": f"pw-{i}",
+                                  "email": f"bench{i}@example.com"},
+              lambda user_id, i: {"username": f"bench-{uuid.uuid4().hex[:12]}", "master_password_hash": f"pw-{i}-2",
+                                  "email": f"bench{i}@example.com"}),
+}
+OPERATIONS = ("list", "get", "create", "update", "delete")
+
+# Seed rows per vault table: (table, columns, row(user_id, i))
+SEED = (
+    ("credentials", ("user_id", "title", "username", "url", "password_encrypted", "notes"),
+     lambda user_id, i: (user_id, f"site {i}", f"user{i}", f"https://site{i % 500}.example.com/login", "x" * 64, None)),
+    ("email_accounts", ("user_id", "email_address", "provider", "password_encrypted"),
+     lambda user_id, i: (user_id, f"user{user_id}.{i}@example.com", "example", "x" * 64)),
+    ("credit_cards", ("user_id", "card_holder_name", "card_number_encrypted", "expiration_date", "cvv_encrypted", "card_type"),
+     lambda user_id, i: (user_id, f"Holder {i}", "x" * 64, datetime.date(2030, 1 + i % 12, 1), "x" * 32, "Credit")),
+    ("devices", ("user_id", "device_type", "brand", "model", "serial_number", "admin_password_encrypted"),
+     lambda user_id, i: (user_id, "Laptop", "Example", f"M{i}", f"SN{user_id:06d}{i:06d}", "x" * 64)),
+)
+
+
+def seed(conn, placeholder, users, items, batch=5000):
+    """Insert users and their vault rows through a DB-API connection; returns the user ids"""
+    run = uuid.uuid4().hex[:8]
+    cursor = conn.cursor()
+    user_ids = []
+    try:
+        for i in range(users):
+            cursor.execute(
+                f"INSERT INTO users (username, master_password_hash, email) VALUES ({placeholder}, {placeholder}, {placeholder})",
+                (f"bench-{run}-{i}", "x", f"bench{i}@example.com"),
+            )
+            user_ids.append(cursor.lastrowid)
+        conn.commit()
+        for table, columns, make_row in SEED:
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+            rows = [make_row(user_id, i) for user_id in user_ids for i in range(items)]
+            for start in range(0, len(rows), batch):
+                cursor.executemany(sql, rows[start:start + batch])
+                conn.commit()
+    finally:
+        cursor.close()
+    return user_ids
+
+
+def seeded_ids(conn, user_ids):
+    """{resource: [ids]} of the seeded rows, for get requests"""
+    cursor = conn.cursor()
+    try:
+        ids = {"users": list(user_ids)}
+        for resource, (_, pk, _, _) in RESOURCES.items():
+            if resource == "users":
+                continue
+            cursor.execute(f"SELECT {pk} FROM {resource} WHERE user_id >= {min(user_ids)} AND user_id <= {max(user_ids)}")
+            ids[resource] = [row[0] for row in cursor.fetchall()]
+        return ids
+    finally:
+        cursor.close()
+
+
+def round_trips(metrics_text):
+    """Database round trips the server has made, from db_query_duration_seconds_count"""
+    return sum(float(line.rsplit(" ", 1)[1]) for line in metrics_text.splitlines()
+               if line.startswith("db_query_duration_seconds_count"))
+
+
+async def drive(client, resource, operation, concurrency, total, user_ids, ids, created, warmup):
+    path, pk, create_body, update_body = RESOURCES[resource]
+    # Spread requests over users and rows deterministically, so runs are comparable
+    def user(i):
+        return user_ids[(i * 7919) % len(user_ids)]
+
+    if operation == "list":
+        params = (lambda i: {}) if resource == "users" else (lambda i: {"user_id": user(i)})
+        async def request(client, i):
+            return await client.get(f"{path}/", params={"limit": 50, **params(i)})
+    elif operation == "get":
+        async def request(client, i):
+            return await client.get(f"{path}/{ids[(i * 7919) % len(ids)]}")
+    elif operation == "create":
+        async def request(client, i):
+            response = await client.post(f"{path}/", json=create_body(user(i), i))
+            if response.status_code == 201:
+                created.append((response.json()[pk], user(i)))
+            return response
+    elif operation == "update":
+        async def request(client, i):
+            item_id, owner = created[i % len(created)]
+            return await client.put(f"{path}/{item_id}", json=update_body(owner, i))
+    else:
+        async def request(client, i):
+            return await client.delete(f"{path}/{created[i][0]}")
+        total = min(total, len(created))
+
+    if warmup and operation in ("list", "get"):
+        await run_load(client, request, concurrency, warmup)
+    before = round_trips((await client.get("/metrics")).text)
+    result = await run_load(client, request, concurrency, total)
+    after = round_trips((await client.get("/metrics")).text)
+    # The /metrics scrape itself makes no queries
+    result["queries_per_request"] = round((after - before) / total, 2) if total else 0.0
+    return result
+
+
+async def run(base_url, proc, args, user_ids, ids):
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        for concurrency in args.concurrency:
+            for resource in args.resources:
+                created = []
+                for operation in OPERATIONS:
+                    if operation in ("update", "delete") and not created:
+                        continue
+                    result = await drive(client, resource, operation, concurrency, args.requests,
+                                         user_ids, ids[resource], created, args.warmup)
+                    result.update(resource=resource, operation=operation, concurrency=concurrency,
+                                  peak_rss_mb=peak_rss_mb(proc.pid))
+                    results.append(result)
+                    print(f"{resource:>14} {operation:<6} c={concurrency:<4} "
+                          f"p50={result['p50_ms']:>8.2f}ms p99={result['p99_ms']:>8.2f}ms "
+                          f"rps={result['rps']:>8.1f} q/req={result['queries_per_request']:>5.2f} "
+                          f"errors={result['errors']}", flush=True)
+    return results
+
+
+def run_sqlite(args):
+    from benchmarks.standin import create
+
+    with tempfile.TemporaryDirectory(prefix="vault-bench-") as directory:
+        path = os.path.join(directory, "vault.db")
+        key_file = os.path.join(directory, "master.key")
+        generate_key_file(key_file)
+        db = create(path)
+        try:
+            user_ids = seed(db, "?", args.users, args.items)
+            ids = seeded_ids(db, user_ids)
+        finally:
+            db.close()
+        env = dict(os.environ, STANDIN_DB=path, MASTER_KEY_FILE=key_file)
+        with serve("benchmarks.standin:app", env=env) as (base_url, proc):
+            return asyncio.run(run(base_url, proc, args, user_ids, ids))
+
+
+def run_mysql(args):
+    from app.db import get_connection
+
+    conn = get_connection()
+    try:
+        user_ids = seed(conn, "%s", args.users, args.items)
+        ids = seeded_ids(conn, user_ids)
+    finally:
+        conn.close()
+    try:
+        with serve("app.main:app") as (base_url, proc):
+            return asyncio.run(run(base_url, proc, args, user_ids, ids))
+    finally:
+        if not args.keep:
+            conn = get_connection()
+            cursor = conn.cursor()
+            try:
+                # ON DELETE CASCADE removes their vault rows
+                cursor.execute(f"DELETE FROM users WHERE user_id BETWEEN {min(user_ids)} AND {max(user_ids)}")
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
+
+
+def compare(results, baseline):
+    """Print p50/p99/rps changes against a previous run's JSON"""
+    previous = {(r["resource"], r["operation"], r["concurrency"]): r for r in baseline["results"]}
+    print("\nchange vs baseline (negative latency / positive rps is better)")
+    for result in results:
+        before = previous.get((result["resource"], result["operation"], result["concurrency"]))
+        if before is None:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p99_ms", "rps"):
+            if before[key]:
+                deltas.append(f"{key}={100 * (result[key] - before[key]) / before[key]:+6.1f}%")
+        print(f"{result['resource']:>14} {result['operation']:<6} c={result['concurrency']:<4} {' '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--items", type=int, default=50, help="rows per user in each vault section")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="requests per operation and concurrency level")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests before each read run")
+    parser.add_argument("--resources", nargs="+", choices=list(RESOURCES), default=list(RESOURCES))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--keep", action="store_true", help="mysql: keep the seeded users")
+    args = parser.parse_args()
+
+    results = run_sqlite(args) if args.backend == "sqlite" else run_mysql(args)
+    report = {
+        "backend": args.backend,
+        "users": args.users,
+        "items_per_section": args.items,
+        "requests": args.requests,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(results, json.load(previous))
+
+
+if __name__ == "__main__":
+    main()
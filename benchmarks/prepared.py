@@ -0,0 +1,115 @@
+"""Compare MySQL-side cost of text statements and cached prepared statements.
+
+Runs the device item SELECT and the credential INSERT (rolled back) through one
+pooled connection, with the statement cache off and on, and reads the server's
+own accounting for that session from performance_schema: statement time and,
+on MySQL 8.0.28+, CPU time. Requires a local MySQL loaded with database.sql and at
+least one user and device row (see DB_* in app/config.py); performance_schema must
+be enabled, which it is by default.
+
+    python -m benchmarks.prepared --iterations 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.db_async import AsyncConnectionPool, _connect
+from app.routers.credentials import CREDENTIALS
+from app.routers.devices import DEVICES
+
+
+# Totals for the current session; timers are in picoseconds
+SESSION_COST = """
+    SELECT COALESCE(SUM(COUNT_STAR), 0), COALESCE(SUM(SUM_TIMER_WAIT), 0), COALESCE(SUM(SUM_CPU_TIME), 0)
+    FROM performance_schema.events_statements_summary_by_thread_by_event_name
+    WHERE THREAD_ID = PS_CURRENT_THREAD_ID()
+"""
+SESSION_COST_NO_CPU = SESSION_COST.replace("COALESCE(SUM(SUM_CPU_TIME), 0)", "0")
+
+
+async def session_cost(conn, sql):
+    cursor = await conn.cursor()
+    try:
+        # Read through the raw cursor so the probe itself is never prepared
+        await cursor._raw.execute(sql)
+        return await cursor._raw.fetchone()
+    finally:
+        await cursor.close()
+
+
+async def run(prepared, iterations, user_id, device_id):
+    pool = AsyncConnectionPool(_connect, pool_size=1, max_overflow=0, prepared_statements=64 if prepared else 0)
+    conn = await pool.acquire()
+    try:
+        try:
+            probe = SESSION_COST
+            before = await session_cost(conn, probe)
+        except Exception:
+            probe = SESSION_COST_NO_CPU         # before 8.0.28: no SUM_CPU_TIME column
+            before = await session_cost(conn, probe)
+
+        insert = CREDENTIALS.sql("insert", ("user_id", "title", "username", "url", "notes", "password_encrypted"))
+        started = time.perf_counter()
+        cursor = await conn.cursor()
+        try:
+            for i in range(iterations):
+                await cursor.execute(DEVICES._select_one, (device_id,))
+                await cursor.fetchall()
+                await cursor.execute(insert, (user_id, f"bench {i}", "user", "https://example.com", None, "x"))
+                if i % 100 == 99:
+                    await conn.rollback()
+            await conn.rollback()
+        finally:
+            await cursor.close()
+        elapsed = time.perf_counter() - started
+
+        after = await session_cost(conn, probe)
+    finally:
+        await conn.close()
+        stats = pool.stats()["prepared_statements"]
+        await pool.dispose()
+
+    statements, timer, cpu = (after[i] - before[i] for i in range(3))
+    return {
+        "client_seconds": round(elapsed, 3),
+        "server_statements": int(statements),
+        "server_statement_seconds": round(timer / 1e12, 3),
+        "server_cpu_seconds": round(cpu / 1e12, 3) if probe is SESSION_COST else None,
+        "per_call_us": round(timer / 1e6 / (2 * iterations), 2),
+        "cache": stats,
+    }
+
+
+async def first_ids():
+    conn = await _connect()
+    try:
+        cursor = await conn.cursor()
+        await cursor.execute("SELECT user_id, device_id FROM devices ORDER BY device_id LIMIT 1")
+        row = await cursor.fetchone()
+        await cursor.close()
+        return row
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    ids = asyncio.run(first_ids())
+    if ids is None:
+        raise SystemExit("No devices rows to read; seed the database first")
+    results = {
+        name: asyncio.run(run(prepared, args.iterations, *ids))
+        for name, prepared in (("text", False), ("prepared", True))
+    }
+    text, prepared = results["text"], results["prepared"]
+    if text["server_statement_seconds"]:
+        results["server_time_saved"] = round(1 - prepared["server_statement_seconds"] / text["server_statement_seconds"], 3)
+    print(json.dumps({"iterations": args.iterations, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure vault search latency and index build time on a synthetic vault.
+
+Fills a VaultIndex in this process with generated credentials, email accounts,
+cards and devices, then runs a mix of exact, misspelled and partial queries and
+reports p50/p95/p99 per query. Needs no database.
+
+    python -m benchmarks.search --items 50000 --queries 2000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.search import VaultIndex
+from benchmarks.common import percentile
+
+SITES = ["github", "gitlab", "google", "amazon", "netflix", "spotify", "dropbox", "slack",
+         "atlassian", "digitalocean", "cloudflare", "paypal", "stripe", "linkedin", "twitter"]
+BRANDS = ["Ubiquiti", "Synology", "Netgear", "Cisco", "MikroTik", "TP-Link", "Asus"]
+
+
+def word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def fill(index, count, rng):
+    for item_id in range(count):
+        kind = item_id % 10
+        site = f"{rng.choice(SITES)}{word(rng, 4)}"
+        if kind < 7:
+            index.upsert("credentials", item_id, {
+                "title": f"{site.title()} account", "username": f"{word(rng, 6)}@{word(rng, 5)}.com",
+                "url": f"https://www.{site}.com/login", "notes": " ".join(word(rng, 6) for _ in range(4)),
+            })
+        elif kind < 8:
+            index.upsert("email_accounts", item_id, {"email_address": f"{word(rng, 7)}@{site}.com", "provider": site})
+        elif kind < 9:
+            index.upsert("credit_cards", item_id, {"card_holder_name": f"{word(rng, 5).title()} {word(rng, 8).title()}"})
+        else:
+            index.upsert("devices", item_id, {"brand": rng.choice(BRANDS), "model": word(rng, 5).upper(),
+                                              "serial_number": word(rng, 12).upper()})
+
+
+def typo(rng, text):
+    position = rng.randrange(len(text))
+    return text[:position] + text[position + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = VaultIndex()
+    started = time.perf_counter()
+    fill(index, args.items, rng)
+    build_seconds = time.perf_counter() - started
+
+    makers = {
+        "exact": lambda: rng.choice(SITES),
+        "typo": lambda: typo(rng, rng.choice(SITES)),
+        "prefix": lambda: rng.choice(SITES)[:4],
+        "two_words": lambda: f"{rng.choice(SITES)} account",
+    }
+    results = {}
+    for name, make_query in makers.items():
+        latencies = []
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            index.search(query, args.limit)
+            latencies.append(time.perf_counter() - started)
+        results[name] = {f"p{pct}_ms": round(percentile(latencies, pct) * 1000, 3) for pct in (50, 95, 99)}
+    print(json.dumps({"items": args.items, "build_seconds": round(build_seconds, 3), "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare rows/s of the model-based list response path with RowSerializer.
+
+The "models" path is what list endpoints did before: one pydantic model per row,
+a page model, FastAPI's second validation against response_model, then
+jsonable_encoder and json.dumps as JSONResponse renders it. The "rows" path is
+RowSerializer.page. Rows are synthetic credential tuples; needs no database.
+
+    python -m benchmarks.serialize --rows 100000 --repeat 3
+"""
+import argparse
+import datetime
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models.credentials import CredentialPage, CredentialResponse
+from app.serialize import RowSerializer, orjson
+from app.vault import VAULT_SECTIONS
+
+
+def make_rows(count):
+    created = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        (i, 1, f"Account {i}", f"user{i}@example.com", f"https://site{i % 500}.example.com/login",
+         "notes " * (i % 4), created + datetime.timedelta(seconds=i))
+        for i in range(1, count + 1)
+    ]
+
+
+def models_path(rows):
+    page = CredentialPage(
+        items=[
+            CredentialResponse(
+                credential_id=row[0], user_id=row[1], title=row[2], username=row[3],
+                url=row[4], notes=row[5], created_at=row[6],
+            ) for row in rows
+        ],
+        next_page_token=None,
+    )
+    # FastAPI validates the returned value against response_model, then encodes it
+    adapter = TypeAdapter(CredentialPage)
+    content = adapter.dump_python(adapter.validate_python(page, from_attributes=True), mode="json")
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def rows_path(serializer, rows):
+    return serializer.page(rows, None)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    serializer = RowSerializer(CredentialResponse, VAULT_SECTIONS["credentials"][2])
+    models_seconds, models_body = best_of(lambda: models_path(rows), args.repeat)
+    rows_seconds, rows_body = best_of(lambda: rows_path(serializer, rows), args.repeat)
+    if json.loads(models_body) != json.loads(rows_body):
+        raise SystemExit("RowSerializer output differs from the model path")
+
+    print(json.dumps({
+        "rows": args.rows,
+        "encoder": "orjson" if orjson is not None else "json",
+        "models": {"seconds": round(models_seconds, 3), "rows_per_s": round(args.rows / models_seconds)},
+        "rows_serializer": {"seconds": round(rows_seconds, 3), "rows_per_s": round(args.rows / rows_seconds)},
+        "speedup": round(models_seconds / rows_seconds, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
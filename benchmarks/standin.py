@@ -0,0 +1,694 @@
+"""SQLite stand-in for the MySQL server, for benchmarks on a box without one.
+
+Serves app.main with `get_connection` backed by one sqlite3 database file:
+
+    STANDIN_DB=/tmp/vault.db python -m uvicorn benchmarks.standin:app
+
+The file must hold SCHEMA (see create()). Connections are aiomysql look-alikes
+that translate the handful of MySQL-isms on the request path (LAST_INSERT_ID(),
+NOW(6) - INTERVAL n SECOND, <=>, INSERT IGNORE, multi-statement batches) and
+map constraint failures to the aiomysql errors the routers expect.
+
+Every connection shares one sqlite3 handle. That is safe here because statements
+run synchronously and a write and its COMMIT are never separated by a real
+suspension on the request path; it also means the stand-in measures the
+application's own overhead (routing, validation, serialization, query count), not
+database concurrency. Use a local MySQL for numbers that include the server.
+
+Each connection keeps its own SQL-level prepared statements (PREPARE, EXECUTE ..
+USING, DEALLOCATE PREPARE) and user variables, so DB_PREPARED_STATEMENTS works
+as configured. Cursors opened with aiomysql.SSCursor behave like aiomysql's
+unbuffered ones: only the first result of a multi-statement round trip can be
+fetched from them, since aiomysql reads every later result into memory where
+SSCursor's fetch methods do not look, and any other command on the connection
+discards the rows they have not fetched yet.
+
+Read replicas are simulated too: with DB_REPLICAS set, each replica host gets an
+in-memory copy of the file that is refreshed from its committed state once it is
+STANDIN_REPLICA_DELAY seconds old (default 2), so reads from it lag behind writes
+by up to that long. Replica connections refuse writes as a super-read-only MySQL
+replica does, and SHOW REPLICA STATUS reports Seconds_Behind_Source as the age of
+the copy; on the primary it returns no row. Raise REPLICA_DELAY above
+DB_REPLICA_MAX_LAG_SECONDS to watch reads fall back to the primary.
+
+Maintenance jobs written against app.db's mysql.connector connections (the key
+rotation job) can run on the same file through connect_sync(), which opens a
+session with its own sqlite3 handle and transaction, as a second client would.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import time
+
+import aiomysql
+import mysql.connector
+
+from app.db_async import ER_NO_REFERENCED_ROW
+
+ER_DUP_ENTRY = 1062
+ER_UNKNOWN = 1105
+ER_OPTION_PREVENTS_STATEMENT = 1290
+
+# Seconds a simulated replica serves its copy before catching up with the primary
+REPLICA_DELAY = float(os.getenv("STANDIN_REPLICA_DELAY", "2"))
+
+SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    master_password_hash TEXT NOT NULL,
+    email TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE credentials (
+    credential_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    title TEXT, username TEXT, password_encrypted TEXT, url TEXT, notes TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    key_version INTEGER NOT NULL DEFAULT 0,
+    url_host TEXT, url_domain TEXT
+);
+CREATE TABLE email_accounts (
+    email_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    email_address TEXT NOT NULL, provider TEXT, password_encrypted TEXT, recovery_email TEXT,
+    two_factor_enabled BOOLEAN DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    key_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE credit_cards (
+    card_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    card_holder_name TEXT, card_number_encrypted TEXT, expiration_date DATE, cvv_encrypted TEXT,
+    billing_address TEXT, card_type TEXT DEFAULT 'Credit',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    key_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE devices (
+    device_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    device_type TEXT DEFAULT 'Laptop', brand TEXT, model TEXT, serial_number TEXT,
+    operating_system TEXT, admin_password_encrypted TEXT, purchase_date DATE, notes TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    key_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_credentials_user_credential ON credentials (user_id, credential_id);
+CREATE INDEX idx_email_accounts_user_email ON email_accounts (user_id, email_id);
+CREATE INDEX idx_credit_cards_user_card ON credit_cards (user_id, card_id);
+CREATE INDEX idx_devices_user_device ON devices (user_id, device_id);
+CREATE INDEX idx_credentials_user_domain ON credentials (user_id, url_domain);
+
+CREATE TABLE vault_changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    item_type TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    operation TEXT NOT NULL,
+    changed_at DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+);
+CREATE INDEX idx_vault_changes_user_change ON vault_changes (user_id, change_id);
+
+CREATE TABLE user_keys (
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    key_version INTEGER NOT NULL DEFAULT 1,
+    wrapped_key BLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, key_version)
+);
+CREATE TABLE key_rotation_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target_version INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    max_rows_per_second REAL NOT NULL,
+    active_seconds REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+CREATE TABLE key_rotation_checkpoints (
+    job_id INTEGER NOT NULL REFERENCES key_rotation_jobs(job_id) ON DELETE CASCADE,
+    table_name TEXT NOT NULL,
+    last_pk INTEGER NOT NULL DEFAULT 0,
+    rows_total INTEGER NOT NULL DEFAULT 0,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    done BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (job_id, table_name)
+);
+"""
+
+# The change-log triggers of migrations/0003_change_tracking.up.sql, without the
+# @vault_changes_skip guard: SQLite triggers cannot see session variables, so
+# maintenance run through connect_sync() is logged like any other write
+_LOGGED = (("credentials", "credential_id"), ("email_accounts", "email_id"),
+           ("credit_cards", "card_id"), ("devices", "device_id"))
+for _table, _pk in _LOGGED:
+    for _event, _row, _operation in (("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete")):
+        SCHEMA += (
+            f"CREATE TRIGGER {_table}_log_{_event.lower()} AFTER {_event} ON {_table} BEGIN "
+            f"INSERT INTO vault_changes (user_id, item_type, item_id, operation) "
+            f"VALUES ({_row}.user_id, '{_table}', {_row}.{_pk}, '{_operation}'); END;\n"
+        )
+# Cards can move between users on update: log a delete for the old owner too
+SCHEMA += (
+    "CREATE TRIGGER credit_cards_log_move AFTER UPDATE ON credit_cards WHEN OLD.user_id <> NEW.user_id BEGIN "
+    "INSERT INTO vault_changes (user_id, item_type, item_id, operation) "
+    "VALUES (OLD.user_id, 'credit_cards', OLD.card_id, 'delete'); END;\n"
+)
+
+_TRANSLATIONS = (
+    (re.compile(r"LAST_INSERT_ID\(\)", re.I), "last_insert_rowid()"),
+    (re.compile(r"NOW\(6\)\s*-\s*INTERVAL\s+(\S+)\s+SECOND", re.I),
+     r"strftime('%Y-%m-%d %H:%M:%f', 'now', '-' || (\1) || ' seconds')"),
+    (re.compile(r"<=>"), "IS"),
+    (re.compile(r"^\s*INSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+)
+_IGNORE = _TRANSLATIONS[-1][0]
+_IGNORE_VALUES = re.compile(r"^\s*INSERT OR IGNORE INTO (\w+)\s*\(([^)]*)\)\s*VALUES\s*(.*)$", re.I | re.S)
+_PLACEHOLDER = re.compile(r"%(s|%)")
+_WRITE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+_REPLICA_STATUS = re.compile(r"^\s*SHOW\s+(REPLICA|SLAVE)\s+STATUS\s*$", re.I)
+_PREPARE = re.compile(r"^\s*PREPARE\s+(\w+)\s+FROM\s+'(.*)'\s*$", re.I | re.S)
+_EXECUTE = re.compile(r"^\s*EXECUTE\s+(\w+)(?:\s+USING\s+(.+?))?\s*$", re.I | re.S)
+_DEALLOCATE = re.compile(r"^\s*DEALLOCATE\s+PREPARE\s+(\w+)\s*$", re.I)
+_SET_VARIABLES = re.compile(r"^\s*SET\s+(@\w+\s*=.*)$", re.I | re.S)
+_SERVER_VARIABLE = re.compile(r"^\s*SELECT\s+@@(\w+)\s*$", re.I)
+
+# Server variables the application reads, at their MySQL defaults
+SERVER_VARIABLES = {"max_prepared_stmt_count": 16382}
+_OK = (0, [], None, None)
+
+
+def _adapt_datetime(value):
+    return value.isoformat(" ")
+
+
+def _convert_datetime(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+def _convert_date(value):
+    return datetime.date.fromisoformat(value.decode()[:10])
+
+
+sqlite3.register_adapter(datetime.datetime, _adapt_datetime)
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", _convert_datetime)
+sqlite3.register_converter("DATE", _convert_date)
+
+
+def create(path):
+    """Create a database file holding SCHEMA and return an open sqlite3 connection to it"""
+    db = open_db(path)
+    db.executescript(SCHEMA)
+    db.commit()
+    return db
+
+
+def _field(value, *options):
+    return options.index(value) + 1 if value in options else 0
+
+
+# MySQL functions the maintenance jobs call. Named locks always succeed: they only
+# keep two runs of a job apart, and the stand-in serves one process.
+_FUNCTIONS = (
+    ("GREATEST", -1, lambda *values: None if None in values else max(values)),
+    ("FIELD", -1, _field),
+    ("GET_LOCK", 2, lambda name, timeout: 1),
+    ("RELEASE_LOCK", 1, lambda name: 1),
+)
+
+
+def open_db(path):
+    db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    for name, arity, function in _FUNCTIONS:
+        db.create_function(name, arity, function, deterministic=name in ("GREATEST", "FIELD"))
+    db.execute("PRAGMA foreign_keys = ON")
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    return db
+
+
+def _literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat(" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _split(sql, separator=";"):
+    """Statements of a multi-statement string; quotes are '...' with '' escapes, as _literal writes them"""
+    statements, start, quoted = [], 0, False
+    for i, char in enumerate(sql):
+        if char == "'":
+            quoted = not quoted
+        elif char == separator and not quoted:
+            statements.append(sql[start:i])
+            start = i + 1
+    statements.append(sql[start:])
+    return [statement for statement in statements if statement.strip()]
+
+
+_translated = {}
+
+
+def _translate(sql, parameterised):
+    key = (sql, parameterised)
+    result = _translated.get(key)
+    if result is None:
+        result = sql
+        if parameterised:
+            result = _PLACEHOLDER.sub(lambda match: "?" if match.group(1) == "s" else "%", result)
+        for pattern, replacement in _TRANSLATIONS:
+            result = pattern.sub(replacement, result)
+        _translated[key] = result
+    return result
+
+
+_foreign_keys = {}
+
+
+def _without_orphans(db, statement):
+    """Make a translated INSERT IGNORE skip rows whose foreign keys match nothing, as MySQL's does.
+
+    SQLite's OR IGNORE only skips uniqueness conflicts, so the VALUES rows are
+    filtered on their references instead. Applies to every statement execute()
+    runs, including each one of a multi-statement batch.
+    """
+    match = _IGNORE_VALUES.match(statement)
+    if match is None:
+        return statement
+    table, columns, rows = match.groups()
+    columns = [column.strip() for column in columns.split(",")]
+    references = _foreign_keys.get(table)
+    if references is None:
+        references = _foreign_keys[table] = [
+            (column, parent, parent_column)
+            for _, _, parent, column, parent_column, *_ in db.execute(f"PRAGMA foreign_key_list({table})")
+        ]
+    checks = []
+    for column, parent, parent_column in references:
+        if column in columns:
+            value = f"column{columns.index(column) + 1}"
+            checks.append(f"({value} IS NULL OR EXISTS (SELECT 1 FROM {parent} WHERE {parent_column} = {value}))")
+    if not checks:
+        return statement
+    return (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+            f"SELECT * FROM (VALUES {rows}) WHERE {' AND '.join(checks)}")
+
+
+def _database_error(err):
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        code = ER_NO_REFERENCED_ROW if "FOREIGN KEY" in message else ER_DUP_ENTRY
+        return aiomysql.IntegrityError(code, message)
+    return aiomysql.OperationalError(ER_UNKNOWN, message)
+
+
+def _connector_error(err):
+    """_database_error for mysql.connector clients"""
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        code = ER_NO_REFERENCED_ROW if "FOREIGN KEY" in message else ER_DUP_ENTRY
+        return mysql.connector.IntegrityError(msg=message, errno=code)
+    return mysql.connector.DatabaseError(msg=message, errno=ER_UNKNOWN)
+
+
+def _read_only():
+    return aiomysql.OperationalError(
+        ER_OPTION_PREVENTS_STATEMENT,
+        "The MySQL server is running with the --super-read-only option so it cannot execute this statement",
+    )
+
+
+class StandinCursor:
+    # Each result is (rowcount, rows, lastrowid, description)
+    def __init__(self, connection, as_dict=False, unbuffered=False):
+        self.connection = connection
+        self._as_dict = as_dict
+        self._unbuffered = unbuffered
+        self._results = [(0, [], None, None)]
+        self._index = 0
+        self.lastrowid = None
+        self.arraysize = 1
+
+    @property
+    def rowcount(self):
+        return self._results[self._index][0]
+
+    @property
+    def description(self):
+        return self._results[self._index][3]
+
+    def mogrify(self, query, args=None):
+        if args is None:
+            return query
+        return query % tuple(_literal(arg) for arg in args)
+
+    def _run(self, statement, params=None):
+        """Run one statement; `params` are bound to its %s placeholders, None for literal SQL"""
+        match = _EXECUTE.match(statement)
+        if match is not None:
+            statement, params = self.connection.prepared_call(*match.groups())
+        else:
+            result = self.connection.session_command(statement)
+            if result is not None:
+                return result
+            statement = _translate(statement, params is not None)
+        params = params or ()
+        db = self.connection.db
+        keyword = statement.lstrip()[:8].upper()
+        if keyword.startswith("COMMIT"):
+            self.connection.commit_now()
+            return (0, [], None, None)
+        if keyword.startswith("ROLLBACK"):
+            self.connection.rollback_now()
+            return (0, [], None, None)
+        if _REPLICA_STATUS.match(statement):
+            return self.connection.replica_status()
+        if _WRITE.match(statement):
+            if self.connection.replica is not None:
+                raise _read_only()
+            self.connection.dirty = True
+        cursor = db.execute(_without_orphans(db, statement), params)
+        if cursor.description is None:
+            return (cursor.rowcount, [], cursor.lastrowid, None)
+        rows = cursor.fetchall()
+        if self._as_dict:
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, row)) for row in rows]
+        else:
+            rows = [tuple(row) for row in rows]
+        return (len(rows), rows, None, cursor.description)
+
+    def discard_unread(self):
+        rowcount, _, lastrowid, description = self._results[self._index]
+        self._results[self._index] = (rowcount, [], lastrowid, description)
+
+    def execute_now(self, query, args=None):
+        """execute() without the await; raises sqlite3 errors"""
+        self.connection.finish_unbuffered()
+        self.connection.catch_up()
+        if args is not None:
+            results = [self._run(query, tuple(args))]
+        else:
+            results = [self._run(statement) for statement in _split(query)]
+        self._results = results or [(0, [], None, None)]
+        self._index = 0
+        self.lastrowid = self._results[0][2]
+        if self._unbuffered:
+            self.connection.streaming = self
+        return self.rowcount
+
+    def executemany_now(self, query, args):
+        """executemany() without the await; raises sqlite3 errors"""
+        self.connection.finish_unbuffered()
+        sql = _translate(query, True)
+        if _WRITE.match(sql):
+            if self.connection.replica is not None:
+                raise _read_only()
+            self.connection.dirty = True
+        db = self.connection.db
+        if _IGNORE.match(query):
+            # MySQL's IGNORE also skips rows failing a foreign key; SQLite's does not
+            rowcount = lastrowid = 0
+            for row in args:
+                try:
+                    cursor = db.execute(sql, tuple(row))
+                except sqlite3.IntegrityError:
+                    continue
+                rowcount += cursor.rowcount
+                lastrowid = cursor.lastrowid
+        else:
+            cursor = db.executemany(sql, [tuple(row) for row in args])
+            rowcount, lastrowid = cursor.rowcount, cursor.lastrowid
+        self._results = [(rowcount, [], lastrowid, None)]
+        self._index = 0
+        self.lastrowid = lastrowid
+        return rowcount
+
+    def fetch_now(self, count=None):
+        """Take the next `count` unread rows of the current result, all of them for None"""
+        rows = self._results[self._index][1]
+        batch = rows[:] if count is None else rows[:count]
+        del rows[:len(batch)]
+        return batch
+
+    async def execute(self, query, args=None):
+        try:
+            return self.execute_now(query, args)
+        except sqlite3.Error as err:
+            raise _database_error(err)
+
+    async def executemany(self, query, args):
+        try:
+            return self.executemany_now(query, args)
+        except sqlite3.Error as err:
+            raise _database_error(err)
+
+    async def nextset(self):
+        if self._index + 1 >= len(self._results):
+            return None
+        self._index += 1
+        self.lastrowid = self._results[self._index][2] or self.lastrowid
+        if self._unbuffered:
+            # aiomysql reads this result into memory; an SSCursor only fetches unread rows off the wire
+            self.discard_unread()
+            self.connection.streaming = None
+        return True
+
+    async def fetchone(self):
+        batch = self.fetch_now(1)
+        return batch[0] if batch else None
+
+    async def fetchmany(self, size=None):
+        return self.fetch_now(self.arraysize if size is None else size)
+
+    async def fetchall(self):
+        return self.fetch_now()
+
+    async def close(self):
+        if self.connection.streaming is self:
+            self.connection.finish_unbuffered()
+
+
+class StandinReplica:
+    """A simulated replica: an in-memory copy of the primary's committed state, refreshed every REPLICA_DELAY seconds"""
+
+    def __init__(self, path):
+        # A handle of its own, so a copy never includes another connection's uncommitted writes
+        self._source = sqlite3.connect(path, check_same_thread=False)
+        self.db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self.applied_at = 0.0       # when the copy was taken: it holds every write committed before then
+        self.catch_up()
+
+    def catch_up(self):
+        now = time.time()
+        if now - self.applied_at >= REPLICA_DELAY:
+            self._source.backup(self.db)
+            self.applied_at = now
+
+
+class StandinConnection:
+    """aiomysql.Connection look-alike over the shared sqlite3 handle, or a simulated replica's copy"""
+
+    def __init__(self, db, replica=None):
+        self.db = db
+        self.replica = replica
+        self.dirty = False      # this connection has uncommitted writes
+        self.closed = False
+        self.prepared = {}      # name -> translated SQL of the session's prepared statements
+        self.variables = {}     # the session's user variables, without the @
+        self.streaming = None   # the unbuffered cursor whose result is still being read
+
+    def catch_up(self):
+        if self.replica is not None:
+            self.replica.catch_up()
+
+    def replica_status(self):
+        if self.replica is None:
+            return (0, [], None, None)
+        columns = ("Replica_IO_Running", "Replica_SQL_Running", "Seconds_Behind_Source")
+        row = ("Yes", "Yes", int(time.time() - self.replica.applied_at))
+        return (1, [row], None, tuple((name,) + (None,) * 6 for name in columns))
+
+    def finish_unbuffered(self):
+        """What aiomysql does before sending a command: read the rest of an open unbuffered result and drop it"""
+        if self.streaming is not None:
+            self.streaming.discard_unread()
+            self.streaming = None
+
+    def session_command(self, statement):
+        """Result of a statement SQLite has no counterpart for, None for any other statement"""
+        match = _PREPARE.match(statement)
+        if match is not None:
+            name, text = match.groups()
+            # The placeholders are already ?, as the server expects them
+            self.prepared[name] = _translate(text.replace("''", "'"), False)
+            return _OK
+        match = _DEALLOCATE.match(statement)
+        if match is not None:
+            self.prepared.pop(match.group(1), None)
+            return _OK
+        match = _SET_VARIABLES.match(statement)
+        if match is not None:
+            assignments = [part.split("=", 1) for part in _split(match.group(1), ",")]
+            values = self.db.execute("SELECT " + ", ".join(value for _, value in assignments)).fetchone()
+            for (name, _), value in zip(assignments, values):
+                self.variables[name.strip().lstrip("@")] = value
+            return _OK
+        match = _SERVER_VARIABLE.match(statement)
+        if match is not None:
+            name = match.group(1).lower()
+            return (1, [(SERVER_VARIABLES[name],)], None, ((f"@@{name}",) + (None,) * 6,))
+        return None
+
+    def prepared_call(self, name, using):
+        """(SQL, parameters) for EXECUTE name [USING @a, @b, ...]"""
+        statement = self.prepared.get(name)
+        if statement is None:
+            raise sqlite3.OperationalError(f"Unknown prepared statement handler ({name}) given to EXECUTE")
+        names = [variable.strip().lstrip("@") for variable in using.split(",")] if using else []
+        return statement, tuple(self.variables.get(variable) for variable in names)
+
+    async def cursor(self, *cursor_class):
+        as_dict = bool(cursor_class) and issubclass(cursor_class[0], aiomysql.DictCursor)
+        unbuffered = bool(cursor_class) and issubclass(cursor_class[0], aiomysql.SSCursor)
+        return StandinCursor(self, as_dict, unbuffered)
+
+    def commit_now(self):
+        self.finish_unbuffered()
+        self.db.commit()
+        self.dirty = False
+
+    def rollback_now(self):
+        self.finish_unbuffered()
+        if self.dirty:
+            self.db.rollback()
+        self.dirty = False
+
+    async def commit(self):
+        self.commit_now()
+
+    async def rollback(self):
+        self.rollback_now()
+
+    def get_transaction_status(self):
+        return self.dirty
+
+    def escape(self, value):
+        return _literal(value)
+
+    async def ping(self, reconnect=True):
+        pass
+
+    async def ensure_closed(self):
+        self.close()
+
+    def close(self):
+        self.rollback_now()
+        self.closed = True
+
+
+class StandinSyncCursor:
+    """mysql.connector cursor look-alike over a StandinCursor; every cursor is buffered"""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = StandinCursor(connection, as_dict=dictionary)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=None):
+        try:
+            self._cursor.execute_now(query, params)
+        except sqlite3.Error as err:
+            raise _connector_error(err)
+
+    def executemany(self, query, seq_params):
+        try:
+            self._cursor.executemany_now(query, seq_params)
+        except sqlite3.Error as err:
+            raise _connector_error(err)
+
+    def fetchone(self):
+        batch = self._cursor.fetch_now(1)
+        return batch[0] if batch else None
+
+    def fetchall(self):
+        return self._cursor.fetch_now()
+
+    def close(self):
+        pass
+
+
+class StandinSyncConnection(StandinConnection):
+    """mysql.connector connection look-alike for the maintenance jobs, on a sqlite3 handle of its own"""
+
+    def cursor(self, buffered=None, dictionary=False):
+        return StandinSyncCursor(self, dictionary)
+
+    def commit(self):
+        self.commit_now()
+
+    def rollback(self):
+        self.rollback_now()
+
+    def close(self):
+        super().close()
+        self.db.close()
+
+
+def connect_sync():
+    """What app.db._connect returns, for jobs run against STANDIN_DB"""
+    return StandinSyncConnection(open_db(os.environ["STANDIN_DB"]))
+
+
+_db = None
+_replicas = {}      # (host, port) -> StandinReplica
+
+
+async def connect(host=None, port=None):
+    global _db
+    from app import config
+
+    if (host or config.DB_HOST, port or config.DB_PORT) != (config.DB_HOST, config.DB_PORT):
+        replica = _replicas.get((host, port))
+        if replica is None:
+            replica = _replicas[(host, port)] = StandinReplica(os.environ["STANDIN_DB"])
+        return StandinConnection(replica.db, replica)
+    if _db is None:
+        _db = open_db(os.environ["STANDIN_DB"])
+    return StandinConnection(_db)
+
+
+def _install():
+    from app import db_async
+
+    db_async._connect = connect
+    from app.main import app
+    return app
+
+
+app = _install()
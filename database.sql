@@ -1,3 +1,6 @@
+-- Baseline schema. Later changes (indexes, new columns) are versioned in migrations/;
+-- after loading this file run: python -m app.migrate upgrade
+
 -- Create the database
 CREATE DATABASE IF NOT EXISTS credentials_vault;
 USE credentials_vault;
@@ -0,0 +1,5 @@
+DROP TABLE IF EXISTS devices;
+DROP TABLE IF EXISTS credit_cards;
+DROP TABLE IF EXISTS email_accounts;
+DROP TABLE IF EXISTS credentials;
+DROP TABLE IF EXISTS users;
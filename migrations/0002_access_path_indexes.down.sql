@@ -0,0 +1,8 @@
+DROP INDEX idx_devices_serial_number ON devices;
+DROP INDEX idx_email_accounts_address ON email_accounts;
+DROP INDEX idx_credentials_user_url ON credentials;
+-- Give the user_id foreign keys back an index of their own before dropping the ones serving them
+ALTER TABLE devices ADD INDEX user_id (user_id), DROP INDEX idx_devices_user_device;
+ALTER TABLE credit_cards ADD INDEX user_id (user_id), DROP INDEX idx_credit_cards_user_card;
+ALTER TABLE email_accounts ADD INDEX user_id (user_id), DROP INDEX idx_email_accounts_user_email;
+ALTER TABLE credentials ADD INDEX user_id (user_id), DROP INDEX idx_credentials_user_credential;
@@ -0,0 +1,12 @@
+-- Per-user listings: keyset pages (WHERE user_id = ? AND <pk> > ? ORDER BY <pk>),
+-- snapshots and exports read in index order without a filesort. These also take
+-- over from the implicit user_id foreign key indexes, which MySQL then drops.
+CREATE INDEX idx_credentials_user_credential ON credentials (user_id, credential_id);
+CREATE INDEX idx_email_accounts_user_email ON email_accounts (user_id, email_id);
+CREATE INDEX idx_credit_cards_user_card ON credit_cards (user_id, card_id);
+CREATE INDEX idx_devices_user_device ON devices (user_id, device_id);
+
+-- Point lookups by natural keys
+CREATE INDEX idx_credentials_user_url ON credentials (user_id, url);
+CREATE INDEX idx_email_accounts_address ON email_accounts (email_address);
+CREATE INDEX idx_devices_serial_number ON devices (serial_number);
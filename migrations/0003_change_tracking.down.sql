@@ -0,0 +1,17 @@
+DROP TRIGGER IF EXISTS devices_log_delete;
+DROP TRIGGER IF EXISTS devices_log_update;
+DROP TRIGGER IF EXISTS devices_log_insert;
+DROP TRIGGER IF EXISTS credit_cards_log_delete;
+DROP TRIGGER IF EXISTS credit_cards_log_update;
+DROP TRIGGER IF EXISTS credit_cards_log_insert;
+DROP TRIGGER IF EXISTS email_accounts_log_delete;
+DROP TRIGGER IF EXISTS email_accounts_log_update;
+DROP TRIGGER IF EXISTS email_accounts_log_insert;
+DROP TRIGGER IF EXISTS credentials_log_delete;
+DROP TRIGGER IF EXISTS credentials_log_update;
+DROP TRIGGER IF EXISTS credentials_log_insert;
+ALTER TABLE devices DROP COLUMN updated_at;
+ALTER TABLE credit_cards DROP COLUMN updated_at;
+ALTER TABLE email_accounts DROP COLUMN updated_at;
+ALTER TABLE credentials DROP COLUMN updated_at;
+DROP TABLE IF EXISTS vault_changes;
@@ -0,0 +1,58 @@
+-- Change tracking for incremental sync: updated_at on every vault table plus a
+-- per-user change log filled by triggers, so every write path (single, bulk,
+-- manual SQL) is captured. Creating triggers with binary logging enabled needs
+-- SUPER or log_bin_trust_function_creators=1. Trigger bodies are single
+-- statements so this file can be split on semicolons.
+--
+-- Update triggers log nothing while the session variable @vault_changes_skip is
+-- set (app.db.change_log_off): maintenance that only rewrites how a row is stored,
+-- such as key rotation, must not send every sync client a full re-download.
+
+CREATE TABLE vault_changes (
+    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    item_type VARCHAR(20) NOT NULL,
+    item_id INT NOT NULL,
+    operation ENUM('upsert', 'delete') NOT NULL,
+    changed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_vault_changes_user_change (user_id, change_id)
+);
+
+ALTER TABLE credentials ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE email_accounts ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE credit_cards ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+ALTER TABLE devices ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6);
+
+CREATE TRIGGER credentials_log_insert AFTER INSERT ON credentials FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (NEW.user_id, 'credentials', NEW.credential_id, 'upsert');
+CREATE TRIGGER credentials_log_update AFTER UPDATE ON credentials FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation)
+    SELECT NEW.user_id, 'credentials', NEW.credential_id, 'upsert' FROM DUAL WHERE @vault_changes_skip IS NULL;
+CREATE TRIGGER credentials_log_delete AFTER DELETE ON credentials FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (OLD.user_id, 'credentials', OLD.credential_id, 'delete');
+
+CREATE TRIGGER email_accounts_log_insert AFTER INSERT ON email_accounts FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (NEW.user_id, 'email_accounts', NEW.email_id, 'upsert');
+CREATE TRIGGER email_accounts_log_update AFTER UPDATE ON email_accounts FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation)
+    SELECT NEW.user_id, 'email_accounts', NEW.email_id, 'upsert' FROM DUAL WHERE @vault_changes_skip IS NULL;
+CREATE TRIGGER email_accounts_log_delete AFTER DELETE ON email_accounts FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (OLD.user_id, 'email_accounts', OLD.email_id, 'delete');
+
+CREATE TRIGGER credit_cards_log_insert AFTER INSERT ON credit_cards FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (NEW.user_id, 'credit_cards', NEW.card_id, 'upsert');
+-- Cards can move between users on update: log a delete for the old owner too
+CREATE TRIGGER credit_cards_log_update AFTER UPDATE ON credit_cards FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation)
+    SELECT OLD.user_id, 'credit_cards', OLD.card_id, IF(OLD.user_id = NEW.user_id, 'upsert', 'delete') FROM DUAL WHERE @vault_changes_skip IS NULL
+    UNION ALL SELECT NEW.user_id, 'credit_cards', NEW.card_id, 'upsert' FROM DUAL WHERE @vault_changes_skip IS NULL;
+CREATE TRIGGER credit_cards_log_delete AFTER DELETE ON credit_cards FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (OLD.user_id, 'credit_cards', OLD.card_id, 'delete');
+
+CREATE TRIGGER devices_log_insert AFTER INSERT ON devices FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (NEW.user_id, 'devices', NEW.device_id, 'upsert');
+CREATE TRIGGER devices_log_update AFTER UPDATE ON devices FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation)
+    SELECT NEW.user_id, 'devices', NEW.device_id, 'upsert' FROM DUAL WHERE @vault_changes_skip IS NULL;
+CREATE TRIGGER devices_log_delete AFTER DELETE ON devices FOR EACH ROW
+    INSERT INTO vault_changes (user_id, item_type, item_id, operation) VALUES (OLD.user_id, 'devices', OLD.device_id, 'delete');
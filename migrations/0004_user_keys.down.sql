@@ -0,0 +1 @@
+DROP TABLE IF EXISTS user_keys;
@@ -0,0 +1,9 @@
+-- Per-user data keys for envelope encryption of the *_encrypted columns. Keys are
+-- stored wrapped (AES-GCM under the master key file), never in the clear.
+
+CREATE TABLE user_keys (
+    user_id INT PRIMARY KEY,
+    wrapped_key VARBINARY(64) NOT NULL,     -- nonce (12) + key (32) + tag (16)
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
@@ -0,0 +1,12 @@
+DROP TABLE IF EXISTS key_rotation_checkpoints;
+DROP TABLE IF EXISTS key_rotation_jobs;
+
+ALTER TABLE devices DROP COLUMN key_version;
+ALTER TABLE credit_cards DROP COLUMN key_version;
+ALTER TABLE email_accounts DROP COLUMN key_version;
+ALTER TABLE credentials DROP COLUMN key_version;
+
+-- Only the newest key of each user survives the downgrade; rows sealed under an
+-- older version become unreadable, so finish or revert rotations first
+DELETE k FROM user_keys k JOIN user_keys newer ON newer.user_id = k.user_id AND newer.key_version > k.key_version;
+ALTER TABLE user_keys DROP PRIMARY KEY, ADD PRIMARY KEY (user_id), DROP COLUMN key_version;
@@ -0,0 +1,43 @@
+-- Key versions for online rotation (python -m app.rotation). A user may hold
+-- several data key versions while a rotation runs; every vault row records the
+-- version its secrets are sealed under, 0 meaning not encrypted yet.
+
+ALTER TABLE user_keys ADD COLUMN key_version INT NOT NULL DEFAULT 1 AFTER user_id, DROP PRIMARY KEY, ADD PRIMARY KEY (user_id, key_version);
+
+ALTER TABLE credentials ADD COLUMN key_version INT NOT NULL DEFAULT 0;
+ALTER TABLE email_accounts ADD COLUMN key_version INT NOT NULL DEFAULT 0;
+ALTER TABLE credit_cards ADD COLUMN key_version INT NOT NULL DEFAULT 0;
+ALTER TABLE devices ADD COLUMN key_version INT NOT NULL DEFAULT 0;
+
+-- Rows sealed before this migration used the only key there was; keep updated_at
+-- as it is and stay out of the change log since the content did not change
+SET @vault_changes_skip = 1;
+UPDATE credentials SET key_version = 1, updated_at = updated_at WHERE password_encrypted LIKE 'ev1:%';
+UPDATE email_accounts SET key_version = 1, updated_at = updated_at WHERE password_encrypted LIKE 'ev1:%';
+UPDATE credit_cards SET key_version = 1, updated_at = updated_at WHERE card_number_encrypted LIKE 'ev1:%' OR cvv_encrypted LIKE 'ev1:%';
+UPDATE devices SET key_version = 1, updated_at = updated_at WHERE admin_password_encrypted LIKE 'ev1:%';
+SET @vault_changes_skip = NULL;
+
+CREATE TABLE key_rotation_jobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    target_version INT NOT NULL,
+    status ENUM('running', 'paused', 'done', 'failed') NOT NULL DEFAULT 'running',
+    max_rows_per_second DOUBLE NOT NULL,
+    active_seconds DOUBLE NOT NULL DEFAULT 0,       -- time spent working, excluding pauses and crashes
+    error TEXT,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+
+-- One checkpoint per table; advanced in the same transaction as the rows it covers
+CREATE TABLE key_rotation_checkpoints (
+    job_id INT NOT NULL,
+    table_name VARCHAR(20) NOT NULL,
+    last_pk INT NOT NULL DEFAULT 0,
+    rows_total BIGINT NOT NULL DEFAULT 0,
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    done BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (job_id, table_name),
+    FOREIGN KEY (job_id) REFERENCES key_rotation_jobs(job_id) ON DELETE CASCADE
+);
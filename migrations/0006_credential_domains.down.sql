@@ -0,0 +1,2 @@
+DROP INDEX idx_credentials_user_domain ON credentials;
+ALTER TABLE credentials DROP COLUMN url_host, DROP COLUMN url_domain;
@@ -0,0 +1,5 @@
+-- Host and registrable domain of each credential's URL, for autofill lookups by
+-- origin (app.domains). Existing rows are filled by: python -m app.domains backfill
+ALTER TABLE credentials ADD COLUMN url_host VARCHAR(255), ADD COLUMN url_domain VARCHAR(255);
+
+CREATE INDEX idx_credentials_user_domain ON credentials (user_id, url_domain);
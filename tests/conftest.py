@@ -0,0 +1,98 @@
+"""API tests run against benchmarks.standin: app.main on a throwaway SQLite file.
+
+The environment is set before anything from app is imported, since app.config
+reads it at import time.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+_workdir = tempfile.mkdtemp(prefix="vault-tests-")
+os.environ.update(
+    STANDIN_DB=os.path.join(_workdir, "vault.db"),
+    MASTER_KEY_FILE=os.path.join(_workdir, "master.key"),
+    WEB_WORKERS="1",
+    SYNC_SETTLE_SECONDS="0",
+    PASSWORD_SCRYPT_LOG_N="10",
+    PASSWORD_HASH_WORKERS="1",
+    CRYPTO_WORKERS="1",
+    SLOW_QUERY_MS="0",
+)
+
+pytest_plugins = ["tests.query_audit_plugin"]
+
+_usernames = itertools.count(1)
+
+# A valid create payload per vault section, without user_id
+ITEMS = {
+    "credentials": {"title": "GitHub", "username": "octocat", "url": "https://github.com/login",
+                    "password_encrypted": "hunter2"},
+    "email_accounts": {"email_address": "octocat@example.com", "provider": "Example",
+                       "password_encrypted": "hunter2"},
+    "credit_cards": {"card_number": "4111111111111111", "cvv": "123", "card_holder_name": "Octo Cat",
+                     "expiration_date": "2030-01-31"},
+    "devices": {"device_type": "Laptop", "brand": "Lenovo", "model": "X1",
+                "admin_password_encrypted": "hunter2"},
+}
+# A change to each item, as accepted by its section's PUT; the card's re-seals its secrets
+UPDATES = {
+    "credentials": {"title": "GitHub (work)"},
+    "email_accounts": {"provider": "Example Mail"},
+    "credit_cards": dict(ITEMS["credit_cards"], card_holder_name="O. Cat"),
+    "devices": {"model": "X1 Carbon"},
+}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from app.crypto import generate_key_file
+    from benchmarks import standin
+
+    generate_key_file(os.environ["MASTER_KEY_FILE"])
+    standin.create(os.environ["STANDIN_DB"]).close()
+    with TestClient(standin.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def with_connection(client):
+    """Run `work(conn)` on the app's event loop with a pooled LazyConnection; returns its result"""
+    from app.db_async import LazyConnection
+
+    def run(work):
+        async def call():
+            conn = LazyConnection()
+            try:
+                return await work(conn)
+            finally:
+                await conn.close()
+
+        return client.portal.call(call)
+
+    return run
+
+
+@pytest.fixture
+def user(client):
+    """A new user: the create payload plus user_id"""
+    number = next(_usernames)
+    payload = {"username": f"user{number}", "master_password_hash": "secret", "email": f"user{number}@example.com"}
+    response = client.post("/users/", json=payload)
+    assert response.status_code == 201, response.text
+    return dict(payload, user_id=response.json()["user_id"])
+
+
+@pytest.fixture
+def items(client, user):
+    """One item per vault section owned by `user`: {section: item id}"""
+    from app.vault import VAULT_SECTIONS
+
+    created = {}
+    for section, payload in ITEMS.items():
+        response = client.post(f"/{section}/", json=dict(payload, user_id=user["user_id"]))
+        assert response.status_code == 201, response.text
+        created[section] = response.json()[VAULT_SECTIONS[section][1]]
+    return created
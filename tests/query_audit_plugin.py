@@ -0,0 +1,122 @@
+"""pytest plugin: per-endpoint query budgets and N+1 detection for API tests.
+
+tests/conftest.py loads it; elsewhere enable it with ``pytest -p tests.query_audit_plugin``.
+A test that takes the ``query_audit`` fixture records every request the app serves
+while it runs (see app.query_audit) and, at teardown, fails if any of them
+
+- made more round trips than its endpoint's budget (BUDGETS, overridable per test), or
+- repeated a statement, queried in a loop or checked out more than one pooled
+  connection, unless the test allows that kind of finding.
+
+    @pytest.mark.query_budget({"GET /devices/{device_id}": 0})
+    def test_get_device_is_cached(client, device_id, query_audit):
+        client.get(f"/devices/{device_id}")
+
+    @pytest.mark.query_audit_allow("loop")
+    def test_import_devices(client, query_audit):
+        query_audit.budget("POST /devices/bulk", 6)
+        client.post("/devices/bulk", json=rows)
+        assert query_audit.queries("POST /devices/bulk") == 6
+
+Any client that goes through app.main:app (or benchmarks.standin:app) is audited,
+whichever thread serves it.
+"""
+import pytest
+
+from app.query_audit import listen
+from app.vault import VAULT_SECTIONS
+
+FINDINGS = ("repeated", "loop", "connections")
+
+# Worst-case round trips per request on the current code, COMMIT/ROLLBACK excluded.
+# A sealed write may also load the owner's data key (1) or create it (3, on the
+# user's first sealed write); an update whose owner is not in the request looks the
+# owner up first (1). Endpoints whose count grows with the input (bulk imports,
+# exports) have no budget.
+BUDGETS = {
+    "GET /users/": 1,
+    "GET /users/{user_id}": 1,
+    "POST /users/": 1,
+    "POST /users/login": 2,
+    "PUT /users/{user_id}": 1,
+    "DELETE /users/{user_id}": 1,
+    "GET /users/{user_id}/vault": 1,
+    "GET /users/{user_id}/changes": 2,     # the log, then the current state of upserted items
+    "GET /users/{user_id}/search": 2,
+    "GET /users/{user_id}/health": 2,
+    "GET /users/{user_id}/credentials/match": 1,
+    "GET /metrics": 0,
+    "GET /healthz": 0,
+    "GET /readyz": 1,
+}
+for _section, (_, _pk, _) in VAULT_SECTIONS.items():
+    _item = f"/{_section}/{{{_pk}}}"
+    BUDGETS.update({
+        f"GET /{_section}/": 2,             # change-log head, then the page unless it is a 304
+        f"GET {_item}": 1,
+        f"POST /{_section}/": 4,
+        f"PUT {_item}": 5,
+        f"DELETE {_item}": 1,
+    })
+
+
+class QueryAuditor:
+    """What the query_audit fixture yields: the audited requests and the limits they are held to"""
+
+    def __init__(self, requests, budgets, allowed):
+        self.requests = requests        # app.query_audit.RequestAudit, in completion order
+        self.budgets = budgets
+        self.allowed = allowed
+
+    def budget(self, endpoint, queries):
+        """Hold "METHOD /route/{template}" to at most `queries` round trips per request in this test"""
+        self.budgets[endpoint] = queries
+
+    def allow(self, *kinds):
+        """Stop failing the test on these findings ("repeated", "loop", "connections")"""
+        unknown = set(kinds) - set(FINDINGS)
+        if unknown:
+            raise ValueError(f"Unknown query audit findings: {', '.join(sorted(unknown))}")
+        self.allowed.update(kinds)
+
+    def queries(self, endpoint=None):
+        """Round trips made so far, by every request or by one endpoint's"""
+        return sum(audit.queries for audit in self.requests if endpoint is None or audit.endpoint == endpoint)
+
+    def problems(self):
+        """One report per request that broke its budget or has a finding the test does not allow"""
+        problems = []
+        for audit in self.requests:
+            found = [finding for finding in audit.findings() if finding.split(":", 1)[0] not in self.allowed]
+            budget = self.budgets.get(audit.endpoint)
+            if budget is not None and audit.queries > budget:
+                found.insert(0, f"{audit.queries} queries, budget {budget}")
+                found.extend(f"    {' '.join(sql.split())[:160]}  [{site[0] if site else 'unknown'}]"
+                             for sql, _, site in audit.statements)
+            if found:
+                problems.append("\n".join([audit.endpoint] + [f"  {line}" for line in found]))
+        return problems
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "query_budget(budgets): per-endpoint round-trip budgets for query_audit, "
+                                       "as {'METHOD /route/{template}': queries}")
+    config.addinivalue_line("markers", "query_audit_allow(*kinds): query_audit findings the test accepts "
+                                       "(repeated, loop, connections)")
+
+
+@pytest.fixture
+def query_audit(request):
+    """Audit the queries of every request served during the test; see QueryAuditor"""
+    budgets = dict(BUDGETS)
+    # Closest markers last, so a test's own budgets win over its class's and module's
+    for marker in reversed(list(request.node.iter_markers("query_budget"))):
+        budgets.update(*marker.args, **marker.kwargs)
+    with listen() as requests:
+        auditor = QueryAuditor(requests, budgets, set())
+        for marker in request.node.iter_markers("query_audit_allow"):
+            auditor.allow(*marker.args)
+        yield auditor
+    problems = auditor.problems()
+    if problems:
+        pytest.fail("query audit failed:\n" + "\n".join(problems), pytrace=False)
@@ -0,0 +1,54 @@
+"""Bulk imports insert whole chunks at once and report the rejected rows in input order"""
+import json
+
+from app import bulk
+from app.bulk import BULK_CHUNK_SIZE
+from tests.conftest import ITEMS
+
+
+def test_chunks_are_inserted_in_batches(client, user, items, query_audit):
+    # `items` sealed a device already, so the owner's data key is cached
+    count = BULK_CHUNK_SIZE + 10
+    rows = [dict(ITEMS["devices"], model=f"X{number}", user_id=user["user_id"]) for number in range(count)]
+    response = client.post("/devices/bulk", json=rows)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"inserted": count, "failed": 0, "errors": []}
+    assert query_audit.queries("POST /devices/bulk") == 2
+
+    params = {"user_id": user["user_id"], "limit": BULK_CHUNK_SIZE}
+    first = client.get("/devices/", params=params).json()
+    rest = client.get("/devices/", params=dict(params, page_token=first["next_page_token"])).json()
+    models = [item["model"] for item in first["items"] + rest["items"]]
+    assert models == [ITEMS["devices"]["model"]] + [row["model"] for row in rows]
+
+
+def _mixed_batch(user_id):
+    return [
+        dict(ITEMS["credentials"], user_id=user_id),
+        dict(ITEMS["credentials"], user_id=10**9),           # unknown owner: rejected at flush
+        {"user_id": user_id, "title": "no password"},         # invalid: rejected on arrival
+        "not an object",
+        dict(ITEMS["credentials"], user_id=user_id, title="GitLab"),
+    ]
+
+
+def test_errors_are_sorted_by_index(client, user):
+    response = client.post("/credentials/bulk", json=_mixed_batch(user["user_id"]))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (2, 3)
+    assert [error["index"] for error in result["errors"]] == [1, 2, 3]
+    assert result["errors"][0]["error"] == "User not found"
+
+    titles = [item["title"] for item in client.get("/credentials/", params={"user_id": user["user_id"]}).json()["items"]]
+    assert sorted(titles) == ["GitHub", "GitLab"]
+
+
+def test_ndjson_reports_lowest_indices_when_capped(client, user, monkeypatch):
+    monkeypatch.setattr(bulk, "MAX_REPORTED_ERRORS", 2)
+    body = "\n".join(json.dumps(row) for row in _mixed_batch(user["user_id"]))
+    response = client.post("/credentials/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["inserted"], result["failed"]) == (2, 3)
+    assert [error["index"] for error in result["errors"]] == [1, 2]
@@ -0,0 +1,74 @@
+"""Item reads are cached until a write invalidates them, including writes that race a load"""
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from app.cache import LRUCache, ReadThroughCache, get_cache, read_through
+from tests.conftest import UPDATES
+
+
+class Item(BaseModel):
+    user_id: int
+    name: str
+
+
+def test_put_and_delete_invalidate(client, user, items):
+    path = f"/credentials/{items['credentials']}"
+    assert client.get(path).json()["title"] == "GitHub"
+    updated = client.put(path, json=dict(UPDATES["credentials"], user_id=user["user_id"]))
+    assert updated.status_code == 200, updated.text
+    assert client.get(path).json()["title"] == "GitHub (work)"
+    assert client.delete(path).status_code == 200
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("section", ["devices", "users"])
+def test_deleting_user_invalidates_their_items(client, user, items, section):
+    path = f"/devices/{items['devices']}" if section == "devices" else f"/users/{user['user_id']}"
+    assert client.get(path).status_code == 200
+    assert client.delete(f"/users/{user['user_id']}").status_code == 200
+    assert client.get(path).status_code == 404
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = get_cache()
+    stale_sets = cache.stale_sets
+
+    async def load():
+        # A PUT commits and invalidates while this (older) row is on its way back
+        await cache.invalidate("devices", -1)
+        return Item(user_id=-1, name="before the write")
+
+    async def run():
+        result = await read_through("devices", -1, Item, load)
+        return result, await cache.get("devices", -1)
+
+    result, cached = asyncio.run(run())
+    assert result.name == "before the write" and cached is None
+    assert cache.stale_sets == stale_sets + 1
+
+
+def test_set_checks_key_and_owner_versions():
+    async def run():
+        cache = ReadThroughCache(LRUCache(10), tracked=2)
+        before = cache.version()
+        await cache.set("devices", 1, 7, {"name": "a"}, before)
+        assert await cache.get("devices", 1) == {"name": "a"}
+
+        await cache.invalidate_user(7)
+        await cache.set("devices", 1, 7, {"name": "b"}, before)
+        assert await cache.get("devices", 1) is None
+        await cache.set("devices", 2, 8, {"name": "c"}, before)     # another owner is unaffected
+        assert await cache.get("devices", 2) == {"name": "c"}
+
+        # Once a key falls out of the tracked versions, sets from before that are refused
+        await cache.invalidate("devices", 3)
+        await cache.invalidate("devices", 4)
+        await cache.set("devices", 2, 8, {"name": "d"}, before)
+        assert await cache.get("devices", 2) == {"name": "c"}
+        await cache.set("devices", 2, 8, {"name": "d"}, cache.version())
+        assert await cache.get("devices", 2) == {"name": "d"}
+        return cache.stats()["stale_sets"]
+
+    assert asyncio.run(run()) == 2
@@ -0,0 +1,62 @@
+"""Secret columns are stored sealed under the owner's data key and read back in plaintext"""
+import json
+import os
+import sqlite3
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from app.crypto import CryptoPool, column_aad, new_data_key, open_sealed, seal, unwrap_data_key
+from tests.conftest import ITEMS, UPDATES
+
+
+def _stored(sql, *params):
+    db = sqlite3.connect(os.environ["STANDIN_DB"])
+    try:
+        return db.execute(sql, params).fetchone()
+    finally:
+        db.close()
+
+
+def test_card_secrets_round_trip(client, user, items):
+    card_id, user_id = items["credit_cards"], user["user_id"]
+    number, cvv, version = _stored("SELECT card_number_encrypted, cvv_encrypted, key_version FROM credit_cards "
+                                   "WHERE card_id = ?", card_id)
+    wrapped, = _stored("SELECT wrapped_key FROM user_keys WHERE user_id = ? AND key_version = ?", user_id, version)
+    key = unwrap_data_key(user_id, wrapped)
+    assert number.startswith("ev1:") and cvv.startswith("ev1:")
+    card = ITEMS["credit_cards"]
+    assert open_sealed(key, user_id, "credit_cards", "card_number_encrypted", number) == card["card_number"]
+    assert open_sealed(key, user_id, "credit_cards", "cvv_encrypted", cvv) == card["cvv"]
+    # The owner and column are bound in: a value moved elsewhere does not open
+    with pytest.raises(InvalidTag):
+        open_sealed(key, user_id, "credit_cards", "cvv_encrypted", number)
+    with pytest.raises(InvalidTag):
+        open_sealed(key, user_id + 1, "credit_cards", "card_number_encrypted", number)
+
+    # A PUT re-seals with a fresh nonce; the export opens what is stored
+    updated = client.put(f"/credit_cards/{card_id}", json=dict(UPDATES["credit_cards"], user_id=user_id))
+    assert updated.status_code == 200, updated.text
+    resealed, = _stored("SELECT card_number_encrypted FROM credit_cards WHERE card_id = ?", card_id)
+    assert resealed != number
+    records = [json.loads(line) for line in client.get(f"/users/{user_id}/export").text.splitlines()]
+    exported = [record for record in records if record["record_type"] == "credit_card"]
+    assert [(record["card_number_encrypted"], record["cvv_encrypted"]) for record in exported] == \
+        [(card["card_number"], card["cvv"])]
+
+
+def test_pool_round_trip_across_workers(client):
+    key, wrapped = new_data_key(7)
+    assert unwrap_data_key(7, wrapped) == key
+    values = [f"secret {number}" for number in range(20)]
+    aads = [column_aad("devices", "admin_password_encrypted", 7)] * len(values)
+    pool = CryptoPool(workers=2, inline_max=0)
+    try:
+        sealed = pool.encrypt_many(zip([key] * len(values), values, aads))
+        assert len(set(sealed)) == len(values) and not set(sealed) & set(values)
+        assert pool.decrypt_many(zip([key] * len(values), sealed, aads)) == values
+    finally:
+        pool.shutdown()
+    # Values stored before server-side encryption come back as they are
+    assert open_sealed(key, 7, "devices", "admin_password_encrypted", "legacy") == "legacy"
+    assert seal(key, 7, "devices", "admin_password_encrypted", None) is None
@@ -0,0 +1,79 @@
+"""Credentials are matched to a page origin by host and Public Suffix List registrable domain"""
+import os
+import sqlite3
+
+import pytest
+
+from app.domains import SuffixTable, backfill, parse_rules, url_keys
+from benchmarks import standin
+from tests.conftest import ITEMS
+
+
+@pytest.mark.parametrize("url, keys", [
+    ("https://login.example.co.uk/path?q=1", ("login.example.co.uk", "example.co.uk")),
+    ("WWW.Example.com.", ("www.example.com", "example.com")),
+    ("alice.github.io", ("alice.github.io", "alice.github.io")),        # private suffix
+    ("https://shop.a.ck", ("shop.a.ck", "shop.a.ck")),                  # *.ck
+    ("https://www.ck", ("www.ck", "www.ck")),                          # !www.ck
+    ("https://bücher.de/", ("xn--bcher-kva.de", "xn--bcher-kva.de")),
+    ("http://192.168.0.1:8080/", ("192.168.0.1", "192.168.0.1")),
+    ("co.uk", ("co.uk", "co.uk")),
+    ("", (None, None)),
+    ("https://", (None, None)),
+])
+def test_url_keys(url, keys):
+    assert url_keys(url) == keys
+
+
+def test_rules_from_a_list_file():
+    table = SuffixTable(parse_rules("// comment\n\nuk\nco.uk  trailing words\n*.kawasaki.jp\n!city.kawasaki.jp\n"))
+    assert len(table) == 4
+    assert table.registrable_domain("a.b.example.co.uk") == "example.co.uk"
+    assert table.registrable_domain("shop.foo.kawasaki.jp") == "shop.foo.kawasaki.jp"
+    assert table.registrable_domain("www.city.kawasaki.jp") == "city.kawasaki.jp"
+
+
+def _add(client, user_id, url):
+    response = client.post("/credentials/", json=dict(ITEMS["credentials"], user_id=user_id, url=url))
+    assert response.status_code == 201, response.text
+    return response.json()["credential_id"]
+
+
+def _match(client, user_id, origin):
+    response = client.get(f"/users/{user_id}/credentials/match", params={"origin": origin})
+    assert response.status_code == 200, response.text
+    return [(item["credential_id"], item["match"]) for item in response.json()["items"]]
+
+
+def test_match_by_origin(client, user):
+    user_id = user["user_id"]
+    accounts = _add(client, user_id, "https://accounts.google.com/signin")
+    mail = _add(client, user_id, "https://mail.google.com")
+    _add(client, user_id, "https://google.co.uk")
+    alice = _add(client, user_id, "https://alice.github.io/app")
+    _add(client, user_id, "https://bob.github.io")
+
+    assert _match(client, user_id, "https://mail.google.com") == [(mail, "host"), (accounts, "domain")]
+    assert _match(client, user_id, "https://alice.github.io") == [(alice, "host")]
+    assert _match(client, user_id, "https://example.org") == []
+    assert client.get(f"/users/{user_id}/credentials/match", params={"origin": "https://"}).status_code == 400
+    assert client.get("/users/999999/credentials/match", params={"origin": "https://x.org"}).status_code == 404
+
+
+def test_backfill_fills_missing_keys(client, user):
+    credential_id = _add(client, user["user_id"], "https://login.example.co.uk")
+    db = sqlite3.connect(os.environ["STANDIN_DB"])
+    try:
+        db.execute("UPDATE credentials SET url_host = NULL, url_domain = NULL WHERE credential_id = ?",
+                   (credential_id,))
+        db.commit()
+    finally:
+        db.close()
+    assert _match(client, user["user_id"], "https://example.co.uk") == []
+
+    conn = standin.connect_sync()
+    try:
+        assert backfill(conn, chunk_size=10) >= 1
+    finally:
+        conn.close()
+    assert _match(client, user["user_id"], "https://example.co.uk") == [(credential_id, "domain")]
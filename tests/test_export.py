@@ -0,0 +1,51 @@
+"""The vault export streams every row, decrypted, on every run"""
+import csv
+import io
+import json
+from collections import Counter
+
+import pytest
+
+from app import db_async
+from tests.conftest import ITEMS
+
+EXPECTED = {"credential": 3, "email_account": 1, "credit_card": 1, "device": 1}
+
+
+@pytest.fixture
+def vault(client, user, items):
+    for number in range(EXPECTED["credential"] - 1):
+        response = client.post("/credentials/", json=dict(ITEMS["credentials"], user_id=user["user_id"],
+                                                          title=f"Site {number}"))
+        assert response.status_code == 201, response.text
+    return user["user_id"]
+
+
+@pytest.fixture
+def production_settings(monkeypatch):
+    # Prepared statements stay at their configured default; every round trip goes
+    # through the slow-query log, which EXPLAINs it on the same connection
+    assert db_async.get_pool().stats()["prepared_statements"]["capacity_per_connection"] > 0
+    monkeypatch.setattr(db_async, "SLOW_QUERY_SECONDS", 0)
+
+
+def _records(response, format):
+    if format == "csv":
+        return list(csv.DictReader(io.StringIO(response.text)))
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+def test_repeated_exports_are_complete(client, vault, production_settings, format):
+    # The export statements are prepared from their second sighting on
+    for _ in range(3):
+        response = client.get(f"/users/{vault}/export", params={"format": format})
+        assert response.status_code == 200
+        records = _records(response, format)
+        assert Counter(record["record_type"] for record in records) == EXPECTED
+        secrets = [record["password_encrypted"] for record in records if record["record_type"] == "credential"]
+        assert secrets == ["hunter2"] * EXPECTED["credential"]
+
+
+def test_export_of_unknown_user(client):
+    assert client.get("/users/999999/export").status_code == 404
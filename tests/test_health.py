@@ -0,0 +1,88 @@
+"""Vault health: reused secrets, breached ones found in the local corpus and expiring cards"""
+import hashlib
+
+import pytest
+
+from app import breach
+from app.breach import BreachCorpus, BreachCorpusError, build
+from tests.conftest import ITEMS
+
+
+def _sha1(password):
+    return hashlib.sha1(password.encode()).hexdigest().upper()
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    # Unsorted, with a duplicate and HIBP's ":count" suffixes; tiny runs exercise the merge
+    source = tmp_path / "pwned.txt"
+    source.write_text("\n".join([f"{_sha1('hunter2')}:17", _sha1("password"), "", _sha1("123456") + ":3",
+                                 _sha1("password") + ":2"]) + "\n")
+    output = str(tmp_path / "breached.idx")
+    assert build(str(source), output, run_records=2) == 3
+    return output
+
+
+@pytest.fixture
+def corpus(corpus_file, monkeypatch):
+    opened = BreachCorpus(corpus_file)
+    monkeypatch.setattr(breach, "_corpus", opened)
+    yield opened
+    opened.close()
+
+
+def test_corpus_lookup(corpus_file, tmp_path):
+    corpus = BreachCorpus(corpus_file)
+    try:
+        assert len(corpus) == 3 and corpus.record_size == breach.DEFAULT_RECORD_SIZE
+        assert all(corpus.contains_password(password) for password in ("hunter2", "password", "123456"))
+        assert not corpus.contains_password("correct horse battery staple")
+    finally:
+        corpus.close()
+
+    bad = tmp_path / "bad.txt"
+    bad.write_text("not-a-hash\n")
+    with pytest.raises(BreachCorpusError):
+        build(str(bad), str(tmp_path / "bad.idx"))
+    with pytest.raises(BreachCorpusError):
+        BreachCorpus(str(bad))
+
+
+def _health(client, user_id):
+    response = client.get(f"/users/{user_id}/health")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_reused_and_breached_secrets(client, user, items, corpus):
+    user_id = user["user_id"]
+    expired = client.post("/credit_cards/", json=dict(ITEMS["credit_cards"], user_id=user_id,
+                                                      expiration_date="2020-01-31"))
+    assert expired.status_code == 201, expired.text
+
+    report = _health(client, user_id)
+    reused = {("credentials", items["credentials"]), ("email_accounts", items["email_accounts"])}
+    assert report["summary"]["breach_check"] is True
+    assert [{(item["type"], item["id"]) for item in group["items"]} for group in report["reused"]] == [reused]
+    assert {(item["type"], item["id"]) for item in report["breached"]} == reused
+    assert report["reused"][0]["items"][0]["label"] == "GitHub"
+    assert [(card["card_id"], card["expired"]) for card in report["expiring_cards"]] == \
+        [(expired.json()["card_id"], True)]
+
+    # The report follows writes: a new, unbreached password leaves one breached secret and no reuse
+    changed = client.put(f"/credentials/{items['credentials']}",
+                         json={"user_id": user_id, "title": "GitHub", "password_encrypted": "Tr0ub4dor&3"})
+    assert changed.status_code == 200, changed.text
+    report = _health(client, user_id)
+    assert report["reused"] == []
+    assert [(item["type"], item["id"]) for item in report["breached"]] == \
+        [("email_accounts", items["email_accounts"])]
+    assert report["summary"]["secrets_checked"] == 2
+
+
+def test_without_corpus(client, user, items, monkeypatch):
+    monkeypatch.setattr(breach, "_corpus", None)
+    report = _health(client, user["user_id"])
+    assert report["summary"]["breach_check"] is False and report["breached"] == []
+    assert report["summary"]["expiring_cards"] == 0
+    assert client.get("/users/999999/health").status_code == 404
@@ -0,0 +1,61 @@
+"""Login: the KDF runs with no pooled connection checked out, outdated hashes are upgraded"""
+import os
+import sqlite3
+
+import pytest
+
+from app import db_async
+from app.passwords import HashingPool, current_params, hash_password
+
+
+def _stored_hash(username, value=None):
+    db = sqlite3.connect(os.environ["STANDIN_DB"])
+    try:
+        if value is not None:
+            db.execute("UPDATE users SET master_password_hash = ? WHERE username = ?", (value, username))
+            db.commit()
+        return db.execute("SELECT master_password_hash FROM users WHERE username = ?", (username,)).fetchone()[0]
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def kdf_in_use(monkeypatch):
+    """Connections checked out of the pool at the start of each KDF run"""
+    seen = []
+    run = HashingPool._run
+
+    async def observed(self, *args):
+        seen.append(db_async.get_pool().stats()["in_use"])
+        return await run(self, *args)
+
+    monkeypatch.setattr(HashingPool, "_run", observed)
+    return seen
+
+
+def _login(client, user, password=None):
+    return client.post("/users/login", json={
+        "username": user["username"],
+        "master_password_hash": password or user["master_password_hash"],
+    })
+
+
+def test_login_holds_no_connection_during_kdf(client, user, kdf_in_use):
+    assert _login(client, user).status_code == 200
+    assert _login(client, user, "wrong").status_code == 401
+    assert kdf_in_use == [0, 0]
+
+
+def test_outdated_hash_is_upgraded(client, user, kdf_in_use):
+    # Hashed with cost parameters other than the configured ones
+    outdated = hash_password(user["master_password_hash"], dict(current_params(), ln=4))
+    _stored_hash(user["username"], outdated)
+    assert _login(client, user).status_code == 200
+    # verify, then hash: neither with a connection checked out
+    assert kdf_in_use == [0, 0]
+    upgraded = _stored_hash(user["username"])
+    assert upgraded != outdated and upgraded.startswith(f"$scrypt$ln={current_params()['ln']},")
+
+    assert _login(client, user).status_code == 200
+    assert _stored_hash(user["username"]) == upgraded
+    assert len(kdf_in_use) == 3
@@ -0,0 +1,47 @@
+"""List endpoints page one user's rows by key, with page tokens bound to that user"""
+from tests.conftest import ITEMS
+
+
+def _create_devices(client, user_id, count):
+    ids = []
+    for number in range(count):
+        response = client.post("/devices/", json=dict(ITEMS["devices"], model=f"X{number}", user_id=user_id))
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["device_id"])
+    return ids
+
+
+def _walk(client, user_id, limit):
+    pages, params = [], {"user_id": user_id, "limit": limit}
+    while True:
+        response = client.get("/devices/", params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([item["device_id"] for item in body["items"]])
+        if body["next_page_token"] is None:
+            return pages
+        params["page_token"] = body["next_page_token"]
+
+
+def test_page_tokens_walk_one_users_rows(client, user):
+    other = client.post("/users/", json={"username": f"{user['username']}-other", "master_password_hash": "secret",
+                                         "email": f"other-{user['email']}"}).json()["user_id"]
+    ids = _create_devices(client, user["user_id"], 5)
+    _create_devices(client, other, 2)
+
+    assert _walk(client, user["user_id"], 2) == [ids[0:2], ids[2:4], ids[4:5]]
+    assert _walk(client, user["user_id"], 5) == [ids]
+    after = client.get("/devices/", params={"user_id": user["user_id"], "after_id": ids[2]}).json()
+    assert [item["device_id"] for item in after["items"]] == ids[3:]
+
+
+def test_page_tokens_are_scoped_to_their_user(client, user):
+    _create_devices(client, user["user_id"], 2)
+    token = client.get("/devices/", params={"user_id": user["user_id"], "limit": 1}).json()["next_page_token"]
+    assert token is not None
+
+    stolen = client.get("/devices/", params={"user_id": user["user_id"] + 1, "page_token": token})
+    assert stolen.status_code == 400
+    assert stolen.json()["detail"] == "Page token was issued for a different user"
+    garbled = client.get("/devices/", params={"user_id": user["user_id"], "page_token": "not-a-token"})
+    assert garbled.status_code == 400
@@ -0,0 +1,49 @@
+"""Statements seen twice run as server-side prepared statements, except on unbuffered cursors"""
+import aiomysql
+
+from app.db_async import get_pool
+
+SQL = "SELECT user_id, username FROM users WHERE user_id = %s"
+
+
+def _prepared_stats():
+    return dict(get_pool().stats()["prepared_statements"])
+
+
+def _run_three_times(with_connection, user_id, *cursor_class):
+    async def work(conn):
+        results = []
+        for _ in range(3):
+            cursor = await conn.cursor(*cursor_class)
+            try:
+                await cursor.execute(SQL, (user_id,))
+                rows = []
+                while True:
+                    batch = await cursor.fetchmany(100)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+                results.append(rows)
+            finally:
+                await cursor.close()
+        return results
+
+    return with_connection(work)
+
+
+def test_repeated_statement_runs_prepared(with_connection, user):
+    before = _prepared_stats()
+    results = _run_three_times(with_connection, user["user_id"])
+    after = _prepared_stats()
+    assert results == [[(user["user_id"], user["username"])]] * 3
+    # Sent as text the first time, prepared on the second sighting, then a cache hit
+    assert after["prepares"] - before["prepares"] == 1
+    assert after["executes"] - before["executes"] == 2
+
+
+def test_unbuffered_cursor_streams_every_run(with_connection, user):
+    before = _prepared_stats()
+    results = _run_three_times(with_connection, user["user_id"], aiomysql.SSCursor)
+    after = _prepared_stats()
+    assert results == [[(user["user_id"], user["username"])]] * 3
+    assert after["prepares"] == before["prepares"]
@@ -0,0 +1,62 @@
+"""Endpoints stay within their round-trip budgets (tests.query_audit_plugin.BUDGETS)"""
+import pytest
+
+from app.vault import VAULT_SECTIONS
+from tests.conftest import ITEMS, UPDATES
+
+
+def test_user_endpoints(client, user, query_audit):
+    user_id = user["user_id"]
+    assert client.get("/users/", params={"limit": 10}).status_code == 200
+    assert client.get(f"/users/{user_id}").status_code == 200
+    login = {"username": user["username"], "master_password_hash": user["master_password_hash"]}
+    assert client.post("/users/login", json=login).status_code == 200
+    assert client.put(f"/users/{user_id}", json=dict(user, email="renamed@example.com")).status_code == 200
+    assert client.delete(f"/users/{user_id}").status_code == 200
+    # A current hash needs no upgrade, so login is the user lookup alone
+    assert query_audit.queries("POST /users/login") == 1
+
+
+def test_vault_reads(client, user, items, query_audit):
+    user_id = user["user_id"]
+    assert client.get(f"/users/{user_id}/vault").status_code == 200
+    changes = client.get(f"/users/{user_id}/changes")
+    assert changes.status_code == 200
+    assert len(changes.json()["changes"]) == len(items)
+    search = client.get(f"/users/{user_id}/search", params={"q": "githb"})
+    assert search.status_code == 200
+    assert [result["id"] for result in search.json()["results"]] == [items["credentials"]]
+    assert client.get(f"/users/{user_id}/health").status_code == 200
+    match = client.get(f"/users/{user_id}/credentials/match", params={"origin": "https://github.com"})
+    assert match.status_code == 200
+    assert len(match.json()["items"]) == 1
+
+
+def test_probes_and_metrics(client, query_audit):
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 200
+    assert client.get("/metrics").status_code == 200
+    assert query_audit.queries("GET /healthz") == query_audit.queries("GET /metrics") == 0
+
+
+@pytest.mark.parametrize("section", list(ITEMS))
+def test_section_endpoints(client, user, section, query_audit):
+    user_id = user["user_id"]
+    created = client.post(f"/{section}/", json=dict(ITEMS[section], user_id=user_id))
+    assert created.status_code == 201, created.text
+    item_id = created.json()[VAULT_SECTIONS[section][1]]
+
+    assert client.get(f"/{section}/", params={"user_id": user_id}).status_code == 200
+    assert client.get(f"/{section}/{item_id}").status_code == 200
+    updated = client.put(f"/{section}/{item_id}", json=dict(UPDATES[section], user_id=user_id))
+    assert updated.status_code == 200, updated.text
+    assert client.delete(f"/{section}/{item_id}").status_code == 200
+
+
+@pytest.mark.parametrize("section", list(ITEMS))
+def test_repeated_item_read_is_cached(client, user, items, section, query_audit):
+    path = f"/{section}/{items[section]}"
+    assert client.get(path).status_code == 200
+    query_audit.budget(f"GET /{section}/{{{VAULT_SECTIONS[section][1]}}}", 0)
+    query_audit.requests.clear()
+    assert client.get(path).status_code == 200
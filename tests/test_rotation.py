@@ -0,0 +1,88 @@
+"""Key rotation re-seals every secret in checkpointed chunks and resumes where it stopped"""
+import json
+
+import pytest
+
+from app import rotation
+from benchmarks import standin
+from tests.conftest import ITEMS
+
+CHUNK_SIZE = 50
+
+
+@pytest.fixture
+def job_connection(client, monkeypatch):
+    """The job's mysql.connector connection, as a session on the stand-in's file"""
+    opened = []
+
+    def connect():
+        opened.append(standin.connect_sync())
+        return opened[-1]
+
+    monkeypatch.setattr(rotation, "_connect", connect)
+    yield connect
+    for conn in opened:
+        if not conn.closed:
+            conn.close()
+
+
+def _count(conn, sql, *params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+
+def _under_older_keys(conn, target):
+    return {table: _count(conn, f"SELECT COUNT(*) FROM {table} WHERE key_version < %s", target)
+            for table, _ in rotation.ROTATION_TABLES}
+
+
+def test_paused_and_crashed_job_resumes(client, user, items, job_connection, monkeypatch):
+    user_id = user["user_id"]
+    for number in range(2 * CHUNK_SIZE):
+        response = client.post("/credentials/", json=dict(ITEMS["credentials"], user_id=user_id,
+                                                          title=f"Site {number}"))
+        assert response.status_code == 201, response.text
+    conn = job_connection()
+    job = rotation.RotationJob.start(conn, rows_per_second=0, chunk_size=CHUNK_SIZE)
+
+    # Paused from another session after the first chunk
+    chunks = []
+
+    def pause_once(throttle, rows):
+        chunks.append(rows)
+        if len(chunks) == 1:
+            assert rotation.main(["pause", str(job.job_id)]) == 0
+
+    monkeypatch.setattr(rotation.Throttle, "wait", pause_once)
+    assert job.run() == "paused"
+    progress = client.get("/admin/key-rotation", params={"job_id": job.job_id}).json()
+    assert progress["status"] == "paused"
+    assert 0 < progress["rows_done"] < progress["rows_total"]
+
+    # Crashes past the first chunk of credentials: the chunks before it stay committed
+    reseal = rotation.RotationJob._reseal_chunk
+
+    def crash_once(self, table, pk, last_pk):
+        if table == "credentials" and last_pk > 0:
+            monkeypatch.setattr(rotation.RotationJob, "_reseal_chunk", reseal)
+            raise RuntimeError("worker killed")
+        return reseal(self, table, pk, last_pk)
+
+    monkeypatch.setattr(rotation.RotationJob, "_reseal_chunk", crash_once)
+    with pytest.raises(RuntimeError):
+        rotation.RotationJob(conn, job.job_id, CHUNK_SIZE).run()
+    assert rotation.job_progress(conn, job.job_id)["status"] == "failed"
+    assert 0 < _under_older_keys(conn, job.target)["credentials"] < _count(conn, "SELECT COUNT(*) FROM credentials")
+
+    assert rotation.main(["resume", "--chunk-size", str(CHUNK_SIZE)]) == 0
+    finished = rotation.job_progress(conn, job.job_id)
+    assert finished["status"] == "done"
+    assert finished["rows_done"] == finished["rows_total"]
+    assert not any(_under_older_keys(conn, job.target).values())
+
+    # Everything still opens under the new keys
+    records = [json.loads(line) for line in client.get(f"/users/{user_id}/export").text.splitlines()]
+    assert {record["password_encrypted"] for record in records if record["record_type"] == "credential"} == {"hunter2"}
+    card = next(record for record in records if record["record_type"] == "credit_card")
+    assert card["card_number_encrypted"] == ITEMS["credit_cards"]["card_number"]
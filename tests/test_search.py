@@ -0,0 +1,66 @@
+"""Trigram search finds items despite typos and follows every kind of write"""
+import random
+import string
+
+from app.search import VaultIndex, trigrams
+from tests.conftest import ITEMS
+
+
+def _search(client, user_id, q, **params):
+    response = client.get(f"/users/{user_id}/search", params=dict(params, q=q))
+    assert response.status_code == 200, response.text
+    return [(result["type"], result["id"]) for result in response.json()["results"]]
+
+
+def test_typos_and_ranking():
+    index = VaultIndex()
+    index.upsert("credentials", 1, {"title": "GitHub", "username": "octocat", "url": "https://github.com"})
+    index.upsert("credentials", 2, {"title": "GitLab", "url": "https://gitlab.com"})
+    index.upsert("devices", 3, {"brand": "Lenovo", "model": "ThinkPad"})
+    found = index.search("githb", 10)
+    assert [result["id"] for result in found] == [1, 2] and found[0]["score"] > found[1]["score"]
+    assert [result["id"] for result in index.search("githb", 1)] == [1]
+    # Equally similar: the match in the heavier field ranks first
+    index.upsert("credentials", 4, {"title": "Mail", "notes": "backup of the vault"})
+    index.upsert("credentials", 5, {"title": "Vault", "notes": "mail"})
+    assert [result["id"] for result in index.search("vault", 10)] == [5, 4]
+    assert index.search("thinkpda", 10)[0]["fields"]["model"] == "ThinkPad"
+    assert index.search("lenovo", 10, types={"credentials"}) == []
+
+    index.upsert("credentials", 1, {"title": "Codeberg"})
+    index.remove("credentials", 2)
+    assert index.search("githb", 10) == [] and len(index) == 4
+
+
+def test_early_stop_matches_a_full_scan():
+    rng = random.Random(7)
+    words = ["".join(rng.choices(string.ascii_lowercase[:8], k=rng.randint(4, 9))) for _ in range(300)]
+    index = VaultIndex()
+    for number, word in enumerate(words):
+        index.upsert("devices", number, {"model": word})
+    for query in rng.sample(words, 20):
+        grams = trigrams(query)
+        scores = sorted((len(grams & trigrams(word)) / len(grams) for word in words), reverse=True)
+        found = [result["score"] for result in index.search(query, 5, threshold=0.3)]
+        assert found == [round(score, 4) for score in scores if score >= 0.3][:5]
+
+
+def test_index_follows_writes(client, user, items):
+    user_id = user["user_id"]
+    credential = ("credentials", items["credentials"])
+    assert _search(client, user_id, "githb") == [credential]
+
+    renamed = client.put(f"/credentials/{items['credentials']}", json={"title": "Codeberg", "user_id": user_id})
+    assert renamed.status_code == 200, renamed.text
+    assert _search(client, user_id, "githb") == []
+    assert _search(client, user_id, "codeberg") == [credential]
+
+    # Bulk imports reach the index through the change log
+    imported = client.post("/devices/bulk", json=[dict(ITEMS["devices"], brand="Framework", user_id=user_id)])
+    assert imported.json()["inserted"] == 1
+    assert [kind for kind, _ in _search(client, user_id, "framwork")] == ["devices"]
+    assert _search(client, user_id, "framwork", sections="credentials") == []
+
+    assert client.delete(f"/credentials/{items['credentials']}").status_code == 200
+    assert _search(client, user_id, "codeberg") == []
+    assert client.get("/users/999999/search", params={"q": "git"}).status_code == 404
@@ -0,0 +1,43 @@
+"""List pages serialized straight from rows match what the response models produce"""
+import datetime
+
+import pytest
+from pydantic import BaseModel
+
+from app import serialize
+from app.serialize import RowSerializer
+from app.vault import VAULT_SECTIONS
+from tests.conftest import ITEMS
+
+
+class Flagged(BaseModel):
+    flag_id: int
+    enabled: bool
+    seen_at: datetime.datetime
+
+
+@pytest.mark.parametrize("section", list(ITEMS))
+def test_list_items_match_single_item_responses(client, user, items, section):
+    pk = VAULT_SECTIONS[section][1]
+    page = client.get(f"/{section}/", params={"user_id": user["user_id"]}).json()
+    assert set(page) == {"items", "next_page_token"} and page["next_page_token"] is None
+    single = client.get(f"/{section}/{items[section]}").json()
+    assert [item[pk] for item in page["items"]] == [items[section]]
+    # Same fields, types and formatting as the pydantic path
+    assert page["items"][0] == single
+
+
+@pytest.mark.parametrize("fallback", [False, True])
+def test_row_serializer(monkeypatch, fallback):
+    if fallback:
+        monkeypatch.setattr(serialize, "orjson", None)
+    rows = RowSerializer(Flagged, ("flag_id", "enabled", "seen_at"))
+    seen_at = datetime.datetime(2026, 1, 2, 3, 4, 5, 600000)
+    body = rows.page([(1, 1, seen_at), (2, 0, seen_at)], "next")
+    assert body == (b'{"items":[{"flag_id":1,"enabled":true,"seen_at":"2026-01-02T03:04:05.600000"},'
+                    b'{"flag_id":2,"enabled":false,"seen_at":"2026-01-02T03:04:05.600000"}],'
+                    b'"next_page_token":"next"}')
+    with pytest.raises(ValueError, match="enabled"):
+        RowSerializer(Flagged, ("flag_id", "seen_at"))
+    with pytest.raises(ValueError, match="extra"):
+        RowSerializer(Flagged, ("flag_id", "enabled", "seen_at", "extra"))
@@ -0,0 +1,55 @@
+"""The slow-query log explains buffered statements and leaves unbuffered results intact"""
+import json
+import logging
+
+import aiomysql
+import pytest
+
+from app import db_async
+
+SQL = "SELECT credential_id FROM credentials WHERE user_id = %s ORDER BY credential_id"
+
+
+@pytest.fixture
+def slow_log(monkeypatch, caplog):
+    """Every round trip counts as slow; returns a function listing the entries logged so far"""
+    monkeypatch.setattr(db_async, "SLOW_QUERY_SECONDS", 0)
+    caplog.set_level(logging.WARNING, logger="app.slow_queries")
+    return lambda: [json.loads(record.getMessage()) for record in caplog.records if record.name == "app.slow_queries"]
+
+
+def _credentials(client, user, count):
+    ids = []
+    for number in range(count):
+        response = client.post("/credentials/", json={
+            "user_id": user["user_id"], "title": f"Site {number}", "password_encrypted": "hunter2",
+        })
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["credential_id"])
+    return ids
+
+
+def _read(with_connection, user_id, *cursor_class):
+    async def work(conn):
+        cursor = await conn.cursor(*cursor_class)
+        try:
+            await cursor.execute(SQL, (user_id,))
+            rows = []
+            while True:
+                batch = await cursor.fetchmany(1)
+                if not batch:
+                    return rows
+                rows.extend(row[0] for row in batch)
+        finally:
+            await cursor.close()
+
+    return with_connection(work)
+
+
+def test_unbuffered_result_survives_slow_query_log(client, user, with_connection, slow_log):
+    ids = _credentials(client, user, 3)
+    assert _read(with_connection, user["user_id"], aiomysql.SSCursor) == ids
+    assert _read(with_connection, user["user_id"]) == ids
+    entries = [entry for entry in slow_log() if entry["statements"] == [SQL]]
+    # The unbuffered read is logged without a plan, the buffered one with it
+    assert [entry["plans"] is None for entry in entries] == [True, False]
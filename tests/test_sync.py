@@ -0,0 +1,48 @@
+"""Vault snapshots, incremental /changes and conditional GETs"""
+from app import config
+from app.pagination import decode_page_token
+
+
+def test_changes_after_snapshot(client, user, items):
+    user_id = user["user_id"]
+    snapshot = client.get(f"/users/{user_id}/vault").json()
+    assert [item["credential_id"] for item in snapshot["credentials"]] == [items["credentials"]]
+    assert client.get(f"/users/{user_id}/changes", params={"since": snapshot["cursor"]}).json()["changes"] == []
+
+    client.put(f"/credentials/{items['credentials']}", json={"title": "Renamed"})
+    client.delete(f"/devices/{items['devices']}")
+    changes = client.get(f"/users/{user_id}/changes", params={"since": snapshot["cursor"]}).json()
+    assert [(change["type"], change["id"], change["operation"]) for change in changes["changes"]] == [
+        ("credentials", items["credentials"], "upsert"),
+        ("devices", items["devices"], "delete"),
+    ]
+    assert changes["changes"][0]["item"]["title"] == "Renamed"
+    assert not changes["has_more"]
+
+
+def test_snapshot_cursor_stops_before_unsettled_changes(client, user, items, monkeypatch):
+    user_id = user["user_id"]
+    # Every change is still inside the settle window: a lower change_id could yet commit
+    monkeypatch.setattr(config, "SYNC_SETTLE_SECONDS", 3600)
+    snapshot = client.get(f"/users/{user_id}/vault").json()
+    assert decode_page_token(snapshot["cursor"], user_id) == 0
+
+    # Once settled, the changes the snapshot already holds are replayed rather than skipped
+    monkeypatch.setattr(config, "SYNC_SETTLE_SECONDS", 0)
+    changes = client.get(f"/users/{user_id}/changes", params={"since": snapshot["cursor"]}).json()["changes"]
+    assert sorted((change["type"], change["id"]) for change in changes) == sorted(items.items())
+
+
+def test_unchanged_item_and_list_answer_304(client, user, items):
+    path = f"/credentials/{items['credentials']}"
+    etag = client.get(path).headers["etag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    listing = {"user_id": user["user_id"]}
+    list_etag = client.get("/credentials/", params=listing).headers["etag"]
+    assert client.get("/credentials/", params=listing, headers={"If-None-Match": list_etag}).status_code == 304
+
+    client.put(path, json={"notes": "changed"})
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 200
+    relisted = client.get("/credentials/", params=listing, headers={"If-None-Match": list_etag})
+    assert relisted.status_code == 200 and relisted.headers["etag"] != list_etag
@@ -0,0 +1,56 @@
+"""Item writes are one execute_batch round trip each once the owner's data key is cached"""
+import pytest
+
+from app.db_async import LazyConnection, record_queries
+from app.models.credentials import CredentialCreate, CredentialUpdate
+from app.models.credit_cards import CreditCardCreateRequest
+from app.models.devices import DeviceCreate, DeviceUpdate
+from app.models.email_accounts import EmailAccountCreate, EmailAccountUpdate
+from app.routers.credentials import CREDENTIALS
+from app.routers.credit_cards import CREDIT_CARDS
+from app.routers.devices import DEVICES
+from app.routers.email_accounts import EMAIL_ACCOUNTS
+from tests.conftest import ITEMS, UPDATES
+
+# section -> (repository, create model, update model, update is partial), as the routers use them
+WRITES = {
+    "credentials": (CREDENTIALS, CredentialCreate, CredentialUpdate, False),
+    "email_accounts": (EMAIL_ACCOUNTS, EmailAccountCreate, EmailAccountUpdate, True),
+    "credit_cards": (CREDIT_CARDS, CreditCardCreateRequest, CreditCardCreateRequest, False),
+    "devices": (DEVICES, DeviceCreate, DeviceUpdate, True),
+}
+
+
+def _round_trips(client, write):
+    """Run `write(conn)` on the app's event loop; returns (its result, the round trips it made)"""
+    async def run():
+        conn = LazyConnection()
+        try:
+            with record_queries() as log:
+                result = await write(conn)
+        finally:
+            await conn.close()
+        return result, log
+
+    return client.portal.call(run)
+
+
+@pytest.mark.parametrize("section", list(WRITES))
+def test_writes_take_one_round_trip(client, user, items, section):
+    # `items` gave the user a sealed item, so their data key is cached from here on
+    repository, create_model, update_model, partial = WRITES[section]
+    pk = repository.table.pk
+
+    created, log = _round_trips(client, lambda conn: repository.create(
+        conn, create_model(**ITEMS[section], user_id=user["user_id"])))
+    assert len(log) == 1 and log[0].lstrip().startswith("INSERT") and log[0].endswith("COMMIT"), log
+    item_id = getattr(created, pk)
+
+    updated, log = _round_trips(client, lambda conn: repository.update(
+        conn, item_id, update_model(**UPDATES[section], user_id=user["user_id"]), partial=partial))
+    assert len(log) == 1 and log[0].lstrip().startswith("UPDATE") and log[0].endswith("COMMIT"), log
+    assert getattr(updated, pk) == item_id
+
+    owner, log = _round_trips(client, lambda conn: repository.delete(conn, item_id))
+    assert len(log) == 1 and "DELETE" in log[0] and log[0].endswith("COMMIT"), log
+    assert owner == user["user_id"]